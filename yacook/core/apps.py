@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import metrics, template_profiler
+        connection_created.connect(metrics.install_query_wrapper, dispatch_uid='core.metrics')
+        if settings.TEMPLATE_PROFILING:
+            template_profiler.install()
@@ -0,0 +1,269 @@
+"""Двухуровневый кэш: LRU в памяти процесса перед общим для всех воркеров кэшем.
+
+Локальный уровень отвечает без обращения к общему хранилищу. Чтобы изменения,
+сделанные одним воркером, доходили до остальных, каждая запись и удаление
+ключа локального уровня записывают в общий кэш новое поколение - случайную
+метку. Запись метки - одна операция set, поэтому одновременные изменения
+двух воркеров не могут дать одинаковое поколение. Воркер сверяет поколение
+не чаще раза в SYNC_INTERVAL секунд и при его смене очищает свой уровень,
+в том числе после собственной записи. Поэтому локальный уровень подходит
+только для редко меняющихся данных: остальные ключи идут сразу в общий кэш.
+
+DatabaseCache - общий кэш в таблице базы данных, который записывает
+set_many пачкой.
+"""
+import base64
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.db import DatabaseCache as DjangoDatabaseCache
+from django.db import DatabaseError, connections, router, transaction
+from django.utils.timezone import now as tz_now
+
+GENERATION_KEY = 'two_tier:generation'
+
+
+class TwoTierCache(BaseCache):
+    """Бэкенд кэша с локальным LRU-уровнем.
+
+    Параметры в OPTIONS:
+    SHARED - алиас общего кэша из CACHES;
+    LOCAL_MAX_ENTRIES - размер локального уровня;
+    LOCAL_TIMEOUT - время жизни записи локального уровня, в секундах;
+    SYNC_INTERVAL - как часто сверять поколение с общим кэшем, в секундах;
+    LOCAL_KEY_PREFIXES - префиксы ключей, которые хранятся и локально;
+    по умолчанию локально хранятся все ключи.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self._local_max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 60)
+        self._sync_interval = options.get('SYNC_INTERVAL', 1)
+        prefixes = options.get('LOCAL_KEY_PREFIXES')
+        self._local_prefixes = tuple(prefixes) if prefixes is not None else None
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._synced_at = 0
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _is_local(self, key):
+        return self._local_prefixes is None or key.startswith(self._local_prefixes)
+
+    def _sync(self):
+        """Очищает локальный уровень, если в общем кэше сменилось поколение."""
+        now = time.monotonic()
+        if now - self._synced_at < self._sync_interval:
+            return
+        generation = self.shared.get(GENERATION_KEY)
+        with self._lock:
+            if generation != self._generation:
+                self._local.clear()
+                self._generation = generation
+            self._synced_at = now
+
+    def _bump_generation(self):
+        # Чтение и увеличение счётчика не атомарны в файловом кэше и в базе,
+        # поэтому поколение - новая случайная метка. Свой уровень этот воркер
+        # тоже очистит при следующей сверке: иначе он пропустил бы изменение,
+        # сделанное другим воркером одновременно с его собственным.
+        self.shared.set(GENERATION_KEY, uuid.uuid4().hex, None)
+
+    def _local_get(self, key):
+        with self._lock:
+            item = self._local.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return item
+
+    def _local_set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        local_timeout = self._local_timeout
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            local_timeout = min(local_timeout, timeout)
+        with self._lock:
+            self._local[key] = (value, time.monotonic() + local_timeout)
+            self._local.move_to_end(key)
+            while len(self._local) > self._local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    def make_key(self, key, version=None):
+        return self.shared.make_key(key, version=version)
+
+    def get(self, key, default=None, version=None):
+        if not self._is_local(key):
+            return self.shared.get(key, default, version=version)
+        self._sync()
+        local_key = self.make_key(key, version)
+        item = self._local_get(local_key)
+        if item is not None:
+            return item[0]
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            return default
+        self._local_set(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        missing = []
+        for key in keys:
+            item = self._local_get(self.make_key(key, version)) if self._is_local(key) else None
+            if item is None:
+                missing.append(key)
+            else:
+                found[key] = item[0]
+        if missing:
+            shared = self.shared.get_many(missing, version=version)
+            for key, value in shared.items():
+                if self._is_local(key):
+                    self._local_set(self.make_key(key, version), value)
+            found.update(shared)
+        return found
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added and self._is_local(key):
+            self._local_set(self.make_key(key, version), value, timeout)
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        if self._is_local(key):
+            self._local_set(self.make_key(key, version), value, timeout)
+            self._bump_generation()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        local = [key for key in data if self._is_local(key)]
+        for key in local:
+            if key not in failed:
+                self._local_set(self.make_key(key, version), data[key], timeout)
+        if local:
+            self._bump_generation()
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        deleted = self.shared.delete(key, version=version)
+        if self._is_local(key):
+            self._local_delete(self.make_key(key, version))
+            self._bump_generation()
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self.shared.delete_many(keys, version=version)
+        local = [key for key in keys if self._is_local(key)]
+        for key in local:
+            self._local_delete(self.make_key(key, version))
+        if local:
+            self._bump_generation()
+
+    def has_key(self, key, version=None):
+        if self._is_local(key):
+            self._sync()
+            if self._local_get(self.make_key(key, version)) is not None:
+                return True
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        if self._is_local(key):
+            self._local_delete(self.make_key(key, version))
+            self._bump_generation()
+        return value
+
+    def clear(self):
+        self.clear_local()
+        self.shared.clear()
+        self._bump_generation()
+
+    def clear_local(self):
+        """Очищает только локальный уровень текущего процесса."""
+        with self._lock:
+            self._local.clear()
+
+
+class DatabaseCache(DjangoDatabaseCache):
+    """Кэш в таблице базы данных с записью set_many пачкой.
+
+    Стандартный бэкенд записывает каждый ключ set_many отдельно - тремя
+    запросами (проверка переполнения, выборка ключа, INSERT или UPDATE).
+    Здесь на всю пачку приходится четыре запроса: переполнение проверяется
+    один раз, существующие ключи выбираются одним SELECT, а UPDATE и INSERT
+    выполняются через executemany.
+    """
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        keys = {self.make_and_validate_key(key, version=version): key for key in data}
+        values = {
+            key: base64.b64encode(pickle.dumps(data[original], self.pickle_protocol)).decode('latin1')
+            for key, original in keys.items()
+        }
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            expires = datetime.max
+        else:
+            expires = datetime.fromtimestamp(timeout, tz=timezone.utc if settings.USE_TZ else None)
+        db = router.db_for_write(self.cache_model_class)
+        connection = connections[db]
+        quote_name = connection.ops.quote_name
+        table = quote_name(self._table)
+        expires = connection.ops.adapt_datetimefield_value(expires.replace(microsecond=0))
+        try:
+            with transaction.atomic(using=db), connection.cursor() as cursor:
+                cursor.execute(f'SELECT COUNT(*) FROM {table}')
+                num = cursor.fetchone()[0]
+                if num > self._max_entries:
+                    self._cull(db, cursor, tz_now().replace(microsecond=0), num)
+                cursor.execute(
+                    f'SELECT {quote_name("cache_key")} FROM {table} '
+                    f'WHERE {quote_name("cache_key")} IN ({", ".join(["%s"] * len(values))})',
+                    list(values),
+                )
+                existing = {row[0] for row in cursor.fetchall()}
+                updated = [(value, expires, key) for key, value in values.items() if key in existing]
+                inserted = [(key, value, expires) for key, value in values.items() if key not in existing]
+                if updated:
+                    cursor.executemany(
+                        f'UPDATE {table} SET {quote_name("value")} = %s, {quote_name("expires")} = %s '
+                        f'WHERE {quote_name("cache_key")} = %s',
+                        updated,
+                    )
+                if inserted:
+                    cursor.executemany(
+                        f'INSERT INTO {table} ({quote_name("cache_key")}, {quote_name("value")}, '
+                        f'{quote_name("expires")}) VALUES (%s, %s, %s)',
+                        inserted,
+                    )
+        except DatabaseError:
+            # Как и стандартный бэкенд, при одновременной записи ключа не падаем:
+            return list(data)
+        return []
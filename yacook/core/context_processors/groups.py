@@ -0,0 +1,10 @@
+from django.utils.functional import SimpleLazyObject
+
+from recipes.cache import get_groups
+
+
+def groups(request):
+    """Добавляет список групп рецептов для переключателя."""
+    return {
+        'groups': SimpleLazyObject(get_groups),
+    }
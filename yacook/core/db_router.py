@@ -0,0 +1,92 @@
+"""Чтение из реплик базы данных.
+
+ReplicaMiddleware отмечает запросы, которые можно обслужить из реплики,
+а ReplicaRouter направляет чтение таких запросов в реплику, выбранную
+взвешенным циклическим перебором. Запись всегда идёт в основную базу.
+После записи чтение до конца запроса и ещё REPLICA_PIN_SECONDS секунд
+для этого клиента идёт из основной базы, чтобы пользователь видел свои
+изменения, даже если реплика отстаёт.
+
+Таблица кэша (DatabaseCache) всегда читается и пишется в основной базе,
+а запись в кэш не считается записью запроса.
+"""
+import threading
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_state = ContextVar('replica_state', default=None)
+
+# app_label модели, через которую DatabaseCache обращается к роутеру:
+CACHE_APP_LABEL = 'django_cache'
+
+
+class WeightedRoundRobin:
+    """Плавный взвешенный циклический перебор: реплика с весом 2 выбирается
+    вдвое чаще реплики с весом 1, но не два раза подряд."""
+
+    def __init__(self, weights):
+        self.weights = dict(weights)
+        self.current = dict.fromkeys(self.weights, 0)
+        self.total = sum(self.weights.values())
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            for alias, weight in self.weights.items():
+                self.current[alias] += weight
+            alias = max(self.current, key=self.current.get)
+            self.current[alias] -= self.total
+            return alias
+
+
+_balancer = None
+
+
+def choose_replica():
+    """Следующая реплика или None, если реплики не настроены."""
+    global _balancer
+    if not settings.DATABASE_REPLICAS:
+        return None
+    if _balancer is None:
+        _balancer = WeightedRoundRobin(settings.DATABASE_REPLICAS)
+    return _balancer.next()
+
+
+def start(alias):
+    """Начинает запрос, чтение которого идёт из реплики alias."""
+    return _state.set({'alias': alias, 'wrote': False})
+
+
+def finish(token):
+    """Завершает запрос; возвращает True, если в нём была запись."""
+    state = _state.get()
+    _state.reset(token)
+    return bool(state and state['wrote'])
+
+
+class ReplicaRouter:
+    """Направляет чтение в реплику, выбранную для текущего запроса."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == CACHE_APP_LABEL:
+            return DEFAULT_DB_ALIAS
+        state = _state.get()
+        if state is None or state['wrote'] or state['alias'] is None:
+            return DEFAULT_DB_ALIAS
+        return state['alias']
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == CACHE_APP_LABEL:
+            return DEFAULT_DB_ALIAS
+        state = _state.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,29 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database to SQLite read replicas (for local testing of replica routing)'
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas configured, set REPLICA_DATABASES.')
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Replicas of other databases are synced by the database itself.')
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            replica = settings.DATABASES[alias]
+            if connections[alias].vendor != 'sqlite':
+                self.stderr.write(self.style.WARNING(f'{alias}: not an SQLite database, skipped'))
+                continue
+            connections[alias].close()
+            target = sqlite3.connect(replica['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(f'{alias}: copied to {replica["NAME"]}'))
@@ -0,0 +1,196 @@
+"""Сбор показателей производительности запросов.
+
+Для каждого запроса считаются количество SQL-запросов, время работы с базой,
+время рендеринга шаблонов и общее время ответа. Запросы к таблицам кэша
+(DatabaseCache) считаются отдельно и сверяются со своим бюджетом. Итоги
+копятся по именам представлений в памяти процесса и отдаются в текстовом
+формате Prometheus.
+
+Обёртка запросов ставится на каждое соединение при его открытии, а текущий
+запрос определяется через contextvars, поэтому запросы асинхронных
+представлений из рабочих потоков тоже попадают в показатели.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import cache
+
+from django.conf import settings
+from django.core.cache.backends.db import BaseDatabaseCache
+from django.utils.module_loading import import_string
+
+# Границы корзин гистограммы времени ответа, в секундах:
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+# Управление транзакциями не считается запросом: BEGIN отправляет запросом только
+# бэкенд SQLite, а точки сохранения ставит и каждая запись в DatabaseCache
+# внутри транзакции.
+TRANSACTION_STATEMENTS = ('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление выполнило больше SQL-запросов, чем разрешено бюджетом."""
+
+
+@dataclass
+class RequestMetrics:
+    """Показатели одного запроса."""
+    view: str = ''
+    queries: int = 0
+    db_time: float = 0.0
+    cache_queries: int = 0
+    cache_time: float = 0.0
+    template_time: float = 0.0
+    started: float = field(default_factory=time.perf_counter)
+    latency: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add_query(self, seconds):
+        with self._lock:
+            self.queries += 1
+            self.db_time += seconds
+
+    def add_cache_query(self, seconds):
+        with self._lock:
+            self.cache_queries += 1
+            self.cache_time += seconds
+
+    def add_template_time(self, seconds):
+        with self._lock:
+            self.template_time += seconds
+
+    def as_dict(self):
+        return {
+            'view': self.view,
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'cache_queries': self.cache_queries,
+            'cache_ms': round(self.cache_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'total_ms': round(self.latency * 1000, 2),
+        }
+
+
+def start():
+    """Начинает сбор показателей для текущего запроса."""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def current():
+    """Показатели текущего запроса или None вне запроса."""
+    return _current.get()
+
+
+@cache
+def cache_tables():
+    """Имена таблиц, в которых хранят данные кэши DatabaseCache."""
+    return tuple(
+        params['LOCATION'] for params in settings.CACHES.values()
+        if issubclass(import_string(params['BACKEND']), BaseDatabaseCache)
+    )
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """Обёртка для connection.execute_wrapper: считает запросы и их время."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        if any(table in sql for table in cache_tables()):
+            metrics.add_cache_query(seconds)
+        elif not sql.startswith(TRANSACTION_STATEMENTS):
+            metrics.add_query(seconds)
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """Обработчик сигнала connection_created: ставит обёртку на новое соединение."""
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, query_wrapper)
+
+
+def add_template_time(seconds):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_template_time(seconds)
+
+
+class Registry:
+    """Накопленные показатели процесса по представлениям."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, metrics):
+        with self._lock:
+            view = self._views.setdefault(metrics.view, {
+                'requests': 0,
+                'queries': 0,
+                'db_seconds': 0.0,
+                'cache_queries': 0,
+                'cache_seconds': 0.0,
+                'template_seconds': 0.0,
+                'latency_seconds': 0.0,
+                'buckets': [0] * len(LATENCY_BUCKETS),
+            })
+            view['requests'] += 1
+            view['queries'] += metrics.queries
+            view['db_seconds'] += metrics.db_time
+            view['cache_queries'] += metrics.cache_queries
+            view['cache_seconds'] += metrics.cache_time
+            view['template_seconds'] += metrics.template_time
+            view['latency_seconds'] += metrics.latency
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if metrics.latency <= bound:
+                    view['buckets'][index] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: {**data, 'buckets': list(data['buckets'])} for name, data in self._views.items()}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def prometheus(self):
+        """Показатели в текстовом формате Prometheus."""
+        lines = []
+        counters = (
+            ('requests', 'yacook_view_requests_total', 'Number of handled requests'),
+            ('queries', 'yacook_view_queries_total', 'Number of executed SQL queries'),
+            ('db_seconds', 'yacook_view_db_seconds_total', 'Time spent in the database'),
+            ('cache_queries', 'yacook_view_cache_queries_total', 'Number of SQL queries to database cache tables'),
+            ('cache_seconds', 'yacook_view_cache_seconds_total', 'Time spent in database cache tables'),
+            ('template_seconds', 'yacook_view_template_seconds_total', 'Time spent rendering templates'),
+        )
+        snapshot = self.snapshot()
+        for key, name, description in counters:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} counter')
+            for view, data in sorted(snapshot.items()):
+                lines.append(f'{name}{{view="{view}"}} {data[key]}')
+        name = 'yacook_view_latency_seconds'
+        lines.append(f'# HELP {name} Request latency')
+        lines.append(f'# TYPE {name} histogram')
+        for view, data in sorted(snapshot.items()):
+            for bound, count in zip(LATENCY_BUCKETS, data['buckets']):
+                lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {data["requests"]}')
+            lines.append(f'{name}_sum{{view="{view}"}} {data["latency_seconds"]}')
+            lines.append(f'{name}_count{{view="{view}"}} {data["requests"]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -0,0 +1,165 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from . import db_router, metrics, template_profiler
+
+logger = logging.getLogger('yacook.performance')
+
+
+class PerformanceMiddleware:
+    """Считает SQL-запросы, время базы, шаблонов и ответа для каждого представления.
+
+    Если представление превысило бюджет из VIEW_QUERY_BUDGETS, пишется
+    предупреждение, а при QUERY_BUDGET_STRICT = True выбрасывается
+    исключение - так тесты в CI падают на регрессиях вида N+1.
+    С TEMPLATE_PROFILING = True в журнал попадают и самые медленные шаблоны.
+    Работает и в синхронной, и в асинхронной цепочке обработчиков.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request_metrics, token = metrics.start()
+        profile, profile_token = self.start_profile()
+        try:
+            response = self.get_response(request)
+            self.process(request, response, request_metrics, profile)
+        finally:
+            self.finish_profile(profile_token)
+            metrics.finish(token)
+        return response
+
+    async def __acall__(self, request):
+        request_metrics, token = metrics.start()
+        profile, profile_token = self.start_profile()
+        try:
+            response = await self.get_response(request)
+            self.process(request, response, request_metrics, profile)
+        finally:
+            self.finish_profile(profile_token)
+            metrics.finish(token)
+        return response
+
+    def start_profile(self):
+        if not settings.TEMPLATE_PROFILING:
+            return None, None
+        return template_profiler.start()
+
+    def finish_profile(self, token):
+        if token is not None:
+            template_profiler.finish(token)
+
+    def process(self, request, response, request_metrics, profile=None):
+        request_metrics.latency = time.perf_counter() - request_metrics.started
+        match = request.resolver_match
+        request_metrics.view = match.view_name if match else 'unresolved'
+        if request_metrics.view != settings.METRICS_VIEW_NAME:
+            metrics.registry.record(request_metrics)
+            self.log(request, response, request_metrics, profile)
+            self.check_budget(request_metrics)
+
+    def log(self, request, response, request_metrics, profile=None):
+        entry = {
+            **request_metrics.as_dict(),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+        }
+        if profile is not None:
+            entry['templates'] = profile.as_dict()
+        logger.info(json.dumps(entry, ensure_ascii=False))
+
+    def check_budget(self, request_metrics):
+        """Сверяет запросы представления с бюджетами: к данным и к таблицам кэша отдельно."""
+        checks = (
+            (settings.VIEW_QUERY_BUDGETS, request_metrics.queries, 'queries'),
+            (settings.VIEW_CACHE_QUERY_BUDGETS, request_metrics.cache_queries, 'cache queries'),
+        )
+        for budgets, executed, kind in checks:
+            budget = budgets.get(request_metrics.view)
+            if budget is None or executed <= budget:
+                continue
+            message = f'{request_metrics.view} executed {executed} {kind}, budget is {budget}'
+            if settings.QUERY_BUDGET_STRICT:
+                raise metrics.QueryBudgetExceeded(message)
+            logger.warning(message)
+
+
+class ReplicaMiddleware:
+    """Обслуживает GET-запросы к представлениям из REPLICA_VIEW_MODULES из реплик.
+
+    Если в запросе была запись, клиент получает куку REPLICA_PIN_COOKIE,
+    и следующие REPLICA_PIN_SECONDS секунд его запросы читают из основной
+    базы - так пользователь сразу видит свои изменения.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = db_router.start(self.choose_database(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = db_router.finish(token)
+        return self.process(request, response, wrote)
+
+    async def __acall__(self, request):
+        token = db_router.start(self.choose_database(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            wrote = db_router.finish(token)
+        return self.process(request, response, wrote)
+
+    def choose_database(self, request):
+        """Реплика для запроса или None, если читать нужно из основной базы."""
+        if not settings.DATABASE_REPLICAS or request.method not in ('GET', 'HEAD'):
+            return None
+        if self.pinned(request):
+            return None
+        try:
+            match = resolve(request.path_info, getattr(request, 'urlconf', None))
+        except Resolver404:
+            return None
+        view = getattr(match.func, 'view_class', match.func)
+        if view.__module__ not in settings.REPLICA_VIEW_MODULES:
+            return None
+        return db_router.choose_replica()
+
+    def pinned(self, request):
+        try:
+            return float(request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def process(self, request, response, wrote):
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                str(time.time() + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
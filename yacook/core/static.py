@@ -0,0 +1,216 @@
+"""Отдача статических файлов из STATIC_ROOT в обход Django.
+
+Обёртки WSGI- и ASGI-приложения при запуске один раз обходят STATIC_ROOT и
+отвечают на GET и HEAD к STATIC_URL сами, остальные запросы передаются
+приложению. Готовые копии .br и .gz из CompressedManifestStaticFilesStorage
+выбираются по заголовку Accept-Encoding. Файлы с хэшем в имени (из манифеста
+collectstatic) кэшируются браузером на год без повторных проверок, остальные -
+на STATIC_MAX_AGE секунд с проверкой по ETag и Last-Modified.
+"""
+import json
+import mimetypes
+import os
+from http import HTTPStatus
+from wsgiref.util import FileWrapper
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.http import http_date, parse_http_date_safe
+
+from .storage import ENCODINGS
+
+# Кэширование файлов с хэшем содержимого в имени:
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Размер блока, которым отдаётся файл:
+BLOCK_SIZE = 64 * 1024
+# Порядок предпочтения сжатых копий:
+PREFERRED_ENCODINGS = ('br', 'gzip')
+MANIFEST_NAME = 'staticfiles.json'
+
+
+class StaticFile:
+    """Файл и его сжатые копии с заранее посчитанными заголовками."""
+
+    def __init__(self, path, cache_control):
+        self.variants = {None: self.variant(path)}
+        for encoding, suffix in ENCODINGS.items():
+            if os.path.isfile(path + suffix):
+                self.variants[encoding] = self.variant(path + suffix, encoding)
+        content_type, _ = mimetypes.guess_type(path)
+        self.headers = [
+            ('Content-Type', content_type or 'application/octet-stream'),
+            ('Cache-Control', cache_control),
+        ]
+        if len(self.variants) > 1:
+            self.headers.append(('Vary', 'Accept-Encoding'))
+
+    @staticmethod
+    def variant(path, encoding=None):
+        stat = os.stat(path)
+        suffix = f'-{encoding}' if encoding else ''
+        return {
+            'path': path,
+            'size': stat.st_size,
+            'mtime': int(stat.st_mtime),
+            'etag': f'"{int(stat.st_mtime):x}-{stat.st_size:x}{suffix}"',
+        }
+
+    def choose(self, accept_encoding):
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in PREFERRED_ENCODINGS:
+            if encoding in self.variants and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                return encoding
+        return None
+
+
+def parse_accept_encoding(value):
+    """Заголовок Accept-Encoding в словарь кодировка -> q."""
+    accepted = {}
+    for item in (value or '').split(','):
+        encoding, _, params = item.partition(';')
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+        quality = 1.0
+        name, _, number = params.strip().partition('=')
+        if name.strip() == 'q':
+            try:
+                quality = float(number)
+            except ValueError:
+                quality = 0.0
+        accepted[encoding] = quality
+    return accepted
+
+
+class StaticFiles:
+    """Индекс файлов STATIC_ROOT по адресам."""
+
+    def __init__(self, root, prefix):
+        self.prefix = prefix
+        self.files = {}
+        if not root or not os.path.isdir(root):
+            return
+        hashed = self.hashed_names(root)
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if name.endswith(tuple(ENCODINGS.values())) or name == MANIFEST_NAME:
+                    continue
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, root).replace(os.sep, '/')
+                if relative in hashed:
+                    cache_control = IMMUTABLE_CACHE_CONTROL
+                else:
+                    cache_control = f'public, max-age={settings.STATIC_MAX_AGE}'
+                self.files[prefix + relative] = StaticFile(path, cache_control)
+
+    @staticmethod
+    def hashed_names(root):
+        try:
+            with open(os.path.join(root, MANIFEST_NAME), encoding='utf-8') as file:
+                return set(json.load(file).get('paths', {}).values())
+        except (OSError, ValueError):
+            return set()
+
+    def respond(self, method, path, header):
+        """Ответ на запрос к статике: (статус, заголовки, путь к файлу или None).
+
+        None вместо ответа - запрос не к известному файлу, его обрабатывает
+        приложение. header - функция, возвращающая заголовок запроса по имени.
+        """
+        if method not in ('GET', 'HEAD'):
+            return None
+        static_file = self.files.get(path)
+        if static_file is None:
+            return None
+        encoding = static_file.choose(header('Accept-Encoding'))
+        variant = static_file.variants[encoding]
+        headers = [
+            *static_file.headers,
+            ('ETag', variant['etag']),
+            ('Last-Modified', http_date(variant['mtime'])),
+        ]
+        if self.not_modified(variant, header):
+            return HTTPStatus.NOT_MODIFIED, headers, None
+        headers.append(('Content-Length', str(variant['size'])))
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        return HTTPStatus.OK, headers, variant['path'] if method == 'GET' else None
+
+    @staticmethod
+    def not_modified(variant, header):
+        if_none_match = header('If-None-Match')
+        if if_none_match is not None:
+            etags = [etag.strip().removeprefix('W/') for etag in if_none_match.split(',')]
+            return '*' in etags or variant['etag'] in etags
+        since = parse_http_date_safe(header('If-Modified-Since') or '')
+        return since is not None and variant['mtime'] <= since
+
+
+def static_prefix():
+    return settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+
+
+class StaticFilesWSGIHandler:
+    """WSGI-обёртка, отдающая статику из STATIC_ROOT."""
+
+    def __init__(self, application):
+        self.application = application
+        self.files = StaticFiles(settings.STATIC_ROOT, static_prefix())
+
+    def __call__(self, environ, start_response):
+        path = environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', '')
+        response = None
+        if path.startswith(self.files.prefix):
+            response = self.files.respond(
+                environ['REQUEST_METHOD'],
+                path,
+                lambda name: environ.get('HTTP_' + name.upper().replace('-', '_')),
+            )
+        if response is None:
+            return self.application(environ, start_response)
+        status, headers, file_path = response
+        start_response(f'{status.value} {status.phrase}', headers)
+        if file_path is None:
+            return []
+        file = open(file_path, 'rb')
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(file, BLOCK_SIZE)
+
+
+class StaticFilesASGIHandler:
+    """ASGI-обёртка, отдающая статику из STATIC_ROOT."""
+
+    def __init__(self, application):
+        self.application = application
+        self.files = StaticFiles(settings.STATIC_ROOT, static_prefix())
+
+    async def __call__(self, scope, receive, send):
+        response = None
+        if scope['type'] == 'http' and scope['path'].startswith(self.files.prefix):
+            headers = {
+                name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']
+            }
+            response = self.files.respond(scope['method'], scope['path'], lambda name: headers.get(name.lower()))
+        if response is None:
+            return await self.application(scope, receive, send)
+        status, headers, file_path = response
+        await send({
+            'type': 'http.response.start',
+            'status': status.value,
+            'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        })
+        if file_path is None:
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        file = await sync_to_async(open, thread_sensitive=False)(file_path, 'rb')
+        try:
+            read = sync_to_async(file.read, thread_sensitive=False)
+            block = await read(BLOCK_SIZE)
+            while True:
+                following = await read(BLOCK_SIZE)
+                await send({'type': 'http.response.body', 'body': block, 'more_body': bool(following)})
+                if not following:
+                    break
+                block = following
+        finally:
+            file.close()
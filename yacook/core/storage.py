@@ -0,0 +1,59 @@
+"""Хранилище статических файлов с хэшами в именах и сжатыми копиями.
+
+collectstatic сохраняет файлы под именами с хэшем содержимого (их можно
+кэшировать навсегда) и рядом с каждым сжимаемым файлом пишет копию .gz, а
+при установленном пакете brotli - ещё и .br. Сжатые копии отдаёт
+core.static без сжатия на лету.
+"""
+import gzip
+from importlib import import_module
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+brotli = import_module('brotli') if find_spec('brotli') else None
+
+# Сжатые копии создаются только для текстовых форматов:
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.webmanifest',
+)
+# Копия сохраняется, только если она меньше исходного файла хотя бы на эту долю:
+MIN_SAVING = 0.05
+ENCODINGS = {'gzip': '.gz', 'br': '.br'}
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content)
+    # mtime=0, чтобы сжатая копия не менялась при повторном collectstatic:
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def available_encodings():
+    return ['gzip', 'br'] if brotli is not None and settings.STATIC_BROTLI else ['gzip']
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage, который дополнительно пишет сжатые копии файлов."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in paths:
+            if name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress_file(name)
+                self.compress_file(self.stored_name(name))
+
+    def compress_file(self, name):
+        with self.open(name) as file:
+            content = file.read()
+        for encoding in available_encodings():
+            compressed_name = name + ENCODINGS[encoding]
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            data = compress(content, encoding)
+            if len(data) <= len(content) * (1 - MIN_SAVING):
+                self.save(compressed_name, ContentFile(data))
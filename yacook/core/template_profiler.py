@@ -0,0 +1,124 @@
+"""Профилирование рендеринга шаблонов.
+
+Замеряется время каждого шаблона, включая подключённые через include и
+extends, а при необходимости и каждого тега и вывода переменной. Для каждого
+имени считаются число вызовов, полное время и собственное время - без
+вложенных шаблонов (или узлов).
+
+Замер ставится заменой Template._render и Node.render_annotated при вызове
+install() (при запуске с TEMPLATE_PROFILING = True или командой
+profile_templates) и работает только внутри start()/finish().
+"""
+import time
+from contextvars import ContextVar
+
+from django.template.base import Node, Template, VariableNode
+
+_current = ContextVar('template_profile', default=None)
+_original_render = Template._render
+_original_render_annotated = Node.render_annotated
+
+
+class Profile:
+    """Время шаблонов и узлов одного запроса или прогона."""
+
+    def __init__(self, nodes=False):
+        self.nodes_enabled = nodes
+        # Имя -> [вызовы, полное время, собственное время]:
+        self.templates = {}
+        self.nodes = {}
+        self._template_stack = []
+        self._node_stack = []
+
+    def measure(self, totals, stack, name, render, *args):
+        frame = [0.0]
+        stack.append(frame)
+        started = time.perf_counter()
+        try:
+            return render(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+            entry = totals.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] += elapsed - frame[0]
+
+    def merge(self, other):
+        for totals, other_totals in ((self.templates, other.templates), (self.nodes, other.nodes)):
+            for name, (calls, total, own) in other_totals.items():
+                entry = totals.setdefault(name, [0, 0.0, 0.0])
+                entry[0] += calls
+                entry[1] += total
+                entry[2] += own
+
+    def top(self, kind='templates', limit=10):
+        """Самые медленные по собственному времени: список (имя, вызовы, полное, собственное)."""
+        totals = self.templates if kind == 'templates' else self.nodes
+        ranked = sorted(totals.items(), key=lambda item: item[1][2], reverse=True)
+        return [(name, calls, total, own) for name, (calls, total, own) in ranked[:limit]]
+
+    def as_dict(self, limit=5):
+        return {
+            name: {'calls': calls, 'ms': round(total * 1000, 2), 'self_ms': round(own * 1000, 2)}
+            for name, calls, total, own in self.top(limit=limit)
+        }
+
+
+def template_name(template):
+    return template.origin.template_name or template.name or '<string>'
+
+
+def node_name(node):
+    """Имя узла в отчёте: тег или переменная со списком фильтров."""
+    name = getattr(node, '_profile_name', None)
+    if name is None:
+        if isinstance(node, VariableNode):
+            filters = ''.join(f'|{func.__name__}' for func, _ in node.filter_expression.filters)
+            name = '{{ var%s }}' % filters
+        elif getattr(node, 'token', None) is not None:
+            name = '{%% %s %%}' % node.token.split_contents()[0]
+        else:
+            name = type(node).__name__
+        node._profile_name = name
+    return name
+
+
+def _render(self, context):
+    profile = _current.get()
+    if profile is None:
+        return _original_render(self, context)
+    return profile.measure(
+        profile.templates, profile._template_stack, template_name(self), _original_render, self, context
+    )
+
+
+def _render_annotated(self, context):
+    profile = _current.get()
+    if profile is None or not profile.nodes_enabled:
+        return _original_render_annotated(self, context)
+    return profile.measure(
+        profile.nodes, profile._node_stack, node_name(self), _original_render_annotated, self, context
+    )
+
+
+def install():
+    """Включает замеры; повторный вызов ничего не меняет."""
+    Template._render = _render
+    Node.render_annotated = _render_annotated
+
+
+def start(nodes=False):
+    """Начинает профилирование в текущем контексте."""
+    profile = Profile(nodes)
+    return profile, _current.set(profile)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
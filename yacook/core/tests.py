@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+User = get_user_model()
+
+
+@override_settings(METRICS_TOKEN='secret-token')
+class MetricsAccessTests(TestCase):
+    """Показатели доступны сотрудникам и по токену, но не по адресу клиента."""
+
+    def setUp(self):
+        self.url = reverse('metrics')
+
+    def test_local_address_is_not_enough(self):
+        response = self.client.get(self.url, REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+    def test_wrong_token(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+    def test_token(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer secret-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('yacook_view_requests_total', response.content.decode())
+
+    @override_settings(METRICS_TOKEN='')
+    def test_empty_token_is_disabled(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 403)
+
+    def test_staff(self):
+        self.client.force_login(User.objects.create_user(username='staff', is_staff=True))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_regular_user(self):
+        self.client.force_login(User.objects.create_user(username='reader'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class DatabaseCacheTests(TestCase):
+    """Запись set_many пачкой в общий кэш в базе данных."""
+
+    def setUp(self):
+        self.cache = caches['shared']
+        self.cache.clear()
+
+    def test_set_many_inserts_and_updates(self):
+        self.cache.set('old', 1)
+        with CaptureQueriesContext(connection) as queries:
+            failed = self.cache.set_many({'old': 2, **{f'new{number}': number for number in range(10)}})
+        self.assertEqual(failed, [])
+        writes = [query for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len(writes), 4)
+        self.assertEqual(self.cache.get('old'), 2)
+        self.assertEqual(self.cache.get_many(['new0', 'new9']), {'new0': 0, 'new9': 9})
+
+    def test_timeout(self):
+        self.cache.set_many({'expired': 1}, timeout=-1)
+        self.assertIsNone(self.cache.get('expired'))
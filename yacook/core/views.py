@@ -1,5 +1,12 @@
+import hmac
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from .metrics import registry
+
 
 def page_not_found(request, exception):
     """Страница не найдена."""
@@ -19,3 +26,24 @@ def permission_denied(request, exception):
 def csrf_failure(request, reason=''):
     """Ошибка CSRF токена."""
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    """Показатели производительности в формате Prometheus.
+
+    Доступны сотрудникам и по токену METRICS_TOKEN в заголовке
+    Authorization: Bearer. Адрес клиента не проверяется: за обратным
+    прокси все запросы приходят с 127.0.0.1.
+    """
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    allowed = request.user.is_staff or (
+        settings.METRICS_TOKEN
+        and scheme.lower() == 'bearer'
+        and hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode())
+    )
+    if not allowed:
+        raise PermissionDenied
+    return HttpResponse(
+        registry.prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -1,24 +1,123 @@
-from django.contrib import admin
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache, counters, search
 from .models import Recipe, Group, Comment, Follow
+from .paginator import EstimatedCountPaginator
+
+
+class GroupChoiceForm(forms.Form):
+    """Группа, в которую переносятся рецепты."""
+    group = forms.ModelChoiceField(
+        Group.objects.order_by('title'),
+        label='Группа',
+        required=False,
+        empty_label='-без группы-'
+    )
+
+
+class RecipeActionForm(ActionForm, GroupChoiceForm):
+    """Форма действий над рецептами с выбором группы для переноса."""
+
+
+def reassign_group(recipes, group):
+    """Переносит рецепты в группу одним UPDATE, возвращает их число.
+
+    Сигналы при этом не отправляются, поэтому счётчики групп, версии
+    карточек и отметки изменения страниц обновляются здесь.
+    """
+    group_id = group.pk if group else None
+    recipes = Recipe.objects.filter(pk__in=recipes.values('pk')).exclude(group_id=group_id)
+    with transaction.atomic():
+        moved = list(recipes.values_list('pk', 'author_id', 'group_id'))
+        if not moved:
+            return 0
+        recipes.update(group_id=group_id, updated=timezone.now())
+        deltas = {}
+        for _, _, previous_group_id in moved:
+            if previous_group_id:
+                scope = counters.group_scope(previous_group_id)
+                deltas[scope] = deltas.get(scope, 0) - 1
+        if group_id:
+            deltas[counters.group_scope(group_id)] = len(moved)
+        counters.change(deltas)
+    cache.bump_versions(cache.RECIPE, [pk for pk, _, _ in moved])
+    scopes = {cache.ALL_RECIPES}
+    for _, author_id, previous_group_id in moved:
+        scopes.add(cache.scope(cache.AUTHOR, author_id))
+        if previous_group_id:
+            scopes.add(cache.scope(cache.GROUP, previous_group_id))
+    if group_id:
+        scopes.add(cache.scope(cache.GROUP, group_id))
+    cache.touch(*scopes)
+    return len(moved)
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     """Админка для рецептов."""
     list_display = ('pk', 'title', 'pub_date', 'author', 'group')
-    list_editable = ('group',)
-    search_fields = ('text',)
+    list_select_related = ('author', 'group')
+    search_fields = ('title', 'ingredients')
     list_filter = ('pub_date',)
+    autocomplete_fields = ('author', 'group')
+    actions = ('change_group',)
+    action_form = RecipeActionForm
+    paginator = EstimatedCountPaginator
+    list_per_page = settings.ADMIN_LIST_PER_PAGE
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE по всей таблице."""
+        if not search_term.strip():
+            return queryset, False
+        if search_term.strip().isdigit():
+            return queryset.filter(pk=int(search_term)), False
+        return search.search_recipes(queryset, search_term, fields=self.search_fields), False
+
+    @admin.action(description='Перенести в выбранную группу')
+    def change_group(self, request, queryset):
+        form = GroupChoiceForm(request.POST)
+        if not form.is_valid():
+            self.message_user(request, 'Такой группы нет.', messages.ERROR)
+            return
+        group = form.cleaned_data['group']
+        moved = reassign_group(queryset, group)
+        self.message_user(request, f'Перенесено рецептов: {moved}.', messages.SUCCESS)
+
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     """Админка для комментариев"""
     list_display = ('pk', 'text', 'created', 'author', 'recipe')
+    list_select_related = ('author', 'recipe')
     list_filter = ('created',)
+    autocomplete_fields = ('author', 'recipe')
+    ordering = ('-pk',)
+    paginator = EstimatedCountPaginator
+    list_per_page = settings.ADMIN_LIST_PER_PAGE
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
-admin.site.register(Group)
-admin.site.register(Follow)
+@admin.register(Group)
+class GroupAdmin(admin.ModelAdmin):
+    """Админка для групп."""
+    list_display = ('pk', 'title', 'slug')
+    search_fields = ('title', 'slug')
+    ordering = ('title',)
+
+
+@admin.register(Follow)
+class FollowAdmin(admin.ModelAdmin):
+    """Админка для подписок."""
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,172 @@
+"""JSON API только для чтения: рецепты, группы и комментарии.
+
+Поля ответа выбираются параметром fields и запрашиваются через values(),
+без создания объектов моделей и рендеринга шаблонов. Списки листаются по
+курсору, ответы проверяются по ETag и сжимаются gzip, если клиент его
+принимает.
+"""
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_safe
+
+from .conditional import conditional_page, recipe_modified, recipes_modified, site_modified
+from .models import Comment, Group, Recipe
+from .paginator import DEFAULT_ORDERING, CursorPaginator, InvalidCursor
+
+# Поля ответа и соответствующие им поля запроса:
+RECIPE_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'description': 'description',
+    'ingredients': 'ingredients',
+    'technology': 'technology',
+    'image': 'image',
+    'pub_date': 'pub_date',
+    'updated': 'updated',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'comments_count': 'comments_count',
+}
+# Поля списка рецептов по умолчанию, без длинных текстов:
+RECIPE_LIST_FIELDS = ('id', 'title', 'author', 'group', 'pub_date', 'comments_count')
+GROUP_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'slug': 'slug',
+    'description': 'description',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'created': 'created',
+    'author': 'author__username',
+}
+COMMENT_ORDERING = ('-created', '-id')
+
+# Преобразование значений перед выводом:
+CONVERTERS = {
+    'image': lambda name: settings.MEDIA_URL + name if name else None,
+}
+
+
+class InvalidParameter(Exception):
+    """Недопустимое значение параметра запроса."""
+
+
+def json_response(data, status=200):
+    return HttpResponse(
+        json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')),
+        content_type='application/json',
+        status=status,
+    )
+
+
+def api_view(last_modified_func):
+    """Только GET и HEAD, условные запросы, сжатие gzip и ошибки в JSON."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                return view(request, *args, **kwargs)
+            except InvalidParameter as error:
+                return json_response({'error': str(error)}, status=400)
+            except Http404 as error:
+                return json_response({'error': str(error)}, status=404)
+        return require_safe(gzip_page(conditional_page(last_modified_func)(wrapper)))
+    return decorator
+
+
+def get_fields(request, available, default=None):
+    """Поля из параметра fields; без него - default или все поля."""
+    raw = request.GET.get('fields', '')
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    if not names:
+        return list(default or available)
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise InvalidParameter(
+            f'Unknown fields: {", ".join(unknown)}. Available: {", ".join(available)}.'
+        )
+    return list(dict.fromkeys(names))
+
+
+def get_limit(request):
+    try:
+        limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+    except ValueError:
+        raise InvalidParameter('limit must be an integer.')
+    if not 1 <= limit <= settings.API_MAX_PAGE_SIZE:
+        raise InvalidParameter(f'limit must be between 1 and {settings.API_MAX_PAGE_SIZE}.')
+    return limit
+
+
+def project(queryset, available, names, ordering=()):
+    """values() только с выбранными полями и полями сортировки для курсора."""
+    lookups = [available[name] for name in names]
+    lookups += [name.lstrip('-') for name in ordering]
+    return queryset.values(*dict.fromkeys(lookups))
+
+
+def serialize(rows, available, names):
+    fields = [(name, available[name], CONVERTERS.get(name)) for name in names]
+    return [
+        {name: convert(row[lookup]) if convert else row[lookup] for name, lookup, convert in fields}
+        for row in rows
+    ]
+
+
+def paginated(request, queryset, available, names, ordering):
+    """Страница списка по курсору из параметра cursor."""
+    paginator = CursorPaginator(project(queryset, available, names, ordering), get_limit(request), ordering)
+    try:
+        page = paginator.get_page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise InvalidParameter('cursor is invalid.')
+    return json_response({
+        'results': serialize(page.object_list, available, names),
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+@api_view(recipes_modified)
+def recipe_list(request):
+    """Рецепты от новых к старым, с отбором по группе и автору."""
+    names = get_fields(request, RECIPE_FIELDS, RECIPE_LIST_FIELDS)
+    recipes = Recipe.objects.all()
+    if request.GET.get('group'):
+        recipes = recipes.filter(group__slug=request.GET['group'])
+    if request.GET.get('author'):
+        recipes = recipes.filter(author__username=request.GET['author'])
+    return paginated(request, recipes, RECIPE_FIELDS, names, DEFAULT_ORDERING)
+
+
+@api_view(recipe_modified)
+def recipe_detail(request, recipe_id):
+    names = get_fields(request, RECIPE_FIELDS)
+    row = project(Recipe.objects.filter(pk=recipe_id), RECIPE_FIELDS, names).first()
+    if row is None:
+        raise Http404('Recipe not found.')
+    return json_response(serialize([row], RECIPE_FIELDS, names)[0])
+
+
+@api_view(recipe_modified)
+def comment_list(request, recipe_id):
+    """Комментарии рецепта от новых к старым."""
+    names = get_fields(request, COMMENT_FIELDS)
+    if not Recipe.objects.filter(pk=recipe_id).exists():
+        raise Http404('Recipe not found.')
+    comments = Comment.objects.filter(recipe_id=recipe_id)
+    return paginated(request, comments, COMMENT_FIELDS, names, COMMENT_ORDERING)
+
+
+@api_view(site_modified)
+def group_list(request):
+    names = get_fields(request, GROUP_FIELDS)
+    groups = project(Group.objects.order_by('title', 'id'), GROUP_FIELDS, names)
+    return json_response({'results': serialize(groups, GROUP_FIELDS, names)})
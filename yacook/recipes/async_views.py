@@ -0,0 +1,154 @@
+"""Асинхронные версии страниц просмотра рецептов для запуска под ASGI.
+
+Запросы страницы к базе выполняются одной единицей работы через
+sync_to_async(thread_sensitive=True) - в том же потоке, что и остальной
+синхронный код запроса, поэтому соединениями управляет сам Django
+(CONN_MAX_AGE, CONN_HEALTH_CHECKS). Пока база отвечает, цикл событий
+обслуживает другие запросы.
+"""
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.http import urlencode
+
+from . import counters
+from .cache import get_groups
+from .conditional import (
+    conditional_page, group_modified, profile_modified, recipe_modified, recipes_modified
+)
+from .forms import CommentForm
+from .models import Follow, Group, Recipe, User
+from .search import count_results, search_recipes
+from .similar import similar_recipes
+from .stats import get_stats
+from .views import get_comments_page, get_paginator
+
+async def run(*funcs):
+    """Выполняет синхронные функции с запросами к базе одной единицей работы."""
+    return await sync_to_async(lambda: [func() for func in funcs], thread_sensitive=True)()
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+
+
+async def arender(request, template, context):
+    return await sync_to_async(render)(request, template, context)
+
+
+@conditional_page(recipes_modified)
+async def index(request):
+    """Главная страница."""
+    template = 'recipes/index.html'
+    recipes = Recipe.objects.select_related('author', 'group')
+    page_obj, groups = await run(
+        lambda: get_paginator(request, recipes, count=partial(counters.get_total, counters.SITE)),
+        get_groups,
+    )
+    context = {
+        'page_obj': page_obj,
+        'groups': groups,
+    }
+    return await arender(request, template, context)
+
+
+@conditional_page(group_modified)
+async def group_list(request, slug):
+    """Страница группы рецептов."""
+    template = 'recipes/group_list.html'
+    recipes = Recipe.objects.filter(group__slug=slug).select_related('author', 'group')
+    # Количество читается при рендеринге, когда группа уже получена:
+    group, page_obj, groups = await run(
+        lambda: Group.objects.filter(slug=slug).first(),
+        lambda: get_paginator(request, recipes, count=lambda: counters.get_total(counters.group_scope(group.pk))),
+        get_groups,
+    )
+    if group is None:
+        raise Http404('No Group matches the given query.')
+    context = {
+        'group': group,
+        'page_obj': page_obj,
+        'groups': groups,
+    }
+    return await arender(request, template, context)
+
+
+@conditional_page(profile_modified)
+async def profile(request, username):
+    """Страница профайла пользователя."""
+    template = 'recipes/profile.html'
+    author = await aget_object_or_404(User.objects.all(), username=username)
+    recipes = author.recipes.select_related('group')
+    following, stats, page_obj, groups = await run(
+        lambda: (
+            request.user.is_authenticated
+            and Follow.objects.filter(author=author, user=request.user).exists()
+        ),
+        lambda: get_stats(author.pk),
+        lambda: get_paginator(request, recipes),
+        get_groups,
+    )
+    context = {
+        'author': author,
+        'following': following,
+        'stats': stats,
+        'page_obj': page_obj,
+        'groups': groups,
+    }
+    return await arender(request, template, context)
+
+
+@conditional_page(recipe_modified)
+async def recipe_detail(request, recipe_id):
+    """Страница просмотра рецепта."""
+    template = 'recipes/recipe_detail.html'
+    recipe, comments, similar, groups = await run(
+        lambda: Recipe.objects.select_related('author', 'group').filter(pk=recipe_id).first(),
+        lambda: get_comments_page(recipe_id, request.GET.get('comments')),
+        lambda: list(similar_recipes(recipe_id)),
+        get_groups,
+    )
+    if recipe is None:
+        raise Http404('No Recipe matches the given query.')
+    author_stats = await sync_to_async(get_stats)(recipe.author_id)
+    context = {
+        'recipe': recipe,
+        'recipe_id': recipe.pk,
+        'author_stats': author_stats,
+        'similar': similar,
+        'form': CommentForm(),
+        'comments': comments,
+        'groups': groups,
+    }
+    return await arender(request, template, context)
+
+
+@conditional_page(recipes_modified)
+async def search(request):
+    """Страница отображения результатов поискового запроса."""
+    template = 'recipes/search.html'
+    data_search = request.GET.get('s', '').strip()
+    recipes = search_recipes(Recipe.objects.select_related('author', 'group'), data_search)
+    page_obj, groups = await run(
+        lambda: get_paginator(
+            request,
+            recipes,
+            ordering=('rank', '-pub_date', '-id'),
+            count=partial(count_results, recipes, settings.SEARCH_COUNT_LIMIT)
+        ),
+        get_groups,
+    )
+    context = {
+        'data_search': data_search,
+        'page_obj': page_obj,
+        'count_limit': settings.SEARCH_COUNT_LIMIT,
+        's': f'{urlencode({"s": data_search})}&',
+        'groups': groups,
+    }
+    return await arender(request, template, context)
@@ -0,0 +1,140 @@
+"""Кэширование справочных данных и версии объектов для ключей кэша фрагментов.
+
+Вместо удаления закэшированных фрагментов при изменении объекта меняется
+его версия: старые фрагменты просто перестают запрашиваться и со временем
+вытесняются из кэша.
+
+Для условных GET-запросов хранится и время последнего изменения областей
+страниц: всех рецептов, группы, автора, комментариев рецепта.
+"""
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from .models import Group
+
+VERSION_KEY = 'version:{kind}:{pk}'
+MODIFIED_KEY = 'modified:{scope}'
+GROUPS_KEY = 'groups:links'
+
+RECIPE = 'recipe'
+GROUP = 'group'
+AUTHOR = 'author'
+FOLLOWER = 'follower'
+
+# Области для времени изменения страниц:
+ALL_RECIPES = 'recipes'
+# Изменения, которые видны на всех страницах: группы, имена пользователей,
+# массовый импорт.
+SITE = 'site'
+
+
+def _key(kind, pk):
+    return VERSION_KEY.format(kind=kind, pk=pk)
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def bump_version(kind, pk):
+    """Выдаёт объекту новую версию."""
+    cache.set(_key(kind, pk), _new_version(), None)
+
+
+def bump_versions(kind, pks):
+    """Выдаёт новые версии сразу нескольким объектам."""
+    cache.set_many({_key(kind, pk): _new_version() for pk in pks}, None)
+
+
+def forget_versions(kind, pks):
+    """Удаляет версии объектов: новые будут выданы при первом чтении.
+
+    Для массовых изменений дешевле записи новой версии каждому объекту.
+    """
+    cache.delete_many([_key(kind, pk) for pk in pks])
+
+
+def get_versions(objects):
+    """Возвращает версии для набора пар (вид объекта, pk).
+
+    Если версия вытеснена из кэша, объекту выдаётся новая, поэтому
+    устаревший фрагмент не может быть использован повторно.
+    """
+    keys = {_key(kind, pk): (kind, pk) for kind, pk in objects}
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def attach_card_versions(recipes):
+    """Добавляет рецептам атрибут card_version для ключа кэша карточки.
+
+    Версия карточки меняется при изменении рецепта, его группы или автора.
+    """
+    recipes = list(recipes)
+    objects = set()
+    for recipe in recipes:
+        objects.add((RECIPE, recipe.pk))
+        objects.add((AUTHOR, recipe.author_id))
+        if recipe.group_id:
+            objects.add((GROUP, recipe.group_id))
+    versions = get_versions(objects)
+    for recipe in recipes:
+        recipe.card_version = '.'.join((
+            versions[(RECIPE, recipe.pk)],
+            versions[(AUTHOR, recipe.author_id)],
+            versions[(GROUP, recipe.group_id)] if recipe.group_id else '-',
+        ))
+    return recipes
+
+
+def scope(kind, pk):
+    return f'{kind}:{pk}'
+
+
+def touch(*scopes):
+    """Отмечает изменение областей страниц текущим временем."""
+    now = time.time()
+    cache.set_many({MODIFIED_KEY.format(scope=name): now for name in scopes if name}, None)
+
+
+def last_modified(*scopes):
+    """Время последнего изменения областей с учётом изменений всего сайта.
+
+    Если отметка вытеснена из кэша, область считается изменённой сейчас:
+    клиент получит страницу заново, но устаревшую не получит никогда.
+    """
+    keys = [MODIFIED_KEY.format(scope=name) for name in (*scopes, SITE)]
+    stamps = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in stamps}
+    if missing:
+        cache.set_many(missing, None)
+        stamps.update(missing)
+    return datetime.fromtimestamp(max(stamps.values()), tz=timezone.utc)
+
+
+def get_groups():
+    """Возвращает список групп для переключателя, кэшируется до изменения групп.
+
+    Адреса групп хранятся в кэше вместе с ними, чтобы не вызывать reverse()
+    для каждой группы при каждом рендеринге переключателя.
+    """
+    groups = cache.get(GROUPS_KEY)
+    if groups is None:
+        groups = [
+            {**group, 'url': reverse('recipes:group_list', args=(group['slug'],))}
+            for group in Group.objects.values('id', 'title', 'slug')
+        ]
+        cache.set(GROUPS_KEY, groups, None)
+    return groups
+
+
+def invalidate_groups():
+    cache.delete(GROUPS_KEY)
@@ -0,0 +1,139 @@
+"""Условные GET-запросы (ETag и Last-Modified) для страниц рецептов.
+
+Время изменения страницы вычисляется без запросов списка и рендеринга:
+по отметкам областей в кэше и дате изменения рецепта. Если у клиента
+актуальная копия, он получает ответ 304.
+
+Страница авторизованного пользователя отличается от анонимной (кнопки,
+формы с CSRF-токеном), поэтому ETag зависит от пользователя и времени его
+входа (при входе CSRF-токен меняется), а Last-Modified отдаётся только
+анонимам - иначе после входа браузер мог бы получить 304 на копию,
+сохранённую до входа. Формы с CSRF-токеном выводятся только авторизованным,
+и их страницы отдаются с Cache-Control: private, поэтому общий кэш хранит
+только анонимные страницы без токена. Те же заголовки получает и ответ 304.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db.models import OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import cache
+from .models import Comment, Recipe, User
+
+
+def _etag(request, modified):
+    user = request.user
+    raw = f'{modified.timestamp()}:0'
+    if user.is_authenticated:
+        logged_in = user.last_login.timestamp() if user.last_login else 0
+        raw = f'{modified.timestamp()}:{user.pk}:{logged_in}'
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def _validators(request, last_modified_func, args, kwargs):
+    """Возвращает (etag, last_modified) страницы или None, если их нет."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    modified = last_modified_func(request, *args, **kwargs)
+    if modified is None:
+        return None
+    last_modified = None if request.user.is_authenticated else int(modified.timestamp())
+    return _etag(request, modified), last_modified
+
+
+def _not_modified(request, validators):
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def _set_headers(request, response, validators):
+    """Валидаторы и заголовки кэширования для ответа 200 и для ответа 304."""
+    if validators is None or response.status_code not in (200, 304):
+        return response
+    etag, last_modified = validators
+    response.headers.setdefault('ETag', etag)
+    if last_modified is not None:
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+    if request.user.is_authenticated:
+        patch_cache_control(response, no_cache=True, private=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def conditional_page(last_modified_func):
+    """Декоратор условного GET для синхронных и асинхронных представлений.
+
+    last_modified_func(request, *args, **kwargs) возвращает время изменения
+    страницы или None, если проверять нечего.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                validators = await sync_to_async(_validators)(request, last_modified_func, args, kwargs)
+                response = _not_modified(request, validators)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _set_headers(request, response, validators)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            validators = _validators(request, last_modified_func, args, kwargs)
+            response = _not_modified(request, validators)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _set_headers(request, response, validators)
+        return wrapper
+    return decorator
+
+
+def site_modified(request, *args, **kwargs):
+    """Страницы, которые меняются только вместе со всем сайтом: список групп."""
+    return cache.last_modified()
+
+
+def recipes_modified(request, *args, **kwargs):
+    """Главная страница, поиск и подбор по продуктам: любой рецепт."""
+    return cache.last_modified(cache.ALL_RECIPES)
+
+
+def group_modified(request, slug):
+    for group in cache.get_groups():
+        if group['slug'] == slug:
+            return cache.last_modified(cache.scope(cache.GROUP, group['id']))
+    return None
+
+
+def profile_modified(request, username):
+    """Рецепты автора, число подписчиков и кнопка подписки текущего пользователя."""
+    author_id = User.objects.filter(username=username).values_list('pk', flat=True).first()
+    if author_id is None:
+        return None
+    scopes = [cache.scope(cache.AUTHOR, author_id)]
+    if request.user.is_authenticated:
+        scopes.append(cache.scope(cache.FOLLOWER, request.user.pk))
+    return cache.last_modified(*scopes)
+
+
+def recipe_modified(request, recipe_id):
+    """Изменение рецепта, последний комментарий и данные автора."""
+    latest_comment = Comment.objects.filter(recipe=OuterRef('pk')).order_by('-created').values('created')[:1]
+    row = Recipe.objects.filter(pk=recipe_id).annotate(
+        latest_comment=Subquery(latest_comment)
+    ).values_list('updated', 'latest_comment', 'author_id').first()
+    if row is None:
+        return None
+    updated, latest_comment, author_id = row
+    return max(filter(None, (
+        updated,
+        latest_comment,
+        cache.last_modified(cache.scope(cache.RECIPE, recipe_id), cache.scope(cache.AUTHOR, author_id)),
+    )))
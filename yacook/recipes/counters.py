@@ -0,0 +1,88 @@
+"""Счётчики рецептов: всего на сайте, в каждой группе и у каждого автора.
+
+Счётчики сайта и групп хранятся в RecipeCounter, счётчик автора - в
+AuthorStats. Они меняются сигналами в той же транзакции, что и рецепты,
+поэтому списки показывают количество записей чтением одной строки вместо
+COUNT(*) по рецептам. Строки счётчиков создаются миграцией и вместе с
+группами, поэтому чтение ничего не записывает. После массовых операций без
+сигналов (импорт) вызывается reconcile_totals, а периодическую сверку всех
+счётчиков выполняет команда reconcile_counters.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from . import cache
+from .models import Group, Recipe, RecipeCounter
+
+SITE = cache.ALL_RECIPES
+
+
+def group_scope(group_id):
+    return cache.scope(cache.GROUP, group_id)
+
+
+def recipe_scopes(group_id):
+    """Области, в которые входит рецепт группы group_id."""
+    return [SITE, group_scope(group_id)] if group_id else [SITE]
+
+
+def actual_counts():
+    """Точные значения счётчиков сайта и всех групп."""
+    counts = {group_scope(pk): 0 for pk in Group.objects.values_list('pk', flat=True)}
+    groups = Recipe.objects.filter(group__isnull=False).order_by().values('group').annotate(total=Count('pk'))
+    counts.update({group_scope(row['group']): row['total'] for row in groups})
+    counts[SITE] = Recipe.objects.count()
+    return counts
+
+
+def change(deltas):
+    """Изменяет счётчики областей на указанные величины: {область: изменение}.
+
+    Строк, которых ещё нет, не создаёт: их добавляет reconcile_totals.
+    """
+    for scope, delta in deltas.items():
+        if delta:
+            RecipeCounter.objects.filter(scope=scope).update(value=Greatest(F('value') + delta, 0))
+
+
+def create_group_counter(group_id):
+    """Создаёт нулевой счётчик новой группы."""
+    RecipeCounter.objects.bulk_create([RecipeCounter(scope=group_scope(group_id))], ignore_conflicts=True)
+
+
+def get_total(scope):
+    """Количество рецептов области.
+
+    Если строки нет (группа создана без сигналов), количество считается
+    по базе без сохранения: запись на чтении не делается.
+    """
+    value = RecipeCounter.objects.filter(scope=scope).values_list('value', flat=True).first()
+    if value is None:
+        if scope == SITE:
+            value = Recipe.objects.count()
+        else:
+            _, _, group_id = scope.partition(':')
+            value = Recipe.objects.filter(group_id=group_id).count()
+    return value
+
+
+def reconcile_totals():
+    """Сверяет счётчики сайта и групп с базой и исправляет расхождения.
+
+    Возвращает количество исправленных строк.
+    """
+    with transaction.atomic():
+        actual = actual_counts()
+        stored = dict(RecipeCounter.objects.values_list('scope', 'value'))
+        stale = [scope for scope in stored if scope not in actual]
+        RecipeCounter.objects.filter(scope__in=stale).delete()
+        wrong = [
+            RecipeCounter(scope=scope, value=value)
+            for scope, value in actual.items()
+            if scope in stored and stored[scope] != value
+        ]
+        RecipeCounter.objects.bulk_update(wrong, ['value'], batch_size=1000)
+        missing = [RecipeCounter(scope=scope, value=value) for scope, value in actual.items() if scope not in stored]
+        RecipeCounter.objects.bulk_create(missing, batch_size=1000, ignore_conflicts=True)
+    return len(stale) + len(wrong) + len(missing)
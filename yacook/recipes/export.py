@@ -0,0 +1,148 @@
+"""Потоковая выгрузка рецептов в CSV и JSON Lines.
+
+Рецепты читаются порциями через iterator() только нужными полями, строки
+выгрузки формируются и при необходимости сжимаются gzip по мере отдачи,
+поэтому расход памяти не зависит от размера таблицы. Формат строк
+совпадает с форматом, который читает команда import_db.
+"""
+import csv
+import json
+import tempfile
+import zlib
+
+from .models import Recipe
+
+CSV = 'csv'
+JSONL = 'jsonl'
+FORMATS = (CSV, JSONL)
+
+CONTENT_TYPES = {
+    CSV: 'text/csv; charset=utf-8',
+    JSONL: 'application/x-ndjson; charset=utf-8',
+}
+
+# Поля выгрузки; author и pub_date import_db не читает:
+FIELDS = (
+    'name', 'title', 'description', 'ingredients', 'technology', 'group', 'author', 'pub_date', 'image'
+)
+# Ключ рецептов, созданных на сайте, а не импортированных:
+SITE_KEY_PREFIX = 'yacook-'
+
+CHUNK_SIZE = 2000
+# Размер блока, которым отдаётся выгрузка:
+BLOCK_SIZE = 64 * 1024
+
+
+def export_queryset(group=None, author=None, since=None, until=None):
+    """Рецепты для выгрузки: только нужные поля, по возрастанию id.
+
+    since и until - границы времени публикации, until не включается.
+    """
+    recipes = Recipe.objects.order_by('pk')
+    if group is not None:
+        recipes = recipes.filter(group=group)
+    if author is not None:
+        recipes = recipes.filter(author=author)
+    if since is not None:
+        recipes = recipes.filter(pub_date__gte=since)
+    if until is not None:
+        recipes = recipes.filter(pub_date__lt=until)
+    return recipes.values(
+        'pk', 'source_key', 'title', 'description', 'ingredients', 'technology', 'image',
+        'group__title', 'author__username', 'pub_date',
+    )
+
+
+def _ingredients(text):
+    """Строки «название: количество» в словарь, как в каталоге для импорта."""
+    ingredients = {}
+    for line in text.splitlines():
+        name, _, amount = line.partition(':')
+        if name.strip():
+            ingredients.setdefault(name.strip(), amount.strip())
+    return ingredients
+
+
+def export_row(recipe):
+    """Строка выгрузки для словаря из export_queryset."""
+    return {
+        'name': recipe['source_key'] or f'{SITE_KEY_PREFIX}{recipe["pk"]}',
+        'title': recipe['title'],
+        'description': recipe['description'].splitlines(),
+        'ingredients': _ingredients(recipe['ingredients']),
+        'technology': recipe['technology'].splitlines(),
+        'group': recipe['group__title'] or '',
+        'author': recipe['author__username'],
+        'pub_date': recipe['pub_date'].isoformat(),
+        'image': recipe['image'],
+    }
+
+
+class _Echo:
+    """Файл для csv.writer, который возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """Строки CSV; списки и словари записываются литералами Python, как в каталоге."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow([
+            repr(row[name]) if isinstance(row[name], (list, dict)) else row[name]
+            for name in FIELDS
+        ])
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def blocks(lines, size=BLOCK_SIZE):
+    """Собирает строки в блоки байтов примерно по size."""
+    block = []
+    length = 0
+    for line in lines:
+        data = line.encode()
+        block.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(block)
+            block = []
+            length = 0
+    if block:
+        yield b''.join(block)
+
+
+def gzip_blocks(chunks, level=6):
+    """Сжимает поток блоков в формат gzip по мере поступления."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(queryset, output_format=CSV, compress=False, chunk_size=CHUNK_SIZE):
+    """Выгрузка queryset из export_queryset потоком блоков байтов."""
+    rows = (export_row(recipe) for recipe in queryset.iterator(chunk_size=chunk_size))
+    lines = csv_lines(rows) if output_format == CSV else jsonl_lines(rows)
+    stream = blocks(lines)
+    return gzip_blocks(stream) if compress else stream
+
+
+def spool(stream):
+    """Записывает выгрузку во временный файл и возвращает его открытым с начала."""
+    file = tempfile.TemporaryFile()
+    for block in stream:
+        file.write(block)
+    file.seek(0)
+    return file
+
+
+def filename(output_format, compress, stamp):
+    return f'recipes-{stamp:%Y%m%d}.{output_format}' + ('.gz' if compress else '')
@@ -0,0 +1,182 @@
+"""Лента подписок, собираемая при публикации (fan-out on write).
+
+Новый рецепт раскладывается по лентам всех подписчиков автора. Для авторов
+с очень большим числом подписчиков это слишком дорого, поэтому их рецепты
+в ленты не записываются и подмешиваются при чтении (fan-out on read).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+
+from .models import AuthorStats, FeedEntry, Follow, Recipe, User
+
+LARGE_AUTHORS_CACHE_KEY = 'feed:large_authors'
+LARGE_AUTHORS_CACHE_TIMEOUT = 300
+
+BATCH_SIZE = 1000
+# Сколько лент собирается одним запросом INSERT ... SELECT:
+REBUILD_BATCH_SIZE = 500
+# Сколько лент обрезается одним запросом DELETE:
+TRIM_BATCH_SIZE = 100
+
+
+def large_authors():
+    """Возвращает множество авторов, чьи рецепты не раскладываются по лентам."""
+    authors = cache.get(LARGE_AUTHORS_CACHE_KEY)
+    if authors is None:
+        authors = set(
+            Follow.objects.values('author').annotate(
+                followers=Count('id')
+            ).filter(
+                followers__gt=settings.FEED_FANOUT_FOLLOWERS_LIMIT
+            ).values_list('author', flat=True)
+        )
+        cache.set(LARGE_AUTHORS_CACHE_KEY, authors, LARGE_AUTHORS_CACHE_TIMEOUT)
+    return authors
+
+
+def push_recipe(recipe):
+    """Добавляет новый рецепт в ленты подписчиков автора и обрезает их."""
+    push_recipes(recipe.author_id, [(recipe.pk, recipe.pub_date)])
+
+
+def push_recipes(author_id, recipes):
+    """Добавляет рецепты автора - пары (pk, pub_date) - в ленты его подписчиков."""
+    if author_id in large_authors() or not recipes:
+        return
+    followers = Follow.objects.filter(author_id=author_id).values_list('user_id', flat=True)
+    batch_size = max(1, BATCH_SIZE // len(recipes))
+    with transaction.atomic():
+        user_ids = list(followers)
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            FeedEntry.objects.bulk_create(
+                [
+                    FeedEntry(user_id=user_id, recipe_id=pk, author_id=author_id, pub_date=pub_date)
+                    for user_id in batch
+                    for pk, pub_date in recipes
+                ],
+                batch_size=BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+            trim_many(batch)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние рецепты автора после подписки."""
+    if author_id in large_authors():
+        return
+    recipes = Recipe.objects.filter(author_id=author_id).order_by('-pub_date', '-id').values_list(
+        'pk', 'pub_date'
+    )[:settings.FEED_MAX_ENTRIES]
+    with transaction.atomic():
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(user_id=user_id, recipe_id=pk, author_id=author_id, pub_date=pub_date)
+                for pk, pub_date in recipes
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        trim(user_id)
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def trim(user_id):
+    """Удаляет из ленты записи сверх FEED_MAX_ENTRIES."""
+    return trim_many([user_id])
+
+
+def trim_many(user_ids):
+    """Удаляет записи сверх FEED_MAX_ENTRIES из лент нескольких пользователей.
+
+    Первая лишняя запись каждой ленты находится одним запросом по индексу
+    ленты, а удаляются лишние записи одним DELETE на TRIM_BATCH_SIZE лент.
+    """
+    first_extra = FeedEntry.objects.filter(user_id=OuterRef('pk')).order_by(
+        '-pub_date', '-recipe_id'
+    )[settings.FEED_MAX_ENTRIES:settings.FEED_MAX_ENTRIES + 1]
+    overflowing = User.objects.filter(pk__in=user_ids).annotate(
+        extra_pub_date=Subquery(first_extra.values('pub_date')),
+        extra_recipe_id=Subquery(first_extra.values('recipe_id')),
+    ).filter(extra_pub_date__isnull=False).values_list('pk', 'extra_pub_date', 'extra_recipe_id')
+    conditions = [
+        Q(user_id=user_id) & (Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, recipe_id__lte=recipe_id))
+        for user_id, pub_date, recipe_id in overflowing
+    ]
+    deleted = 0
+    for start in range(0, len(conditions), TRIM_BATCH_SIZE):
+        condition = Q()
+        for user_condition in conditions[start:start + TRIM_BATCH_SIZE]:
+            condition |= user_condition
+        count, _ = FeedEntry.objects.filter(condition).delete()
+        deleted += count
+    return deleted
+
+
+def total(user_id, large_author_ids):
+    """Количество рецептов в ленте: записи ленты и рецепты подмешиваемых авторов.
+
+    Записей в ленте не больше FEED_MAX_ENTRIES, поэтому COUNT(*) по ним дешёвый.
+    Записи, оставшиеся в ленте от автора до того, как у него стало много
+    подписчиков, не считаются: его рецепты уже входят в счётчик автора.
+    """
+    entries = FeedEntry.objects.filter(user_id=user_id)
+    if not large_author_ids:
+        return entries.count()
+    count = entries.exclude(author_id__in=large_author_ids).count()
+    recipes = AuthorStats.objects.filter(author__in=large_author_ids).aggregate(total=Sum('recipes_count'))
+    return count + (recipes['total'] or 0)
+
+
+def rebuild(user_id):
+    """Собирает ленту пользователя заново по его подпискам."""
+    rebuild_many([user_id])
+
+
+def _rebuild_sql(users_count, large_count):
+    feed = connection.ops.quote_name(FeedEntry._meta.db_table)
+    follow = connection.ops.quote_name(Follow._meta.db_table)
+    recipe = connection.ops.quote_name(Recipe._meta.db_table)
+    exclude = f'AND f.author_id NOT IN ({", ".join(["%s"] * large_count)})' if large_count else ''
+    return (
+        f'INSERT INTO {feed} (user_id, recipe_id, author_id, pub_date) '
+        f'SELECT user_id, recipe_id, author_id, pub_date FROM ('
+        f'SELECT f.user_id, r.id AS recipe_id, r.author_id, r.pub_date, ROW_NUMBER() OVER ('
+        f'PARTITION BY f.user_id ORDER BY r.pub_date DESC, r.id DESC) AS position '
+        f'FROM {follow} f JOIN {recipe} r ON r.author_id = f.author_id '
+        f'WHERE f.user_id IN ({", ".join(["%s"] * users_count)}) {exclude}'
+        f') ranked WHERE position <= %s'
+    )
+
+
+def rebuild_many(user_ids):
+    """Собирает ленты пользователей заново одним INSERT ... SELECT на каждые REBUILD_BATCH_SIZE лент.
+
+    Последние FEED_MAX_ENTRIES рецептов каждой ленты выбирает оконная
+    функция ROW_NUMBER, поэтому строки лент не проходят через Python.
+    """
+    user_ids = list(user_ids)
+    large = sorted(large_authors())
+    for start in range(0, len(user_ids), REBUILD_BATCH_SIZE):
+        batch = user_ids[start:start + REBUILD_BATCH_SIZE]
+        with transaction.atomic():
+            FeedEntry.objects.filter(user_id__in=batch).delete()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    _rebuild_sql(len(batch), len(large)),
+                    [*batch, *large, settings.FEED_MAX_ENTRIES]
+                )
+
+
+def followed_large_authors(user):
+    """Возвращает авторов с большим числом подписчиков, на которых подписан пользователь."""
+    authors = large_authors()
+    if not authors:
+        return set()
+    return set(Follow.objects.filter(user=user, author_id__in=authors).values_list('author_id', flat=True))
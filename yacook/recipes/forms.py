@@ -1,6 +1,10 @@
+import datetime
+
 from django import forms
+from django.utils import timezone
 
-from .models import Recipe, Comment
+from . import export
+from .models import Recipe, Comment, Group, User
 
 
 class RecipeForm(forms.ModelForm):
@@ -23,3 +27,48 @@ class CommentForm(forms.ModelForm):
         widgets = {
             'text': forms.Textarea(attrs={'rows': 2}),
         }
+
+
+class ExportForm(forms.Form):
+    """Параметры выгрузки рецептов."""
+    format = forms.ChoiceField(
+        choices=[(name, name) for name in export.FORMATS],
+        required=False
+    )
+    gzip = forms.BooleanField(required=False)
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        to_field_name='slug',
+        required=False
+    )
+    author = forms.ModelChoiceField(
+        User.objects.all(),
+        to_field_name='username',
+        required=False
+    )
+    since = forms.DateField(required=False)
+    until = forms.DateField(required=False, help_text='Включительно')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        since, until = cleaned_data.get('since'), cleaned_data.get('until')
+        if since and until and since > until:
+            raise forms.ValidationError('Начало периода позже его конца.')
+        return cleaned_data
+
+    def _start_of(self, day):
+        if day is None:
+            return None
+        return datetime.datetime.combine(day, datetime.time.min, tzinfo=timezone.get_current_timezone())
+
+    def get_queryset(self):
+        until = self.cleaned_data['until']
+        return export.export_queryset(
+            group=self.cleaned_data['group'],
+            author=self.cleaned_data['author'],
+            since=self._start_of(self.cleaned_data['since']),
+            until=self._start_of(until + datetime.timedelta(days=1) if until else None),
+        )
+
+    def get_format(self):
+        return self.cleaned_data['format'] or export.CSV
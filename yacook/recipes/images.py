@@ -0,0 +1,151 @@
+"""Уменьшенные копии изображений рецептов (renditions) для srcset.
+
+Копии создаются в фоновом пуле потоков после сохранения рецепта
+и командой generate_renditions для уже загруженных изображений.
+Готовность копий хранится в поле Recipe.renditions_image, поэтому
+при выводе страниц хранилище не опрашивается. Копии прежнего
+изображения удаляются, когда готовы копии нового.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from PIL import Image, UnidentifiedImageError
+
+from . import cache
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Ширины копий в пикселях: карточка, карточка для экранов с высокой плотностью и страница рецепта.
+WIDTHS = (350, 700, 1200)
+CARD_WIDTHS = (350, 700)
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+
+
+def rendition_name(name, width, extension):
+    """Возвращает путь копии изображения: recipes/renditions/<имя>_<расширение>_<ширина>.<формат>.
+
+    Расширение исходного файла входит в имя, чтобы копии a.png и a.jpg не совпадали.
+    """
+    directory, filename = os.path.split(name)
+    stem, source_extension = os.path.splitext(filename)
+    source_extension = source_extension.lstrip('.').lower()
+    return os.path.join(directory, 'renditions', f'{stem}_{source_extension}_{width}.{extension}')
+
+
+def to_rgb(image):
+    """Приводит изображение к RGB; прозрачные области становятся белыми, а не чёрными."""
+    if image.mode in ('RGB', 'L'):
+        return image
+    if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def mark_renditions(recipe_id, name):
+    """Отмечает, что копии изображения рецепта готовы, если оно не сменилось за это время."""
+    return Recipe.objects.filter(pk=recipe_id, image=name).update(renditions_image=name)
+
+
+def delete_renditions(name, storage=default_storage):
+    """Удаляет копии изображения, если ни один рецепт его больше не использует."""
+    if not name or Recipe.objects.filter(Q(image=name) | Q(renditions_image=name)).exists():
+        return 0
+    deleted = 0
+    for width in WIDTHS:
+        for extension in FORMATS:
+            path = rendition_name(name, width, extension)
+            if storage.exists(path):
+                storage.delete(path)
+                deleted += 1
+    return deleted
+
+
+def renditions_changed(recipe_id, author_id, group_id, previous=None):
+    """Сбрасывает карточку рецепта и отметки изменения страниц, на которых видно изображение.
+
+    Без отметки условный GET отвечал бы 304, и страницы оставались бы без srcset.
+    Копии прежнего изображения previous после этого больше не нужны и удаляются.
+    """
+    cache.bump_version(cache.RECIPE, recipe_id)
+    scopes = [cache.scope(cache.RECIPE, recipe_id), cache.ALL_RECIPES, cache.scope(cache.AUTHOR, author_id)]
+    if group_id:
+        scopes.append(cache.scope(cache.GROUP, group_id))
+    cache.touch(*scopes)
+    if previous:
+        delete_renditions(previous)
+
+
+def generate_renditions(name, storage=default_storage):
+    """Создаёт все копии изображения, возвращает число созданных файлов."""
+    try:
+        with storage.open(name) as file:
+            original = Image.open(file)
+            original.load()
+    except (OSError, UnidentifiedImageError):
+        logger.warning('Не удалось открыть изображение %s', name)
+        return 0
+    original = to_rgb(original)
+    created = 0
+    for width in WIDTHS:
+        image = original.copy()
+        if image.width > width:
+            image.thumbnail((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+        for extension, (image_format, params) in FORMATS.items():
+            buffer = BytesIO()
+            image.save(buffer, image_format, **params)
+            path = rendition_name(name, width, extension)
+            if storage.exists(path):
+                storage.delete(path)
+            storage.save(path, ContentFile(buffer.getvalue()))
+            created += 1
+    return created
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_RENDITION_WORKERS,
+            thread_name_prefix='renditions'
+        )
+    return _executor
+
+
+def schedule_renditions(recipe_id, name, on_done=None):
+    """Ставит создание копий изображения в фоновый пул."""
+    def task():
+        try:
+            if not generate_renditions(name):
+                return
+            if mark_renditions(recipe_id, name):
+                if on_done:
+                    on_done()
+            else:
+                # Изображение сменилось, пока создавались копии: они уже не понадобятся.
+                delete_renditions(name)
+        except Exception:
+            logger.exception('Ошибка при создании копий изображения %s', name)
+
+    return get_executor().submit(task)
+
+
+def srcset(name, widths, extension, storage=default_storage):
+    return ', '.join(
+        f'{storage.url(rendition_name(name, width, extension))} {width}w' for width in widths
+    )
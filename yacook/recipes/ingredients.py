@@ -0,0 +1,133 @@
+"""Структурированный индекс ингредиентов.
+
+Текстовое поле Recipe.ingredients состоит из строк «название: количество».
+Названия приводятся к основам слов и хранятся в таблице Ingredient,
+а связи с рецептами - в RecipeIngredient. Поиск «что приготовить из
+имеющихся продуктов» работает по этим таблицам, а не по тексту рецептов.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+
+from .models import Ingredient, Recipe, RecipeIngredient
+from .stemmer import stem, tokenize
+
+NAME_LENGTH = Ingredient._meta.get_field('name').max_length
+AMOUNT_LENGTH = RecipeIngredient._meta.get_field('amount').max_length
+
+SEPARATORS_RE = re.compile(r'[,;\n]+')
+# Символ, который больше любого символа названия: верхняя граница диапазона для поиска по префиксу.
+MAX_CHAR = '\U0010ffff'
+
+
+def ingredient_key(name):
+    """Нормализованное название: основы слов через пробел."""
+    return ' '.join(stem(word) for word in tokenize(name))[:NAME_LENGTH]
+
+
+def parse_ingredients(text):
+    """Разбирает текст ингредиентов, возвращает словарь {ключ: (название, количество)}."""
+    parsed = {}
+    for line in (text or '').splitlines():
+        name, _, amount = line.partition(':')
+        key = ingredient_key(name)
+        if key and key not in parsed:
+            parsed[key] = (name.strip()[:NAME_LENGTH], amount.strip()[:AMOUNT_LENGTH])
+    return parsed
+
+
+def sync_ingredients(recipes):
+    """Пересобирает связи рецептов с ингредиентами по их текстовому полю."""
+    parsed = {recipe.pk: parse_ingredients(recipe.ingredients) for recipe in recipes if recipe.pk}
+    if not parsed:
+        return
+    names = {}
+    for items in parsed.values():
+        for key, (name, _) in items.items():
+            names.setdefault(key, name)
+    with transaction.atomic():
+        ids = dict(Ingredient.objects.filter(key__in=names).values_list('key', 'pk'))
+        missing = [Ingredient(key=key, name=name) for key, name in names.items() if key not in ids]
+        if missing:
+            Ingredient.objects.bulk_create(missing, ignore_conflicts=True)
+            ids.update(Ingredient.objects.filter(key__in=[item.key for item in missing]).values_list('key', 'pk'))
+        RecipeIngredient.objects.filter(recipe_id__in=parsed).delete()
+        RecipeIngredient.objects.bulk_create(
+            [
+                RecipeIngredient(recipe_id=recipe_id, ingredient_id=ids[key], amount=amount)
+                for recipe_id, items in parsed.items()
+                for key, (_, amount) in items.items()
+            ],
+            batch_size=1000
+        )
+        counts = {}
+        for recipe_id, items in parsed.items():
+            counts.setdefault(len(items), []).append(recipe_id)
+        for count, recipe_ids in counts.items():
+            Recipe.objects.filter(pk__in=recipe_ids).update(ingredients_count=count)
+
+
+def _prefix(field, value):
+    """Условие «поле начинается с value» в виде диапазона, по которому используется индекс.
+
+    LIKE 'value%' индекс не использует: в SQLite он по умолчанию не зависит
+    от регистра, а индекс поля - зависит.
+    """
+    return Q(**{f'{field}__gte': value, f'{field}__lt': value + MAX_CHAR})
+
+
+def match_ingredients(query):
+    """Находит ингредиенты по списку продуктов через запятую.
+
+    Возвращает список множеств id ингредиентов - по одному на каждый продукт.
+    Продукт совпадает с ингредиентом, если нормализованное название
+    ингредиента начинается с основ слов продукта целиком: «яйца» найдёт
+    и «Яйцо куриное», а «соль» не найдёт «Солод» - короткая основа «сол»
+    иначе совпала бы с началом многих слов. Все продукты ищутся одним
+    запросом по индексу key.
+    """
+    keys = []
+    for item in SEPARATORS_RE.split(query or ''):
+        key = ingredient_key(item)
+        if key and key not in keys:
+            keys.append(key)
+    if not keys:
+        return []
+    condition = Q()
+    for key in keys:
+        condition |= Q(key=key) | _prefix('key', key + ' ')
+    groups = {key: set() for key in keys}
+    for pk, ingredient in Ingredient.objects.filter(condition).values_list('pk', 'key'):
+        for key in keys:
+            if ingredient == key or ingredient.startswith(key + ' '):
+                groups[key].add(pk)
+    return [ids for ids in groups.values() if ids]
+
+
+def recipes_by_ingredients(queryset, query):
+    """Рецепты, в которых есть хотя бы один из продуктов.
+
+    Аннотирует matched - сколько продуктов из запроса есть в рецепте
+    и missing - сколько ингредиентов рецепта в запросе нет. Продукт может
+    совпасть с несколькими ингредиентами рецепта, поэтому missing считается
+    по различным совпавшим ингредиентам, а не по продуктам.
+    Подходящие рецепты выбираются по индексу таблицы связей.
+    """
+    groups = match_ingredients(query)
+    if not groups:
+        return queryset.none().annotate(matched=Value(0), missing=Value(0))
+    all_ids = set().union(*groups)
+    item_number = Case(
+        *[
+            When(recipe_ingredients__ingredient__in=ids, then=Value(number))
+            for number, ids in enumerate(groups)
+        ],
+        output_field=IntegerField()
+    )
+    return queryset.filter(recipe_ingredients__ingredient__in=all_ids).annotate(
+        matched=Count(item_number, distinct=True),
+        matched_ingredients=Count('recipe_ingredients__ingredient', distinct=True)
+    ).annotate(
+        missing=F('ingredients_count') - F('matched_ingredients')
+    )
@@ -0,0 +1,233 @@
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.db.models import Count
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from core.metrics import registry
+from ...models import Follow, Group, Recipe
+
+User = get_user_model()
+
+VIEWS = ('index', 'group_list', 'profile', 'recipe_detail', 'search', 'follow_index')
+SEARCH_TERMS = ('борщ', 'блины домашний', 'картофель', 'пирог праздничный', 'салат', 'котлеты')
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class ConnectionCounter:
+    """Считает новые соединения с базой; delay имитирует долгую установку соединения."""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, sender, connection, **kwargs):
+        with self._lock:
+            self.count += 1
+        if self.delay:
+            time.sleep(self.delay)
+
+
+def slow_database(delay):
+    """Обёртка запросов, имитирующая медленную базу данных."""
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+    return wrapper
+
+
+class Command(BaseCommand):
+    help = 'Load test recipe views and report latency percentiles, throughput and query counts as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--views', nargs='+', choices=VIEWS, default=list(VIEWS))
+        parser.add_argument('--requests', type=int, default=200, help='Requests per view')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per view')
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument(
+            '--interface',
+            choices=('wsgi', 'asgi'),
+            default='wsgi',
+            help='Drive views through the WSGI handler from threads or through the ASGI handler from tasks'
+        )
+        parser.add_argument('--db-latency', type=float, default=0, help='Extra delay per SQL query, ms')
+        parser.add_argument(
+            '--connect-latency',
+            type=float,
+            default=0,
+            help='Extra delay per new database connection, ms (TCP, TLS and authentication of a server database)'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def targets(self, rnd):
+        """Собирает адреса для каждого представления на текущих данных."""
+        recipe_ids = list(Recipe.objects.values_list('pk', flat=True)[:10000])
+        if not recipe_ids:
+            raise CommandError('No recipes found, run generate_data first.')
+        groups = list(
+            Group.objects.annotate(total=Count('recipes')).order_by('-total').values_list('slug', flat=True)[:10]
+        )
+        authors = list(
+            User.objects.annotate(total=Count('recipes')).order_by('-total').values_list('username', flat=True)[:20]
+        )
+        follower = (
+            Follow.objects.values('user').annotate(total=Count('pk')).order_by('-total').first()
+        )
+        return {
+            'index': lambda: reverse('recipes:index'),
+            'group_list': lambda: reverse('recipes:group_list', args=(rnd.choice(groups),)),
+            'profile': lambda: reverse('recipes:profile', args=(rnd.choice(authors),)),
+            'recipe_detail': lambda: reverse('recipes:recipe_detail', args=(rnd.choice(recipe_ids),)),
+            'search': lambda: f"{reverse('recipes:search')}?s={rnd.choice(SEARCH_TERMS)}",
+            'follow_index': lambda: reverse('recipes:follow_index'),
+        }, follower['user'] if follower else None
+
+    def client(self, view, follower_id, interface):
+        client = AsyncClient() if interface == 'asgi' else Client()
+        if view == 'follow_index':
+            if follower_id is None:
+                raise CommandError('No follows found, run generate_data first.')
+            client.force_login(User.objects.get(pk=follower_id))
+        return client
+
+    def run_wsgi(self, clients, urls, errors):
+        def fetch(index):
+            url = urls[index]
+            started = time.perf_counter()
+            response = clients[index % len(clients)].get(url)
+            # Тестовый клиент не закрывает соединения после ответа, а сервер - закрывает с учётом CONN_MAX_AGE:
+            close_old_connections()
+            latency = time.perf_counter() - started
+            if response.status_code != 200:
+                errors.append(f'{response.status_code} {url}')
+            return latency
+
+        with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+            latencies = list(executor.map(fetch, range(len(urls))))
+        # Потоки пула открывали свои соединения с базой:
+        connections.close_all()
+        return latencies
+
+    async def run_asgi(self, clients, urls, errors):
+        queue = asyncio.Queue()
+        for index in range(len(urls)):
+            queue.put_nowait(index)
+        latencies = [0.0] * len(urls)
+
+        async def worker(client):
+            while not queue.empty():
+                index = queue.get_nowait()
+                started = time.perf_counter()
+                # Как и ASGIHandler, каждый запрос получает свой поток для синхронного кода:
+                async with ThreadSensitiveContext():
+                    response = await client.get(urls[index])
+                latencies[index] = time.perf_counter() - started
+                if response.status_code != 200:
+                    errors.append(f'{response.status_code} {urls[index]}')
+
+        await asyncio.gather(*(worker(client) for client in clients))
+        return latencies
+
+    def run_view(self, view, make_url, follower_id, options):
+        """Прогоняет запросы к одному представлению, возвращает сводку."""
+        interface = options['interface']
+        clients = [self.client(view, follower_id, interface) for _ in range(options['concurrency'])]
+        warmup = [make_url() for _ in range(options['warmup'])]
+        urls = [make_url() for _ in range(options['requests'])]
+        errors = []
+        if interface == 'asgi':
+            asyncio.run(self.run_asgi(clients, warmup, []))
+        else:
+            self.run_wsgi(clients, warmup, [])
+        registry.reset()
+        self.connections.count = 0
+        started = time.perf_counter()
+        if interface == 'asgi':
+            latencies = asyncio.run(self.run_asgi(clients, urls, errors))
+        else:
+            latencies = self.run_wsgi(clients, urls, errors)
+        elapsed = time.perf_counter() - started
+
+        recorded = registry.snapshot().get(f'recipes:{view}', {})
+        requests = recorded.get('requests') or 1
+        return {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'error_samples': errors[:5],
+            'throughput_rps': round(len(latencies) / elapsed, 2),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'queries_per_request': round(recorded.get('queries', 0) / requests, 2),
+            'connections_per_request': round(self.connections.count / len(latencies), 2),
+            'db_ms_per_request': round(recorded.get('db_seconds', 0) * 1000 / requests, 2),
+            'template_ms_per_request': round(recorded.get('template_seconds', 0) * 1000 / requests, 2),
+        }
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive.')
+        if settings.DEBUG:
+            self.stderr.write(self.style.WARNING(
+                'DEBUG is on: debug toolbar and template debugging distort the results, set DEBUG=False.'
+            ))
+        if options['interface'] == 'asgi' and not settings.ASYNC_VIEWS:
+            self.stderr.write(self.style.WARNING(
+                'ASYNC_VIEWS is off: synchronous views will run in the ASGI thread pool.'
+            ))
+        if options['db_latency']:
+            delay = slow_database(options['db_latency'] / 1000)
+
+            def install(connection, **kwargs):
+                if delay not in connection.execute_wrappers:
+                    connection.execute_wrappers.append(delay)
+
+            connection_created.connect(install, weak=False)
+            for connection in connections.all():
+                install(connection)
+        self.connections = ConnectionCounter(options['connect_latency'] / 1000)
+        connection_created.connect(self.connections, weak=False)
+        rnd = random.Random(options['seed'])
+        targets, follower_id = self.targets(rnd)
+        report = {
+            'requests_per_view': options['requests'],
+            'concurrency': options['concurrency'],
+            'interface': options['interface'],
+            'async_views': settings.ASYNC_VIEWS,
+            'db_latency_ms': options['db_latency'],
+            'connect_latency_ms': options['connect_latency'],
+            'conn_max_age': settings.CONN_MAX_AGE,
+            'debug': settings.DEBUG,
+            'views': {},
+        }
+        for view in options['views']:
+            self.stderr.write(f'Benchmarking {view}...')
+            report['views'][view] = self.run_view(view, targets[view], follower_id, options)
+        result = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(result)
+            self.stderr.write(self.style.SUCCESS(f'Report written to {options["output"]}'))
+        else:
+            self.stdout.write(result)
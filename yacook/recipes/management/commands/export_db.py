@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import export
+from ...forms import ExportForm
+
+
+class Command(BaseCommand):
+    help = 'Export recipes as CSV or JSON Lines in the format read by import_db'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='-', help='Output file, "-" for stdout (default)')
+        parser.add_argument(
+            '--format',
+            choices=export.FORMATS,
+            help='Output format (default: by file extension, otherwise csv)'
+        )
+        parser.add_argument('--gzip', action='store_true', help='Compress output (implied by a .gz path)')
+        parser.add_argument('--group', help='Slug of the group to export')
+        parser.add_argument('--author', help='Username of the author to export')
+        parser.add_argument('--since', help='First publication date, YYYY-MM-DD')
+        parser.add_argument('--until', help='Last publication date (inclusive), YYYY-MM-DD')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE, help='Rows fetched per query')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        compress = options['gzip'] or path.endswith('.gz')
+        output_format = options['format']
+        if output_format is None:
+            output_format = export.JSONL if path.removesuffix('.gz').endswith('.jsonl') else export.CSV
+        form = ExportForm({
+            name: options[name] for name in ('group', 'author', 'since', 'until') if options[name]
+        })
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+        stream = export.export(form.get_queryset(), output_format, compress, options['chunk_size'])
+        if path == '-':
+            output = sys.stdout.buffer
+            for block in stream:
+                output.write(block)
+            output.flush()
+            return
+        with open(path, 'wb') as output:
+            for block in stream:
+                output.write(block)
+        self.stderr.write(self.style.SUCCESS(f'Exported recipes to {path}'))
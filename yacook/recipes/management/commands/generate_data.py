@@ -0,0 +1,180 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from ... import cache
+from ...models import Comment, Follow, Group, Recipe
+
+User = get_user_model()
+
+PREFIX = 'bench_'
+
+DISHES = (
+    'Борщ', 'Щи', 'Солянка', 'Уха', 'Плов', 'Омлет', 'Блины', 'Сырники', 'Пельмени', 'Вареники',
+    'Котлеты', 'Гуляш', 'Рагу', 'Запеканка', 'Салат', 'Пирог', 'Кекс', 'Каша', 'Голубцы', 'Жаркое',
+)
+ADJECTIVES = (
+    'домашний', 'быстрый', 'праздничный', 'постный', 'летний', 'бабушкин', 'пряный', 'сытный',
+    'нежный', 'острый', 'деревенский', 'классический',
+)
+PRODUCTS = (
+    'Картофель', 'Морковь', 'Лук репчатый', 'Чеснок', 'Свекла', 'Капуста белокочанная', 'Яйцо куриное',
+    'Молоко', 'Сливочное масло', 'Мука пшеничная', 'Сахар', 'Соль', 'Перец черный молотый', 'Говядина',
+    'Свинина', 'Куриное филе', 'Рис', 'Гречка', 'Томаты', 'Огурцы', 'Сметана', 'Творог', 'Сыр твердый',
+    'Укроп', 'Петрушка', 'Растительное масло', 'Лавровый лист', 'Грибы', 'Фасоль', 'Кефир',
+)
+AMOUNTS = ('1 шт', '2 шт', '100 г', '200 г', '500 г', '1 ст.л.', '2 ст.л.', 'по вкусу', '250 мл', '1 кг')
+SENTENCES = (
+    'Очистите и нарежьте овощи.', 'Обжарьте на среднем огне до золотистого цвета.',
+    'Добавьте специи и перемешайте.', 'Варите под крышкой 20 минут.', 'Подавайте горячим.',
+    'Взбейте яйца с молоком.', 'Запекайте в духовке при 180 градусах.', 'Дайте настояться 10 минут.',
+)
+
+
+@contextmanager
+def manual_dates(*fields):
+    """Позволяет задать даты полей с auto_now_add при массовой вставке."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса распределения Ципфа: несколько популярных и много редких."""
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, groups, recipes, comments and follows for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50_000)
+        parser.add_argument('--groups', type=int, default=30)
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--comments', type=int, default=1_000_000)
+        parser.add_argument('--follows', type=int, default=500_000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--skip-derived',
+            action='store_true',
+            help='Do not rebuild search index, ingredients, counters and feeds'
+        )
+
+    def log(self, message):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f'[{elapsed:7.1f}s] {message}')
+
+    def bulk(self, model, objects, total):
+        """Вставляет объекты порциями, каждая порция - отдельная транзакция."""
+        batch = []
+        created = 0
+        for item in objects:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                with transaction.atomic():
+                    model.objects.bulk_create(batch, ignore_conflicts=model is Follow)
+                created += len(batch)
+                batch = []
+                self.log(f'{model.__name__}: {created}/{total}')
+        if batch:
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=model is Follow)
+            created += len(batch)
+            self.log(f'{model.__name__}: {created}/{total}')
+
+    def handle(self, *args, **options):
+        self.started = time.monotonic()
+        self.batch_size = options['batch_size']
+        rnd = random.Random(options['seed'])
+        now = timezone.now()
+
+        start = User.objects.filter(username__startswith=PREFIX).count()
+        self.bulk(User, (
+            User(
+                username=f'{PREFIX}{start + number}',
+                first_name=rnd.choice(('Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей')),
+                last_name=rnd.choice(('Иванова', 'Петров', 'Смирнова', 'Кузнецов', 'Попова')),
+                password='!',
+            )
+            for number in range(options['users'])
+        ), options['users'])
+        user_ids = list(User.objects.filter(username__startswith=PREFIX).values_list('pk', flat=True))
+
+        self.bulk(Group, (
+            Group(title=f'Группа {PREFIX}{number}', slug=f'{PREFIX}group_{number}', description='')
+            for number in range(options['groups'])
+            if not Group.objects.filter(slug=f'{PREFIX}group_{number}').exists()
+        ), options['groups'])
+        group_ids = list(Group.objects.filter(slug__startswith=PREFIX).values_list('pk', flat=True))
+
+        # Популярность авторов и групп распределена неравномерно:
+        author_weights = zipf_weights(len(user_ids), 1.1)
+        group_weights = zipf_weights(len(group_ids), 0.8)
+        span = timedelta(days=730).total_seconds()
+
+        def recipes():
+            for _ in range(options['recipes']):
+                products = rnd.sample(PRODUCTS, rnd.randint(3, 10))
+                yield Recipe(
+                    title=f'{rnd.choice(DISHES)} {rnd.choice(ADJECTIVES)}',
+                    description=' '.join(rnd.sample(SENTENCES, 2)),
+                    ingredients='\n'.join(f'{product}: {rnd.choice(AMOUNTS)}' for product in products),
+                    technology='\n'.join(rnd.sample(SENTENCES, 4)),
+                    author_id=rnd.choices(user_ids, cum_weights=author_weights)[0],
+                    group_id=rnd.choices(group_ids, cum_weights=group_weights)[0] if group_ids else None,
+                    pub_date=now - timedelta(seconds=rnd.random() * span),
+                )
+
+        with manual_dates(Recipe._meta.get_field('pub_date')):
+            self.bulk(Recipe, recipes(), options['recipes'])
+        recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+        recipe_weights = zipf_weights(len(recipe_ids), 0.9)
+
+        def comments():
+            for _ in range(options['comments']):
+                yield Comment(
+                    recipe_id=rnd.choices(recipe_ids, cum_weights=recipe_weights)[0],
+                    author_id=rnd.choice(user_ids),
+                    text=rnd.choice(SENTENCES),
+                    created=now - timedelta(seconds=rnd.random() * span),
+                )
+
+        with manual_dates(Comment._meta.get_field('created')):
+            self.bulk(Comment, comments(), options['comments'])
+
+        def follows():
+            for _ in range(options['follows']):
+                user_id = rnd.choice(user_ids)
+                author_id = rnd.choices(user_ids, cum_weights=author_weights)[0]
+                if user_id != author_id:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.bulk(Follow, follows(), options['follows'])
+
+        if not options['skip_derived']:
+            for command in (
+                'rebuild_search_index',
+                'rebuild_ingredients',
+                'reconcile_comments_count',
+                'rebuild_feeds',
+                'reconcile_counters',
+                'rebuild_similar',
+            ):
+                self.log(f'Running {command}')
+                call_command(command, stdout=self.stdout)
+        cache.touch(cache.SITE)
+        self.log('Done')
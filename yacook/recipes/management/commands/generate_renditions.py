@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from ...images import delete_renditions, generate_renditions, mark_renditions, renditions_changed
+from ...models import Recipe
+
+# Сколько изображений на один поток читается из базы и ставится в пул за раз:
+BATCH_PER_WORKER = 50
+
+
+class Command(BaseCommand):
+    help = 'Generate resized image renditions for existing recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate existing renditions')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['force']:
+            recipes = recipes.exclude(renditions_image=F('image'))
+        recipes = recipes.values_list('pk', 'image', 'author_id', 'group_id', 'renditions_image').order_by('pk')
+
+        def process(item):
+            pk, name, author_id, group_id, previous = item
+            files = generate_renditions(name)
+            if not files:
+                return 0
+            if mark_renditions(pk, name):
+                renditions_changed(pk, author_id, group_id, previous if previous != name else None)
+                return files
+            delete_renditions(name)
+            return 0
+
+        processed = created = last = 0
+        batch_size = options['workers'] * BATCH_PER_WORKER
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                batch = list(recipes.filter(pk__gt=last)[:batch_size])
+                if not batch:
+                    break
+                last = batch[-1][0]
+                for files in executor.map(process, batch):
+                    processed += 1
+                    created += files
+                    if processed % 1000 == 0:
+                        self.stdout.write(f'Processed {processed} images')
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} images, created {created} files'))
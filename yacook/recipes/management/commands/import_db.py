@@ -1,40 +1,271 @@
+import ast
 import csv
+import gzip
+import hashlib
 import json
 import os
+import time
+from itertools import islice
+from multiprocessing import Pool
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
 from transliterate import translit
 
-from ...models import Group, Recipe
+from ... import cache, counters, export, feed, ingredients, search, similar
+from ... import stats as author_stats
+from ...models import Follow, Group, Recipe
+
+User = get_user_model()
+
+# Поля, которые перезаписываются при повторном импорте изменившегося рецепта:
+UPDATE_FIELDS = ['title', 'description', 'ingredients', 'technology', 'image', 'group', 'content_hash', 'updated']
+# Пока изменённых рецептов не больше этого, похожие пересчитываются после
+# каждой порции; при большем числе полный пересчёт после импорта быстрее:
+SIMILAR_REFRESH_LIMIT = 200
+
+
+def parse_literal(value):
+    """Разбирает поле выгрузки: список или словарь в синтаксисе Python.
+
+    В JSON Lines поля уже разобраны и возвращаются как есть.
+    """
+    if not isinstance(value, str):
+        return value
+    try:
+        return ast.literal_eval(value)
+    except SyntaxError:
+        raise ValueError(value)
+
+
+def parse_row(row):
+    """Преобразует строку CSV в поля рецепта, для некорректной строки возвращает None."""
+    try:
+        ingredients = parse_literal(row['ingredients'])
+        fields = {
+            'title': row['title'],
+            'description': '\n'.join(parse_literal(row['description'])),
+            'ingredients': '\n'.join(f'{name}: {amount}' for name, amount in ingredients.items()),
+            'technology': '\n'.join(parse_literal(row['technology'])),
+            'image': row['image'] if 'image' in row else 'recipes/' + row['name'] + '.jpg',
+            'group': row['group'],
+        }
+    except (KeyError, ValueError, AttributeError, TypeError):
+        return None
+    fields['source_key'] = row['name']
+    fields['content_hash'] = content_hash(fields)
+    return fields
+
+
+def content_hash(fields):
+    """Хэш импортируемых полей: по нему определяется, изменился ли рецепт."""
+    data = json.dumps(
+        {name: value for name, value in fields.items() if name not in ('source_key', 'content_hash')},
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def read_rows(file, path):
+    """Строки выгрузки в виде словарей: из CSV или, для .jsonl, из JSON Lines."""
+    if path.removesuffix('.gz').endswith('.jsonl'):
+        return (json.loads(line) for line in file if line.strip())
+    return csv.DictReader(file, delimiter=",")
+
+
+def group_slug(title):
+    return translit(title, language_code='ru', reversed=True).lower().replace(' ', '_')
 
 
 class Command(BaseCommand):
     help = 'Import data from csv file'
 
-    def handle(self, *args, **options):
-        data = os.path.join(settings.BASE_DIR, 'upload/all_recipes.csv')
-        new_recipes = []
-        with open(data, encoding='utf-8') as file:
-            reader = csv.DictReader(file, delimiter=",")
-            for row in reader:
-                title = row['title']
-                description = '\n'.join(json.loads(row['description'].replace("'", '"')))
-                ingredients_row = json.loads(row['ingredients'].replace("'", '"'))
-                ingredients = '\n'.join([i + ':' + ' ' + ingredients_row[i] for i in ingredients_row])
-                technology = '\n'.join(json.loads(row['technology'].replace("'", '"')))
-                image = 'recipes/' + row['name'] + '.jpg'
-                group_title = row['group']
-                group_slug = translit(group_title, language_code='ru', reversed=True).lower().replace(' ', '_')
-                group, _ = Group.objects.get_or_create(title=group_title, slug=group_slug)
-                recipe = Recipe(
-                    title=title,
-                    description=description,
-                    ingredients=ingredients,
-                    technology=technology,
-                    image=image,
-                    author_id=1,
-                    group=group
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, 'upload/all_recipes.csv'),
+            help='Path to csv or jsonl file, optionally gzip-compressed (.gz)'
+        )
+        parser.add_argument('--author', help='Username of the recipes author (default: user with id 1)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per bulk insert and transaction')
+        parser.add_argument('--workers', type=int, default=0, help='Processes for row parsing (0 or 1 - parse in this process)')
+        parser.add_argument('--prune', action='store_true', help='Delete imported recipes missing from the file')
+
+    def get_author(self, username):
+        try:
+            if username:
+                return User.objects.get(username=username)
+            return User.objects.get(pk=1)
+        except User.DoesNotExist:
+            raise CommandError(f'Author {username or "with id 1"} does not exist')
+
+    def get_group_id(self, title):
+        """Возвращает id группы, создавая её при первом упоминании."""
+        if not title:
+            return None
+        if title not in self.groups:
+            group, _ = Group.objects.get_or_create(
+                slug=group_slug(title),
+                defaults={'title': title}
+            )
+            self.groups[title] = group.pk
+        return self.groups[title]
+
+    def claim_site_recipes(self, rows):
+        """Присваивает рецептам сайта ключи yacook-<id>, под которыми их выгружает export_db.
+
+        Вместе с ключом сохраняется хэш выгруженных полей, поэтому повторный
+        импорт выгрузки обновляет эти рецепты, а не создаёт их копии. Ключ
+        получает только рецепт с тем же названием: выгрузка другой базы не
+        должна присвоить чужие рецепты по совпавшему id.
+        """
+        pks = {}
+        for key in rows:
+            number = key.removeprefix(export.SITE_KEY_PREFIX)
+            if number != key and number.isdigit():
+                pks[int(number)] = key
+        if not pks:
+            return
+        recipes = export.export_queryset().filter(pk__in=pks, source_key__isnull=True)
+        Recipe.objects.bulk_update(
+            [
+                Recipe(
+                    pk=row['pk'],
+                    source_key=pks[row['pk']],
+                    content_hash=parse_row(export.export_row(row))['content_hash']
+                )
+                for row in recipes
+                if row['title'] == rows[pks[row['pk']]]['title']
+            ],
+            ['source_key', 'content_hash'],
+            batch_size=100,
+        )
+
+    def save_chunk(self, parsed, author):
+        """Сохраняет новые и изменённые рецепты порции одним запросом."""
+        rows = {}
+        for fields in parsed:
+            if fields is None:
+                self.stats['skipped'] += 1
+                continue
+            rows[fields['source_key']] = fields
+        with transaction.atomic():
+            self.claim_site_recipes(rows)
+            existing = dict(
+                Recipe.objects.filter(source_key__in=rows).values_list('source_key', 'content_hash')
+            )
+            recipes = []
+            unchanged = []
+            for key, fields in rows.items():
+                if key in existing and existing[key] == fields['content_hash']:
+                    self.stats['unchanged'] += 1
+                    unchanged.append(key)
+                    continue
+                self.stats['updated' if key in existing else 'inserted'] += 1
+                group_title = fields.pop('group')
+                recipes.append(
+                    Recipe(author=author, group_id=self.get_group_id(group_title), imported=self.run, **fields)
                 )
-                new_recipes.append(recipe)
-        Recipe.objects.bulk_create(new_recipes)
+            # С --prune каждый рецепт выгрузки получает отметку запуска, рецепты без неё prune удалит:
+            if self.run is not None and unchanged:
+                Recipe.objects.filter(source_key__in=unchanged).update(imported=self.run)
+            if not recipes:
+                return len(rows)
+            Recipe.objects.bulk_create(
+                recipes,
+                update_conflicts=True,
+                unique_fields=['source_key'],
+                update_fields=UPDATE_FIELDS + (['imported'] if self.run is not None else []),
+            )
+            changed = Recipe.objects.filter(source_key__in=[recipe.source_key for recipe in recipes]).only(
+                'source_key', *search.FIELD_WEIGHTS
+            )
+            changed = list(changed)
+            search.index_recipes(changed)
+            ingredients.sync_ingredients(changed)
+        cache.forget_versions(cache.RECIPE, [recipe.pk for recipe in changed])
+        self.update_similar([recipe.pk for recipe in changed])
+        # Массовая запись идёт без сигналов, поэтому изменёнными считаются все страницы:
+        cache.touch(cache.SITE)
+        return len(rows)
+
+    def prune(self, chunk_size):
+        """Удаляет импортированные рецепты, которых не было в выгрузке: без отметки этого запуска.
+
+        Рецепты сайта (ключи yacook-<id> из export_db) не удаляются.
+        """
+        stale = Recipe.objects.filter(source_key__isnull=False).exclude(imported=self.run).exclude(
+            source_key__startswith=export.SITE_KEY_PREFIX
+        ).values_list('pk', flat=True).order_by('pk')
+        deleted = last = 0
+        while True:
+            pks = list(stale.filter(pk__gt=last)[:chunk_size])
+            if not pks:
+                break
+            with transaction.atomic():
+                Recipe.objects.filter(pk__in=pks).delete()
+            deleted += len(pks)
+            last = pks[-1]
+        self.stats['deleted'] = deleted
+
+    def update_similar(self, pks):
+        """Пересчитывает похожие рецепты изменённых рецептов порции.
+
+        Если изменённых рецептов больше SIMILAR_REFRESH_LIMIT, порции больше
+        не пересчитываются: после импорта выполняется полный пересчёт.
+        """
+        self.changed_count += len(pks)
+        if pks and self.changed_count <= SIMILAR_REFRESH_LIMIT:
+            similar.refresh(pks)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        chunk_size = options['chunk_size']
+        if not os.path.exists(path):
+            raise CommandError(f'File {path} does not exist')
+        author = self.get_author(options['author'])
+        self.groups = dict(Group.objects.values_list('title', 'pk'))
+        pool = Pool(options['workers']) if options['workers'] > 1 else None
+        self.stats = dict.fromkeys(('inserted', 'updated', 'unchanged', 'deleted', 'skipped'), 0)
+        self.run = timezone.now() if options['prune'] else None
+        self.changed_count = 0
+        total = 0
+        started = time.monotonic()
+        try:
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path, 'rt', encoding='utf-8', newline='') as file:
+                reader = read_rows(file, path)
+                while True:
+                    rows = list(islice(reader, chunk_size))
+                    if not rows:
+                        break
+                    if pool:
+                        parsed = pool.map(parse_row, rows, chunksize=max(1, len(rows) // options['workers']))
+                    else:
+                        parsed = [parse_row(row) for row in rows]
+                    total += self.save_chunk(parsed, author)
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(f'Processed {total} rows, {total / elapsed:.0f} rows/s')
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+        if options['prune']:
+            self.prune(chunk_size)
+        # Рецепты вставлены без сигналов, поэтому счётчики пересчитываются целиком,
+        # а ленты подписчиков автора собираются заново одним запросом на пачку:
+        author_stats.rebuild([author.pk])
+        counters.reconcile_totals()
+        if self.stats['inserted']:
+            feed.rebuild_many(Follow.objects.filter(author=author).values_list('user_id', flat=True))
+        if self.changed_count > SIMILAR_REFRESH_LIMIT:
+            similar.rebuild()
+        elapsed = time.monotonic() - started
+        summary = ', '.join(f'{name}: {count}' for name, count in self.stats.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {total} rows in {elapsed:.1f}s, {len(self.groups)} groups. {summary}'
+        ))
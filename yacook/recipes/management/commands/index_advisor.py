@@ -0,0 +1,153 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import EmptyResultSet
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models.expressions import Col
+from django.db.models.lookups import Exact
+
+from ...ingredients import recipes_by_ingredients
+from ...models import Comment, FeedEntry, Follow, Group, Recipe
+from ...paginator import DEFAULT_ORDERING, NEXT, CursorPaginator
+from ...search import search_recipes
+from ...similar import similar_recipes
+from ...views import get_comments_page
+
+User = get_user_model()
+
+FULL_SCAN = 'full scan'
+SORT = 'temp sort'
+
+# Признаки проблем в плане запроса для разных СУБД:
+PLAN_PATTERNS = {
+    'sqlite': (
+        (FULL_SCAN, re.compile(r'\bSCAN (?!CONSTANT ROW)\S+(?!.*\b(USING|VIRTUAL TABLE)\b)')),
+        (SORT, re.compile(r'USE TEMP B-TREE')),
+    ),
+    'postgresql': (
+        (FULL_SCAN, re.compile(r'Seq Scan on \S+')),
+        (SORT, re.compile(r'(^|->)\s*Sort\b')),
+    ),
+}
+
+
+def suggest_index(queryset):
+    """Предлагает составной индекс: поля условий на равенство, затем поля сортировки."""
+    query = queryset.query
+    fields = []
+    for child in query.where.children:
+        if isinstance(child, Exact) and isinstance(child.lhs, Col) and child.lhs.alias == query.base_table:
+            fields.append(child.lhs.target.name)
+    for name in query.order_by:
+        if not isinstance(name, str):
+            continue
+        descending = name.startswith('-')
+        name = name.lstrip('-')
+        if name == 'pk':
+            name = query.model._meta.pk.name
+        fields.append(f'-{name}' if descending else name)
+    unique = []
+    for name in fields:
+        if name.lstrip('-') not in [field.lstrip('-') for field in unique]:
+            unique.append(name)
+    return f'{query.model.__name__}: models.Index(fields={tuple(unique)!r})'
+
+
+class Command(BaseCommand):
+    help = 'Explain the querysets of recipe views and flag full table scans and temporary sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fail',
+            action='store_true',
+            help='Exit with an error if any unexpected problem is found (for CI)'
+        )
+
+    def sample(self):
+        """Объекты, на которых строятся запросы; в пустой базе - несуществующие id."""
+        recipe = Recipe.objects.order_by('-pk').first() or Recipe(pk=1, author_id=1)
+        return {
+            'recipe': recipe,
+            'author': User(pk=recipe.author_id),
+            'group': Group.objects.first() or Group(pk=1),
+            'user': Follow.objects.values_list('user_id', flat=True).first() or 1,
+        }
+
+    def paged(self, queryset, ordering=DEFAULT_ORDERING):
+        """Запросы первой и следующей по курсору страниц списка."""
+        paginator = CursorPaginator(queryset, settings.RECIPE_ON_PAGE, ordering)
+        first = paginator.offset_queryset(1)
+        item = first.first()
+        if item is None:
+            return [('page 1', first)]
+        values = [getattr(item, name) for name in paginator.fields]
+        return [('page 1', first), ('next page', paginator.cursor_queryset(NEXT, values))]
+
+    def checks(self):
+        """Запросы представлений: (название, queryset, допустимые проблемы)."""
+        sample = self.sample()
+        recipe, author, group, user = sample['recipe'], sample['author'], sample['group'], sample['user']
+        lists = (
+            ('index', Recipe.objects.select_related('author', 'group'), DEFAULT_ORDERING, ()),
+            ('group_list', group.recipes.select_related('author'), DEFAULT_ORDERING, ()),
+            ('profile', author.recipes.select_related('group'), DEFAULT_ORDERING, ()),
+            ('follow_index', FeedEntry.objects.filter(user_id=user), ('-pub_date', '-recipe_id'), ()),
+            # Результаты поиска и подбора сортируются по вычисляемой релевантности,
+            # поэтому сортировка найденных записей неизбежна:
+            ('search', search_recipes(Recipe.objects.all(), 'борщ'), ('rank', '-pub_date', '-id'), (SORT,)),
+            (
+                'pantry',
+                recipes_by_ingredients(Recipe.objects.all(), 'морковь, лук'),
+                ('-matched', 'missing', '-id'),
+                (SORT,),
+            ),
+        )
+        for name, queryset, ordering, allowed in lists:
+            for page, paged in self.paged(queryset, ordering):
+                yield f'{name}: {page}', paged, allowed
+        comments = get_comments_page(recipe.pk).paginator
+        yield 'recipe_detail: comments', comments.offset_queryset(1), ()
+        yield 'recipe_detail: latest comment', Comment.objects.filter(recipe=recipe).order_by('-created')[:1], ()
+        yield 'recipe_detail: similar recipes', similar_recipes(recipe.pk), ()
+        yield 'profile: following', Follow.objects.filter(user_id=user, author=author), ()
+        yield 'profile: followers', Follow.objects.filter(author=author).values('user'), ()
+
+    def problems(self, plan):
+        patterns = PLAN_PATTERNS.get(connection.vendor, ())
+        found = []
+        for line in plan.splitlines():
+            for kind, pattern in patterns:
+                match = pattern.search(line)
+                if match and (kind, match.group(0).strip()) not in found:
+                    found.append((kind, match.group(0).strip()))
+        return found
+
+    def handle(self, *args, **options):
+        if connection.vendor not in PLAN_PATTERNS:
+            self.stderr.write(self.style.WARNING(
+                f'Plans of {connection.vendor} are not analysed, only printed.'
+            ))
+        unexpected = 0
+        for name, queryset, allowed in self.checks():
+            try:
+                plan = queryset.explain()
+            except EmptyResultSet:
+                self.stdout.write(f'{name}: skipped, no data to build the query')
+                continue
+            problems = self.problems(plan)
+            flagged = [(kind, text) for kind, text in problems if kind not in allowed]
+            if flagged:
+                unexpected += 1
+                self.stdout.write(self.style.ERROR(f'{name}: ' + '; '.join(text for _, text in flagged)))
+                self.stdout.write(f'    suggested {suggest_index(queryset)}')
+            elif problems:
+                self.stdout.write(self.style.WARNING(f'{name}: expected ' + '; '.join(text for _, text in problems)))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+            if options['verbosity'] > 1:
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+        if unexpected and options['fail']:
+            raise CommandError(f'{unexpected} queries need indexes.')
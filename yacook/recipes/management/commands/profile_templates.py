@@ -0,0 +1,142 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core import template_profiler
+from ...models import Comment, Follow, Group, Recipe
+
+User = get_user_model()
+
+PAGES = (
+    'index', 'group_list', 'profile', 'recipe_detail', 'recipe_comments', 'search', 'pantry',
+    'follow_index', 'recipe_create', 'recipe_edit', 'edit_comment', 'about_author', 'about_tech',
+    'login', 'signup',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Render every page through its view on the current data and report the slowest '
+        'templates and template tags by self time'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', nargs='+', choices=PAGES, default=list(PAGES))
+        parser.add_argument('--repeat', type=int, default=20, help='Measured renders per page')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured renders per page')
+        parser.add_argument('--limit', type=int, default=15, help='Rows in each report table')
+        parser.add_argument('--output', help='Also write the report as JSON to this file')
+
+    def targets(self):
+        """Адреса страниц и пользователь, от имени которого они открываются."""
+        recipe = (
+            Recipe.objects.annotate(total=Count('comments')).order_by('-total').only('pk', 'author_id').first()
+        )
+        if recipe is None:
+            raise CommandError('No recipes found, run generate_data first.')
+        group = Group.objects.annotate(total=Count('recipes')).order_by('-total').first()
+        author = User.objects.annotate(total=Count('recipes')).order_by('-total').first()
+        follower = Follow.objects.values('user').annotate(total=Count('pk')).order_by('-total').first()
+        comment = Comment.objects.only('pk', 'author_id').first()
+        return {
+            'index': (reverse('recipes:index'), None),
+            'group_list': (reverse('recipes:group_list', args=(group.slug,)) if group else None, None),
+            'profile': (reverse('recipes:profile', args=(author.username,)), None),
+            'recipe_detail': (reverse('recipes:recipe_detail', args=(recipe.pk,)), None),
+            'recipe_comments': (reverse('recipes:recipe_comments', args=(recipe.pk,)), None),
+            'search': (f"{reverse('recipes:search')}?s=борщ", None),
+            'pantry': (f"{reverse('recipes:pantry')}?products=картофель, лук", None),
+            'follow_index': (reverse('recipes:follow_index'), follower['user'] if follower else None),
+            'recipe_create': (reverse('recipes:recipe_create'), author.pk),
+            'recipe_edit': (reverse('recipes:recipe_edit', args=(recipe.pk,)), recipe.author_id),
+            'edit_comment': (
+                reverse('recipes:edit_comment', args=(comment.pk,)) if comment else None,
+                comment.author_id if comment else None,
+            ),
+            'about_author': (reverse('about:author'), None),
+            'about_tech': (reverse('about:tech'), None),
+            'login': (reverse('users:login'), None),
+            'signup': (reverse('users:signup'), None),
+        }
+
+    def client(self, user_id):
+        client = Client()
+        if user_id is not None:
+            client.force_login(User.objects.get(pk=user_id))
+        return client
+
+    def render_page(self, page, url, client, options, total):
+        for _ in range(options['warmup']):
+            client.get(url)
+        profile, token = template_profiler.start(nodes=True)
+        try:
+            for _ in range(options['repeat']):
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise CommandError(f'{page}: {url} returned {response.status_code}')
+        finally:
+            template_profiler.finish(token)
+        total.merge(profile)
+        rendered = sum(own for _, _, own in profile.templates.values())
+        return round(rendered * 1000 / options['repeat'], 2)
+
+    def table(self, title, rows, repeat):
+        self.stdout.write(f'\n{title}')
+        self.stdout.write(f'{"self ms":>9} {"total ms":>9} {"calls":>7}  name')
+        for name, calls, total, own in rows:
+            self.stdout.write(
+                f'{own * 1000 / repeat:9.2f} {total * 1000 / repeat:9.2f} {calls / repeat:7.1f}  {name}'
+            )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be positive.')
+        if settings.DEBUG:
+            self.stderr.write(self.style.WARNING(
+                'DEBUG is on: templates are not cached and debug tooling distorts the results, set DEBUG=False.'
+            ))
+        template_profiler.install()
+        targets = self.targets()
+        total = template_profiler.Profile()
+        pages = {}
+        # Профиль собирает команда, а не PerformanceMiddleware:
+        with override_settings(TEMPLATE_PROFILING=False):
+            for page in options['pages']:
+                url, user_id = targets[page]
+                if url is None or (page in ('follow_index', 'edit_comment') and user_id is None):
+                    self.stderr.write(self.style.WARNING(f'Skipping {page}: no data, run generate_data first.'))
+                    continue
+                self.stderr.write(f'Rendering {page}...')
+                pages[page] = self.render_page(page, url, self.client(user_id), options, total)
+
+        repeat = options['repeat'] * max(len(pages), 1)
+        self.stdout.write(f'{"ms/render":>9}  page')
+        for page, milliseconds in sorted(pages.items(), key=lambda item: item[1], reverse=True):
+            self.stdout.write(f'{milliseconds:9.2f}  {page}')
+        templates = total.top('templates', options['limit'])
+        nodes = total.top('nodes', options['limit'])
+        self.table('Slowest templates, per page render:', templates, repeat)
+        self.table('Slowest tags and variables, per page render:', nodes, repeat)
+
+        if options['output']:
+            def rows(items):
+                return [
+                    {'name': name, 'calls': calls, 'total_ms': round(total * 1000, 2), 'self_ms': round(own * 1000, 2)}
+                    for name, calls, total, own in items
+                ]
+
+            report = {
+                'repeat': options['repeat'],
+                'debug': settings.DEBUG,
+                'pages_ms_per_render': pages,
+                'templates': rows(templates),
+                'nodes': rows(nodes),
+            }
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(json.dumps(report, indent=2, ensure_ascii=False))
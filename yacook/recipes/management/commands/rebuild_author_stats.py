@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from ... import stats
+
+
+class Command(BaseCommand):
+    help = 'Recount recipes, followers, following and received comments of authors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Rebuild statistics only for this user id')
+
+    def handle(self, *args, **options):
+        fixed = stats.rebuild([options['user']] if options['user'] else None)
+        self.stdout.write(self.style.SUCCESS(f'Fixed {fixed} authors'))
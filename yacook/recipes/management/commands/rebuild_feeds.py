@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from ... import feed
+from ...models import FeedEntry, Follow
+
+
+class Command(BaseCommand):
+    help = 'Rebuild precomputed follow feeds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Rebuild feed only for this user id')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            feed.rebuild(options['user'])
+            self.stdout.write(self.style.SUCCESS('Rebuilt 1 feed'))
+            return
+        users = list(Follow.objects.order_by('user_id').values_list('user_id', flat=True).distinct())
+        feed.rebuild_many(users)
+        # Ленты пользователей, у которых не осталось подписок:
+        FeedEntry.objects.exclude(user_id__in=Follow.objects.values('user_id')).delete()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(users)} feeds'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from ...ingredients import sync_ingredients
+from ...models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Rebuild structured ingredient index from recipe texts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        batch = []
+        for recipe in Recipe.objects.only('ingredients').order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(recipe)
+            if len(batch) >= batch_size:
+                sync_ingredients(batch)
+                total += len(batch)
+                batch = []
+        sync_ingredients(batch)
+        total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Indexed ingredients of {total} recipes'))
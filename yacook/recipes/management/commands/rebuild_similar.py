@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ... import similar
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed similar recipes (TF-IDF with MinHash/LSH candidates)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbours', type=int, help='Similar recipes to keep per recipe')
+        parser.add_argument('--recipe', type=int, nargs='+', help='Refresh only these recipe ids')
+        parser.add_argument('--batch-size', type=int, default=similar.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['recipe']:
+            total = similar.refresh(options['recipe'], options['neighbours'])
+        else:
+            total = similar.rebuild(options['neighbours'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed similar recipes for {total} recipes in {time.monotonic() - started:.1f}s'
+        ))
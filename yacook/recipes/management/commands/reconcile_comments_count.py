@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from ...models import Comment, Recipe
+
+
+class Command(BaseCommand):
+    help = 'Fix drift of stored comment counters on recipes'
+
+    def handle(self, *args, **options):
+        counts = Comment.objects.filter(recipe=OuterRef('pk')).order_by().values('recipe').annotate(
+            count=Count('pk')
+        ).values('count')
+        actual = Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+        with transaction.atomic():
+            fixed = Recipe.objects.annotate(actual=actual).filter(
+                ~Q(comments_count=actual)
+            ).update(comments_count=actual)
+        self.stdout.write(self.style.SUCCESS(f'Fixed {fixed} recipes'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from ... import counters, stats
+
+
+class Command(BaseCommand):
+    help = 'Recount recipe totals of the site, groups and authors and fix the stored counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-authors', action='store_true', help='Reconcile only site and group totals')
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile_totals()
+        self.stdout.write(self.style.SUCCESS(f'Fixed {fixed} site and group counters'))
+        if not options['skip_authors']:
+            fixed = stats.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'Fixed {fixed} authors'))
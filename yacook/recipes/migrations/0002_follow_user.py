@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='follow',
+            old_name='users',
+            new_name='user',
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.1.5 on 2026-10-18 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+FTS_TABLE = 'recipes_recipe_fts'
+
+
+def create_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from recipes.stemmer import stem_text
+
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+        f'USING fts5(title, ingredients, description, tokenize="unicode61 remove_diacritics 2")'
+    )
+    Recipe = apps.get_model('recipes', 'Recipe')
+    recipes = Recipe.objects.using(schema_editor.connection.alias).values_list(
+        'pk', 'title', 'ingredients', 'description'
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, ingredients, description) VALUES (%s, %s, %s, %s)',
+            [(pk, *(stem_text(text) for text in texts)) for pk, *texts in recipes.iterator()]
+        )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_follow_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=64, verbose_name='Основа слова')),
+                ('weight', models.FloatField(default=1.0, verbose_name='Вес')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Поисковый термин',
+                'verbose_name_plural': 'Поисковые термины',
+            },
+        ),
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.5 on 2026-10-18 10:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Хэш импортированных данных'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='source_key',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True, unique=True, verbose_name='Ключ во внешнем каталоге'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.5 on 2026-10-18 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_similar_recipes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeCounter',
+            fields=[
+                ('scope', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Область')),
+                ('value', models.PositiveIntegerField(default=0, verbose_name='Количество рецептов')),
+            ],
+            options={
+                'verbose_name': 'Счётчик рецептов',
+                'verbose_name_plural': 'Счётчики рецептов',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.5 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='renditions_image',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Изображение, для которого созданы уменьшенные копии'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count(queryset, field):
+    counts = queryset.filter(**{field: OuterRef('author_id')}).order_by().values(field).annotate(
+        count=Count('pk')
+    ).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def create_author_stats(apps, schema_editor):
+    """Создаёт счётчики всех пользователей, у которых их ещё нет, и заполняет их по базе."""
+    db = schema_editor.connection.alias
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    AuthorStats = apps.get_model('recipes', 'AuthorStats')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Follow = apps.get_model('recipes', 'Follow')
+    Comment = apps.get_model('recipes', 'Comment')
+    missing = User.objects.using(db).filter(stats__isnull=True).values_list('pk', flat=True)
+    AuthorStats.objects.using(db).bulk_create(
+        [AuthorStats(author_id=pk) for pk in missing.iterator()],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    AuthorStats.objects.using(db).update(
+        recipes_count=count(Recipe.objects.using(db), 'author'),
+        followers_count=count(Follow.objects.using(db), 'author'),
+        following_count=count(Follow.objects.using(db), 'user'),
+        comments_received=count(Comment.objects.using(db), 'recipe__author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_renditions_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_author_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+from django.db.models import Count
+
+SITE = 'recipes'
+
+
+def create_counters(apps, schema_editor):
+    """Создаёт счётчики рецептов сайта и всех групп по данным базы."""
+    db = schema_editor.connection.alias
+    Group = apps.get_model('recipes', 'Group')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeCounter = apps.get_model('recipes', 'RecipeCounter')
+    values = {f'group:{pk}': 0 for pk in Group.objects.using(db).values_list('pk', flat=True).iterator()}
+    groups = Recipe.objects.using(db).filter(group__isnull=False).order_by().values('group').annotate(total=Count('pk'))
+    values.update({f'group:{row["group"]}': row['total'] for row in groups})
+    values[SITE] = Recipe.objects.using(db).count()
+    RecipeCounter.objects.using(db).all().delete()
+    RecipeCounter.objects.using(db).bulk_create(
+        [RecipeCounter(scope=scope, value=value) for scope, value in values.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_author_stats_backfill'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_counters, migrations.RunPython.noop),
+    ]
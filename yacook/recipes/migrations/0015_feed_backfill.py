@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+
+BATCH_SIZE = 500
+
+
+def backfill_feeds(apps, schema_editor):
+    """Собирает ленты подписок всех подписчиков, которые были до появления FeedEntry.
+
+    Тот же запрос, что и в feed.rebuild_many: последние FEED_MAX_ENTRIES
+    рецептов авторов, на которых подписан пользователь, кроме авторов
+    с большим числом подписчиков.
+    """
+    db = schema_editor.connection.alias
+    connection = schema_editor.connection
+    Follow = apps.get_model('recipes', 'Follow')
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    large = list(
+        Follow.objects.using(db).values('author').annotate(followers=Count('id')).filter(
+            followers__gt=settings.FEED_FANOUT_FOLLOWERS_LIMIT
+        ).values_list('author', flat=True)
+    )
+    users = list(Follow.objects.using(db).order_by('user_id').values_list('user_id', flat=True).distinct())
+    feed = connection.ops.quote_name(FeedEntry._meta.db_table)
+    follow = connection.ops.quote_name(Follow._meta.db_table)
+    recipe = connection.ops.quote_name(Recipe._meta.db_table)
+    exclude = f'AND f.author_id NOT IN ({", ".join(["%s"] * len(large))})' if large else ''
+    for start in range(0, len(users), BATCH_SIZE):
+        batch = users[start:start + BATCH_SIZE]
+        FeedEntry.objects.using(db).filter(user_id__in=batch).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {feed} (user_id, recipe_id, author_id, pub_date) '
+                f'SELECT user_id, recipe_id, author_id, pub_date FROM ('
+                f'SELECT f.user_id, r.id AS recipe_id, r.author_id, r.pub_date, ROW_NUMBER() OVER ('
+                f'PARTITION BY f.user_id ORDER BY r.pub_date DESC, r.id DESC) AS position '
+                f'FROM {follow} f JOIN {recipe} r ON r.author_id = f.author_id '
+                f'WHERE f.user_id IN ({", ".join(["%s"] * len(batch))}) {exclude}'
+                f') ranked WHERE position <= %s',
+                [*batch, *large, settings.FEED_MAX_ENTRIES]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_counters_backfill'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.5 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_feed_backfill'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='imported',
+            field=models.DateTimeField(editable=False, help_text='Рецепты, не отмеченные запуском import_db --prune, удаляются им', null=True, verbose_name='Время импорта с удалением отсутствующих'),
+        ),
+    ]
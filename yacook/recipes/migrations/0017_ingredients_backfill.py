@@ -0,0 +1,63 @@
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.ingredients import parse_ingredients
+
+BATCH_SIZE = 1000
+
+
+def index_recipes(Ingredient, RecipeIngredient, db, recipes):
+    parsed = {pk: parse_ingredients(text) for pk, text in recipes}
+    names = {}
+    for items in parsed.values():
+        for key, (name, _) in items.items():
+            names.setdefault(key, name)
+    ids = dict(Ingredient.objects.using(db).filter(key__in=names).values_list('key', 'pk'))
+    Ingredient.objects.using(db).bulk_create(
+        [Ingredient(key=key, name=name) for key, name in names.items() if key not in ids],
+        ignore_conflicts=True,
+    )
+    ids = dict(Ingredient.objects.using(db).filter(key__in=names).values_list('key', 'pk'))
+    RecipeIngredient.objects.using(db).bulk_create(
+        [
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=ids[key], amount=amount)
+            for recipe_id, items in parsed.items()
+            for key, (_, amount) in items.items()
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def fill_ingredients(apps, schema_editor):
+    """Связывает с ингредиентами рецепты, созданные до 0006, и заполняет ingredients_count."""
+    db = schema_editor.connection.alias
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    unindexed = Recipe.objects.using(db).filter(recipe_ingredients__isnull=True).exclude(ingredients='')
+    unindexed = unindexed.order_by('pk').values_list('pk', 'ingredients')
+    last = 0
+    while True:
+        recipes = list(unindexed.filter(pk__gt=last)[:BATCH_SIZE])
+        if not recipes:
+            break
+        index_recipes(Ingredient, RecipeIngredient, db, recipes)
+        last = recipes[-1][0]
+    counts = RecipeIngredient.objects.using(db).filter(recipe=OuterRef('pk')).order_by().values('recipe').annotate(
+        count=Count('pk')
+    ).values('count')
+    Recipe.objects.using(db).update(
+        ingredients_count=Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recipe_imported'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_ingredients, migrations.RunPython.noop),
+    ]
@@ -56,6 +56,10 @@ class Recipe(models.Model):
         verbose_name="Дата публикации",
         auto_now_add=True
     )
+    updated = models.DateTimeField(
+        verbose_name="Дата изменения",
+        auto_now=True
+    )
     author = models.ForeignKey(
         User,
         verbose_name="Автор рецепта",
@@ -77,11 +81,53 @@ class Recipe(models.Model):
         upload_to='recipes/',
         blank=True
     )
+    renditions_image = models.CharField(
+        verbose_name="Изображение, для которого созданы уменьшенные копии",
+        max_length=100,
+        blank=True,
+        editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        verbose_name="Количество комментариев",
+        default=0,
+        editable=False
+    )
+    ingredients_count = models.PositiveIntegerField(
+        verbose_name="Количество ингредиентов",
+        default=0,
+        editable=False
+    )
+    source_key = models.CharField(
+        verbose_name="Ключ во внешнем каталоге",
+        max_length=255,
+        unique=True,
+        blank=True,
+        null=True,
+        editable=False
+    )
+    content_hash = models.CharField(
+        verbose_name="Хэш импортированных данных",
+        max_length=64,
+        blank=True,
+        editable=False
+    )
+    imported = models.DateTimeField(
+        verbose_name="Время импорта с удалением отсутствующих",
+        help_text="Рецепты, не отмеченные запуском import_db --prune, удаляются им",
+        null=True,
+        editable=False
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
+        # Индексы под сортировку списков и переход по курсору:
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'), name='recipe_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'), name='recipe_author_pub_date_idx'),
+            models.Index(fields=('group', '-pub_date', '-id'), name='recipe_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -116,6 +162,9 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
+        indexes = [
+            models.Index(fields=('recipe', '-created', '-id'), name='comment_recipe_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -141,6 +190,262 @@ class Follow(models.Model):
     class Meta:
         verbose_name = "Подписки"
         verbose_name_plural = "Подписки"
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ]
 
     def __str__(self):
         return f"{self.user} подписан на {self.author}"
+
+
+class AuthorStats(models.Model):
+    """Счётчики автора, обновляемые при изменениях, для страницы профайла."""
+    author = models.OneToOneField(
+        User,
+        verbose_name="Автор",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="Количество рецептов",
+        default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name="Количество подписчиков",
+        default=0
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name="Количество подписок",
+        default=0
+    )
+    comments_received = models.PositiveIntegerField(
+        verbose_name="Комментариев к рецептам автора",
+        default=0
+    )
+
+    class Meta:
+        verbose_name = "Статистика автора"
+        verbose_name_plural = "Статистика авторов"
+
+    def __str__(self):
+        return f"Статистика {self.author_id}"
+
+
+class RecipeCounter(models.Model):
+    """Количество рецептов на сайте или в группе, обновляемое при изменениях."""
+    scope = models.CharField(
+        verbose_name="Область",
+        max_length=50,
+        primary_key=True
+    )
+    value = models.PositiveIntegerField(
+        verbose_name="Количество рецептов",
+        default=0
+    )
+
+    class Meta:
+        verbose_name = "Счётчик рецептов"
+        verbose_name_plural = "Счётчики рецептов"
+
+    def __str__(self):
+        return f"{self.scope}: {self.value}"
+
+
+class RecipeSearchTerm(models.Model):
+    """Запись инвертированного поискового индекса для СУБД без FTS5."""
+    TERM_LENGTH = 64
+
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name="Рецепт",
+        on_delete=models.CASCADE,
+        related_name='search_terms'
+    )
+    term = models.CharField(
+        verbose_name="Основа слова",
+        max_length=TERM_LENGTH,
+        db_index=True
+    )
+    weight = models.FloatField(
+        verbose_name="Вес",
+        default=1.0
+    )
+
+    class Meta:
+        verbose_name = "Поисковый термин"
+        verbose_name_plural = "Поисковые термины"
+
+    def __str__(self):
+        return self.term
+
+
+class FeedEntry(models.Model):
+    """Запись ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        verbose_name="Читатель ленты",
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name="Рецепт",
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name="Автор рецепта",
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name="Дата публикации"
+    )
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'recipe'), name='unique_feed_entry'),
+        ]
+        indexes = [
+            models.Index(fields=('user', '-pub_date', '-recipe'), name='feed_user_pub_date_idx'),
+            models.Index(fields=('user', 'author'), name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id} в ленте {self.user_id}"
+
+
+class SimilarRecipe(models.Model):
+    """Заранее вычисленный похожий рецепт."""
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name="Рецепт",
+        on_delete=models.CASCADE,
+        related_name='similar_links'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        verbose_name="Похожий рецепт",
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField(
+        verbose_name="Сходство"
+    )
+
+    class Meta:
+        verbose_name = "Похожий рецепт"
+        verbose_name_plural = "Похожие рецепты"
+        constraints = [
+            models.UniqueConstraint(fields=('recipe', 'similar'), name='unique_similar_recipe'),
+        ]
+        indexes = [
+            models.Index(fields=('recipe', '-score'), name='similar_recipe_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.similar_id} похож на {self.recipe_id}"
+
+
+class RecipeBucket(models.Model):
+    """Корзина LSH, в которую попал рецепт в одной из полос сигнатуры MinHash."""
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name="Рецепт",
+        on_delete=models.CASCADE,
+        related_name='buckets'
+    )
+    band = models.PositiveSmallIntegerField(
+        verbose_name="Полоса"
+    )
+    key = models.BigIntegerField(
+        verbose_name="Ключ корзины"
+    )
+
+    class Meta:
+        verbose_name = "Корзина LSH"
+        verbose_name_plural = "Корзины LSH"
+        indexes = [
+            models.Index(fields=('band', 'key'), name='recipe_bucket_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id}: {self.band}/{self.key}"
+
+
+class SimilarityTerm(models.Model):
+    """Вес IDF признака рецепта на момент последнего пересчёта похожих рецептов."""
+    TERM_LENGTH = 255
+
+    term = models.CharField(
+        verbose_name="Признак",
+        max_length=TERM_LENGTH,
+        unique=True
+    )
+    idf = models.FloatField(
+        verbose_name="Вес IDF"
+    )
+
+    class Meta:
+        verbose_name = "Признак сходства"
+        verbose_name_plural = "Признаки сходства"
+
+    def __str__(self):
+        return self.term
+
+
+class Ingredient(models.Model):
+    """Модель нормализованного ингредиента."""
+    name = models.CharField(
+        verbose_name="Название ингредиента",
+        max_length=200
+    )
+    key = models.CharField(
+        verbose_name="Нормализованное название",
+        help_text="Основы слов названия в нижнем регистре",
+        max_length=200,
+        unique=True
+    )
+
+    class Meta:
+        ordering = ('name',)
+        verbose_name = "Ингредиент"
+        verbose_name_plural = "Ингредиенты"
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeIngredient(models.Model):
+    """Модель связи рецепта с ингредиентом."""
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name="Рецепт",
+        on_delete=models.CASCADE,
+        related_name='recipe_ingredients'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name="Ингредиент",
+        on_delete=models.CASCADE,
+        related_name='recipe_links'
+    )
+    amount = models.CharField(
+        verbose_name="Количество",
+        max_length=200,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = "Ингредиент рецепта"
+        verbose_name_plural = "Ингредиенты рецептов"
+        constraints = [
+            models.UniqueConstraint(fields=('ingredient', 'recipe'), name='unique_recipe_ingredient'),
+        ]
+
+    def __str__(self):
+        return f"{self.ingredient}: {self.amount}"
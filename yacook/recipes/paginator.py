@@ -0,0 +1,247 @@
+"""Постраничный вывод по курсору (keyset pagination).
+
+Вместо OFFSET и COUNT(*) следующая страница выбирается условием на значения
+полей сортировки последней записи, поэтому глубина страницы не влияет
+на скорость запроса.
+"""
+import base64
+import binascii
+import datetime
+import json
+from functools import cached_property
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+
+DEFAULT_ORDERING = ('-pub_date', '-id')
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Сохраняет время с микросекундами, иначе курсор теряет точность."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class InvalidCursor(Exception):
+    """Курсор повреждён или не относится к этому списку."""
+
+
+class CursorPage:
+    """Страница, полученная по курсору."""
+
+    def __init__(self, items, paginator, has_next, has_previous, number=None):
+        self.items = items
+        self.object_list = paginator.transform(items) if paginator.transform else items
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.number = number
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.items:
+            return None
+        return self.paginator.encode_cursor(self.items[-1], NEXT)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.items:
+            return None
+        return self.paginator.encode_cursor(self.items[0], PREVIOUS)
+
+
+class CursorPaginator:
+    """Паджинатор по курсору для упорядоченного queryset.
+
+    ordering должен однозначно упорядочивать записи, поэтому последним
+    полем обычно идёт первичный ключ. transform позволяет выводить на
+    странице не сами записи queryset, а связанные с ними объекты.
+    count - количество записей из счётчиков (число или функция без
+    аргументов), чтобы не выполнять COUNT(*) по списку.
+    """
+
+    def __init__(self, queryset, per_page, ordering=DEFAULT_ORDERING, transform=None, count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.transform = transform
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self._count = count
+
+    @cached_property
+    def count(self):
+        """Количество записей из count, а без него - точное; считается только при обращении."""
+        if self._count is None:
+            return self.exact_count
+        return self._count() if callable(self._count) else self._count
+
+    @cached_property
+    def exact_count(self):
+        """Точное количество записей запросом COUNT(*)."""
+        return self.queryset.order_by().count()
+
+    def _value(self, item, name):
+        if isinstance(item, dict):
+            return item[name]
+        return getattr(item, name)
+
+    def encode_cursor(self, item, direction):
+        values = [self._value(item, name) for name in self.fields]
+        data = json.dumps([direction, values], cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (TypeError, ValueError, binascii.Error):
+            raise InvalidCursor(cursor)
+        if direction not in (NEXT, PREVIOUS) or not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+        opts = self.queryset.model._meta
+        parsed = []
+        for name, value in zip(self.fields, values):
+            try:
+                field = opts.pk if name == 'pk' else opts.get_field(name)
+            except FieldDoesNotExist:
+                # Сортировка по аннотации, например по релевантности поиска:
+                annotation = self.queryset.query.annotations.get(name)
+                if annotation is None:
+                    raise InvalidCursor(cursor)
+                field = annotation.output_field
+            try:
+                parsed.append(field.to_python(value))
+            except ValidationError:
+                raise InvalidCursor(cursor)
+        return direction, parsed
+
+    def _keyset_filter(self, values, direction):
+        """Строит условие «после» (или «до») записи с указанными значениями."""
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            field = self.fields[index]
+            descending = name.startswith('-')
+            if direction == PREVIOUS:
+                descending = not descending
+            lookup = 'lt' if descending else 'gt'
+            step = Q(**{f'{field}__{lookup}': values[index]})
+            for previous_field, previous_value in zip(self.fields[:index], values[:index]):
+                step &= Q(**{previous_field: previous_value})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def cursor_queryset(self, direction, values):
+        """Запрос записей после (или до) курсора, с одной лишней для has_next."""
+        ordering = self.ordering if direction == NEXT else self._reversed_ordering()
+        queryset = self.queryset.filter(self._keyset_filter(values, direction))
+        return queryset.order_by(*ordering)[:self.per_page + 1]
+
+    def offset_queryset(self, number):
+        """Запрос записей страницы по номеру, с одной лишней для has_next."""
+        offset = (number - 1) * self.per_page
+        return self.queryset.order_by(*self.ordering)[offset:offset + self.per_page + 1]
+
+    def get_page(self, cursor=None):
+        """Возвращает страницу после курсора; без курсора - первую страницу.
+
+        Для повреждённого курсора выбрасывает InvalidCursor.
+        """
+        if not cursor:
+            return self.get_offset_page(1)
+        direction, values = self.decode_cursor(cursor)
+        items = list(self.cursor_queryset(direction, values))
+        if direction == NEXT:
+            has_next = len(items) > self.per_page
+            return CursorPage(items[:self.per_page], self, has_next=has_next, has_previous=True)
+        has_previous = len(items) > self.per_page
+        items = items[:self.per_page][::-1]
+        return CursorPage(items, self, has_next=True, has_previous=has_previous)
+
+    def get_offset_page(self, number):
+        """Возвращает страницу по номеру без подсчёта общего количества записей."""
+        items = list(self.offset_queryset(number))
+        has_next = len(items) > self.per_page
+        return CursorPage(items[:self.per_page], self, has_next=has_next, has_previous=number > 1, number=number)
+
+
+def estimate_count(queryset):
+    """Приблизительное число строк таблицы модели без COUNT(*); None, если оценки нет.
+
+    Оценка может быть больше настоящего числа строк: статистика СУБД
+    отстаёт от удалений, а в SQLite это верхняя граница.
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s',
+                [table]
+            )
+        elif connection.vendor == 'sqlite':
+            # Ключи выдаются по возрастанию, поэтому MAX(rowid) - число когда-либо вставленных
+            # строк: удалённые строки, например отменённые подписки, из него не вычитаются.
+            cursor.execute(f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}')
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Паджинатор для админки без COUNT(*) по большим таблицам.
+
+    Для списка без условий количество берётся из оценки СУБД, если
+    в таблице больше ADMIN_ESTIMATE_THRESHOLD записей, а записи списка
+    с фильтрами или поиском считаются не дальше ADMIN_COUNT_LIMIT.
+    Оценка бывает завышена, поэтому большая оценка проверяется подсчётом
+    не дальше порога: для небольшой таблицы показывается точное количество.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        if not queryset.query.has_filters():
+            threshold = settings.ADMIN_ESTIMATE_THRESHOLD
+            estimate = estimate_count(queryset)
+            if estimate is None or estimate <= threshold:
+                return queryset.count()
+            count = queryset[:threshold + 1].count()
+            return count if count <= threshold else estimate
+        return queryset[:settings.ADMIN_COUNT_LIMIT].count()
@@ -0,0 +1,134 @@
+"""Полнотекстовый поиск по рецептам.
+
+На SQLite используется виртуальная таблица FTS5, на остальных СУБД -
+собственный инвертированный индекс в таблице RecipeSearchTerm.
+В индекс попадает текст, уже приведённый к основам слов, поэтому
+поиск не зависит от падежа, числа и регистра.
+"""
+from django.db import connections, transaction
+from django.db.models import Count, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe, RecipeSearchTerm
+from .stemmer import stem, stem_text, tokenize
+
+FTS_TABLE = 'recipes_recipe_fts'
+
+# Вес совпадения в каждом из полей при ранжировании результатов:
+FIELD_WEIGHTS = {
+    'title': 10.0,
+    'ingredients': 5.0,
+    'description': 1.0,
+}
+
+
+def uses_fts(using='default'):
+    """Проверяет, поддерживает ли база данных индекс FTS5."""
+    return connections[using].vendor == 'sqlite'
+
+
+def _terms(query):
+    """Возвращает уникальные основы слов поискового запроса."""
+    return list(dict.fromkeys(stem(word) for word in tokenize(query)))
+
+
+def index_recipes(recipes, using='default'):
+    """Добавляет рецепты в поисковый индекс или обновляет их записи."""
+    recipes = list(recipes)
+    if not recipes:
+        return
+    pks = [recipe.pk for recipe in recipes]
+    with transaction.atomic(using=using):
+        remove_recipes(pks, using=using)
+        if uses_fts(using):
+            rows = [
+                (recipe.pk, *(stem_text(getattr(recipe, field)) for field in FIELD_WEIGHTS))
+                for recipe in recipes
+            ]
+            with connections[using].cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, {", ".join(FIELD_WEIGHTS)}) VALUES (%s, %s, %s, %s)',
+                    rows
+                )
+            return
+        terms = []
+        for recipe in recipes:
+            weights = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                for word in tokenize(getattr(recipe, field)):
+                    term = stem(word)[:RecipeSearchTerm.TERM_LENGTH]
+                    weights[term] = weights.get(term, 0) + weight
+            terms.extend(
+                RecipeSearchTerm(recipe_id=recipe.pk, term=term, weight=weight)
+                for term, weight in weights.items()
+            )
+        RecipeSearchTerm.objects.using(using).bulk_create(terms, batch_size=1000)
+
+
+def remove_recipes(pks, using='default'):
+    """Удаляет рецепты из поискового индекса."""
+    pks = list(pks)
+    if not pks:
+        return
+    if uses_fts(using):
+        with connections[using].cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in pks])
+        return
+    RecipeSearchTerm.objects.using(using).filter(recipe_id__in=pks).delete()
+
+
+def rebuild_index(batch_size=1000, using='default'):
+    """Полностью перестраивает поисковый индекс, возвращает число рецептов."""
+    with transaction.atomic(using=using):
+        if uses_fts(using):
+            with connections[using].cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        else:
+            RecipeSearchTerm.objects.using(using).all().delete()
+        total = 0
+        batch = []
+        recipes = Recipe.objects.using(using).only(*FIELD_WEIGHTS).order_by('pk')
+        for recipe in recipes.iterator(chunk_size=batch_size):
+            batch.append(recipe)
+            if len(batch) >= batch_size:
+                index_recipes(batch, using=using)
+                total += len(batch)
+                batch = []
+        index_recipes(batch, using=using)
+        total += len(batch)
+    return total
+
+
+def search_recipes(queryset, query, fields=None):
+    """Фильтрует рецепты по поисковому запросу.
+
+    Возвращает queryset с аннотацией rank: чем меньше значение,
+    тем релевантнее рецепт. fields ограничивает поиск полями из
+    FIELD_WEIGHTS; собственный индекс поля не различает.
+    """
+    terms = _terms(query)
+    if not terms:
+        return queryset.none().annotate(rank=Value(0.0))
+    if uses_fts(queryset.db):
+        match = ' AND '.join(f'"{term}"*' for term in terms)
+        if fields:
+            match = f'{{{" ".join(fields)}}} : ({match})'
+        weights = ', '.join(str(weight) for weight in FIELD_WEIGHTS.values())
+        table = Recipe._meta.db_table
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+        ).annotate(rank=RawSQL(f'bm25({FTS_TABLE}, {weights})', (), output_field=FloatField()))
+    matches = RecipeSearchTerm.objects.filter(term__in=terms).values('recipe').annotate(
+        matched=Count('term')
+    ).filter(matched=len(terms))
+    scores = RecipeSearchTerm.objects.filter(recipe=OuterRef('pk'), term__in=terms).values('recipe').annotate(
+        score=Sum('weight')
+    ).values('score')
+    return queryset.filter(pk__in=matches.values('recipe')).annotate(rank=-Subquery(scores))
+
+
+def count_results(queryset, limit):
+    """Количество найденных рецептов, но не больше limit + 1."""
+    return queryset.order_by()[:limit + 1].count()
@@ -0,0 +1,297 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cache, counters, feed, images, ingredients, search, similar, stats
+from .models import Comment, Follow, Group, Recipe, RecipeCounter, SimilarRecipe, User
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, using, **kwargs):
+    """Обновляет запись рецепта в поисковом индексе."""
+    search.index_recipes([instance], using=using)
+
+
+@receiver(post_save, sender=Recipe)
+def sync_recipe_ingredients(sender, instance, **kwargs):
+    """Обновляет связи рецепта с ингредиентами."""
+    ingredients.sync_ingredients([instance])
+
+
+@receiver(post_save, sender=Recipe)
+def create_image_renditions(sender, instance, **kwargs):
+    """Ставит в очередь создание уменьшенных копий нового изображения."""
+    if not instance.image or instance.renditions_image == instance.image.name:
+        return
+    name, pk, author_id, group_id = instance.image.name, instance.pk, instance.author_id, instance.group_id
+    previous = instance.renditions_image
+    transaction.on_commit(lambda: images.schedule_renditions(
+        pk,
+        name,
+        on_done=lambda: images.renditions_changed(pk, author_id, group_id, previous)
+    ))
+
+
+@receiver(post_save, sender=Recipe)
+def push_recipe_to_feeds(sender, instance, created, **kwargs):
+    """Раскладывает новый рецепт по лентам подписчиков автора."""
+    if created:
+        feed.push_recipe(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_similar_recipes(sender, instance, **kwargs):
+    """Ставит пересчёт похожих рецептов нового или изменённого рецепта в фон после коммита."""
+    if getattr(instance, '_previous_features', None) == (instance.title, instance.ingredients):
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: similar.schedule_refresh([pk]))
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_similar_of(sender, instance, **kwargs):
+    """Запоминает рецепты, у которых удаляемый рецепт показан похожим."""
+    instance._similar_of = list(
+        SimilarRecipe.objects.filter(similar_id=instance.pk).values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def touch_similar_of(sender, instance, **kwargs):
+    """Отмечает изменение страниц, на которых удалённый рецепт был похожим."""
+    cache.touch(*(cache.scope(cache.RECIPE, pk) for pk in getattr(instance, '_similar_of', ())))
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, using, **kwargs):
+    """Удаляет рецепт из поискового индекса."""
+    search.remove_recipes([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Comment)
+def increment_comments_count(sender, instance, created, using, **kwargs):
+    """Увеличивает счётчик комментариев рецепта."""
+    if created:
+        Recipe.objects.using(using).filter(pk=instance.recipe_id).update(
+            comments_count=F('comments_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comments_count(sender, instance, using, origin=None, **kwargs):
+    """Уменьшает счётчик комментариев рецепта, если сам рецепт не удаляется."""
+    if _deleted_with_recipe(origin):
+        return
+    Recipe.objects.using(using).filter(pk=instance.recipe_id, comments_count__gt=0).update(
+        comments_count=F('comments_count') - 1
+    )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    """Добавляет рецепты автора в ленту нового подписчика."""
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_feed(sender, instance, **kwargs):
+    """Убирает рецепты автора из ленты отписавшегося пользователя."""
+    feed.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def bump_recipe_version(sender, instance, **kwargs):
+    """Сбрасывает закэшированную карточку рецепта."""
+    cache.bump_version(cache.RECIPE, instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group_version(sender, instance, **kwargs):
+    """Сбрасывает закэшированные карточки рецептов группы и список групп."""
+    cache.bump_version(cache.GROUP, instance.pk)
+    cache.invalidate_groups()
+    cache.touch(cache.SITE)
+
+
+@receiver(post_save, sender=User)
+def bump_author_version(sender, instance, created=False, update_fields=None, **kwargs):
+    """Сбрасывает закэшированные карточки рецептов автора.
+
+    Обновление времени последнего входа на карточках не отражается,
+    а новый пользователь ещё нигде не показан.
+    """
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    cache.bump_version(cache.AUTHOR, instance.pk)
+    if not created:
+        cache.touch(cache.SITE)
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, raw=False, **kwargs):
+    """Создаёт нулевые счётчики нового пользователя."""
+    if created and not raw:
+        stats.create([instance.pk])
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_group(sender, instance, update_fields=None, **kwargs):
+    """Запоминает прежние группу и признаки сходства рецепта.
+
+    При переносе меняются обе группы, а похожие рецепты пересчитываются,
+    только если изменились название или ингредиенты. Если update_fields
+    их не содержит, они не меняются, и прежние значения не читаются из базы.
+    """
+    instance._previous_group_id = None
+    instance._previous_features = None
+    if update_fields is not None and not set(update_fields) & {'group', 'group_id', 'title', 'ingredients'}:
+        instance._previous_group_id = instance.group_id
+        instance._previous_features = (instance.title, instance.ingredients)
+    elif instance.pk:
+        row = Recipe.objects.filter(pk=instance.pk).values_list('group_id', 'title', 'ingredients').first()
+        if row:
+            instance._previous_group_id = row[0]
+            instance._previous_features = row[1:]
+
+
+def _recipe_scopes(author_id, *group_ids):
+    scopes = [cache.ALL_RECIPES, cache.scope(cache.AUTHOR, author_id)]
+    scopes += [cache.scope(cache.GROUP, group_id) for group_id in set(group_ids) if group_id]
+    return scopes
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def touch_recipe_pages(sender, instance, **kwargs):
+    """Отмечает изменение списков, в которые входит рецепт."""
+    cache.touch(*_recipe_scopes(
+        instance.author_id,
+        instance.group_id,
+        getattr(instance, '_previous_group_id', None),
+    ))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def touch_comment_pages(sender, instance, created=False, origin=None, **kwargs):
+    """Отмечает изменение страницы рецепта и счётчиков комментариев в списках.
+
+    Новый комментарий виден по дате создания, а правку и удаление
+    отмечает область комментариев рецепта. При удалении рецепта списки
+    отмечает touch_recipe_pages.
+    """
+    if _deleted_with_recipe(origin):
+        return
+    row = Recipe.objects.filter(pk=instance.recipe_id).values_list('author_id', 'group_id').first()
+    if row is None:
+        return
+    scopes = _recipe_scopes(*row)
+    if not created:
+        scopes.append(cache.scope(cache.RECIPE, instance.recipe_id))
+    cache.touch(*scopes)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def touch_follow_pages(sender, instance, **kwargs):
+    """Отмечает изменение числа подписчиков автора и кнопки подписки."""
+    cache.touch(
+        cache.scope(cache.AUTHOR, instance.author_id),
+        cache.scope(cache.FOLLOWER, instance.user_id),
+    )
+
+
+def _deleted_with_recipe(origin):
+    """Удаление комментария вызвано удалением рецепта."""
+    if isinstance(origin, QuerySet):
+        return origin.model is Recipe
+    return isinstance(origin, Recipe)
+
+
+@receiver(post_save, sender=Recipe)
+def count_recipe(sender, instance, created, **kwargs):
+    """Увеличивает счётчик рецептов автора."""
+    if created:
+        stats.change(instance.author_id, recipes_count=1)
+
+
+@receiver(post_delete, sender=Recipe)
+def uncount_recipe(sender, instance, **kwargs):
+    """Уменьшает счётчики рецептов и комментариев автора удалённого рецепта."""
+    stats.change(instance.author_id, recipes_count=-1, comments_received=-instance.comments_count)
+
+
+@receiver(post_save, sender=Recipe)
+def count_recipe_totals(sender, instance, created, **kwargs):
+    """Обновляет количество рецептов на сайте и в группах, в том числе при переносе."""
+    if created:
+        counters.change(dict.fromkeys(counters.recipe_scopes(instance.group_id), 1))
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id == instance.group_id:
+        return
+    deltas = {}
+    if previous_group_id:
+        deltas[counters.group_scope(previous_group_id)] = -1
+    if instance.group_id:
+        deltas[counters.group_scope(instance.group_id)] = 1
+    counters.change(deltas)
+
+
+@receiver(post_delete, sender=Recipe)
+def uncount_recipe_totals(sender, instance, **kwargs):
+    """Уменьшает количество рецептов на сайте и в группе."""
+    counters.change(dict.fromkeys(counters.recipe_scopes(instance.group_id), -1))
+
+
+@receiver(post_save, sender=Group)
+def create_group_counter(sender, instance, created, raw=False, **kwargs):
+    """Создаёт нулевой счётчик рецептов новой группы."""
+    if created and not raw:
+        counters.create_group_counter(instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def delete_group_counter(sender, instance, **kwargs):
+    """Удаляет счётчик группы: её рецепты остаются без группы."""
+    RecipeCounter.objects.filter(scope=counters.group_scope(instance.pk)).delete()
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    """Увеличивает счётчик комментариев к рецептам автора."""
+    if created:
+        author_id = Recipe.objects.filter(pk=instance.recipe_id).values_list('author_id', flat=True).first()
+        stats.change(author_id, comments_received=1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, origin=None, **kwargs):
+    """Уменьшает счётчик комментариев автора рецепта.
+
+    При удалении рецепта его комментарии вычитаются сразу по comments_count.
+    """
+    if _deleted_with_recipe(origin):
+        return
+    author_id = Recipe.objects.filter(pk=instance.recipe_id).values_list('author_id', flat=True).first()
+    stats.change(author_id, comments_received=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    """Увеличивает счётчики подписчиков автора и подписок пользователя."""
+    if created:
+        stats.change(instance.author_id, followers_count=1)
+        stats.change(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    """Уменьшает счётчики подписчиков автора и подписок пользователя."""
+    stats.change(instance.author_id, followers_count=-1)
+    stats.change(instance.user_id, following_count=-1)
@@ -0,0 +1,333 @@
+"""Похожие рецепты: заранее вычисленные ближайшие соседи.
+
+Рецепт описывается набором признаков - ингредиентами из структурированного
+индекса и основами слов названия. Признаки взвешиваются по TF-IDF, сходство
+рецептов - косинус их векторов. Сравнивать каждый рецепт с каждым
+слишком дорого, поэтому кандидаты в соседи ищутся через MinHash и LSH:
+рецепты с похожими наборами признаков с большой вероятностью совпадают
+хотя бы в одной полосе сигнатуры и попадают в одну корзину.
+
+rebuild пересчитывает соседей всех рецептов, refresh - только новых
+и изменённых, по сохранённым корзинам и весам IDF последнего пересчёта.
+После сохранения рецепта refresh выполняется в фоновом потоке
+(schedule_refresh), чтобы не задерживать ответ.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from operator import or_
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+
+from . import cache
+from .models import Recipe, RecipeBucket, RecipeIngredient, SimilarityTerm, SimilarRecipe
+from .stemmer import stem, tokenize
+
+# Число хэш-функций MinHash и разбиение сигнатуры на полосы:
+PERMUTATIONS = 64
+BANDS = 32
+ROWS = PERMUTATIONS // BANDS
+# Простое число для хэш-функций вида (a * x + b) mod PRIME:
+PRIME = (1 << 31) - 1
+# Из слишком больших корзин берутся только ближайшие по id рецепты:
+MAX_BUCKET = 200
+# Рецепты с меньшим сходством не считаются похожими:
+MIN_SCORE = 0.1
+# Признак, под которым хранится вес IDF неизвестных признаков:
+UNKNOWN_TERM = ''
+
+BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _hash(text):
+    return int.from_bytes(hashlib.md5(text.encode()).digest()[:4], 'little') % PRIME
+
+
+# Параметры хэш-функций выводятся из фиксированных строк, чтобы сигнатуры
+# совпадали между пересчётами и версиями NumPy:
+A = np.array([_hash(f'a{i}') or 1 for i in range(PERMUTATIONS)], dtype=np.uint64)
+B = np.array([_hash(f'b{i}') for i in range(PERMUTATIONS)], dtype=np.uint64)
+BAND_MULTIPLIERS = np.array([_hash(f'm{i}') | 1 for i in range(ROWS)], dtype=np.uint64)
+
+
+def documents(pks=None, batch_size=BATCH_SIZE):
+    """Признаки рецептов (всех, если pks не задан): {pk: множество признаков}."""
+    recipes = Recipe.objects.order_by('pk')
+    links = RecipeIngredient.objects.order_by()
+    if pks is not None:
+        recipes = recipes.filter(pk__in=pks)
+        links = links.filter(recipe_id__in=pks)
+    found = {
+        pk: {f't:{stem(word)}'[:SimilarityTerm.TERM_LENGTH] for word in tokenize(title) if len(word) > 2}
+        for pk, title in recipes.values_list('pk', 'title').iterator(chunk_size=batch_size)
+    }
+    for recipe_id, ingredient_id in links.values_list('recipe_id', 'ingredient_id').iterator(chunk_size=batch_size):
+        if recipe_id in found:
+            found[recipe_id].add(f'i:{ingredient_id}')
+    return {pk: terms for pk, terms in found.items() if terms}
+
+
+def signatures(term_hashes):
+    """Сигнатуры MinHash для списка массивов хэшей признаков (непустых)."""
+    lengths = np.array([len(hashes) for hashes in term_hashes])
+    flat = np.concatenate(term_hashes).astype(np.uint64)
+    hashed = (flat[:, None] * A + B) % PRIME
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return np.minimum.reduceat(hashed, starts, axis=0)
+
+
+def band_keys(signature_matrix):
+    """Ключи корзин LSH: по одному на каждую полосу сигнатуры."""
+    bands = signature_matrix.reshape(len(signature_matrix), BANDS, ROWS)
+    # Переполнение при умножении допустимо: нужен лишь хэш полосы.
+    return (bands * BAND_MULTIPLIERS).sum(axis=2).view(np.int64)
+
+
+def _term_hashes(terms):
+    return np.array([_hash(term) for term in terms], dtype=np.uint64)
+
+
+def _insert_buckets(recipe_ids, keys, batch_size=BATCH_SIZE):
+    """Записывает корзины рецептов; строк много, поэтому без создания моделей."""
+    rows = [
+        (recipe_id, band, key)
+        for recipe_id, row in zip(recipe_ids, keys.tolist())
+        for band, key in enumerate(row)
+    ]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}, {}, {}) VALUES (%s, %s, %s)'.format(
+        quote(RecipeBucket._meta.db_table), quote('recipe_id'), quote('band'), quote('key')
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def _touch(recipe_ids):
+    cache.touch(*(cache.scope(cache.RECIPE, pk) for pk in recipe_ids))
+
+
+def _candidates(order, starts, ends, position, index):
+    """Рецепты из корзин рецепта index во всех полосах, кроме него самого."""
+    found = []
+    for band in range(BANDS):
+        start, end = starts[band][index], ends[band][index]
+        if end - start > MAX_BUCKET:
+            middle = position[band][index]
+            start = max(start, middle - MAX_BUCKET // 2)
+            end = min(end, start + MAX_BUCKET)
+        found.append(order[band][start:end])
+    found = np.unique(np.concatenate(found))
+    return found[found != index]
+
+
+def rebuild(neighbours=None, batch_size=BATCH_SIZE):
+    """Пересчитывает похожие рецепты для всех рецептов, возвращает их число."""
+    neighbours = neighbours or settings.SIMILAR_RECIPES_COUNT
+    found = documents(batch_size=batch_size)
+    ids = list(found)
+    total = len(ids)
+    vocabulary = {}
+    columns = [
+        np.fromiter((vocabulary.setdefault(term, len(vocabulary)) for term in terms), np.int64, len(terms))
+        for terms in found.values()
+    ]
+    terms = list(vocabulary)
+    idf = np.zeros(0)
+    keys = np.zeros((0, BANDS), dtype=np.int64)
+    links = []
+    if total:
+        lengths = np.array([len(item) for item in columns])
+        indptr = np.concatenate(([0], np.cumsum(lengths)))
+        indices = np.concatenate(columns)
+        frequency = np.bincount(indices, minlength=len(terms))
+        idf = np.log((1 + total) / (1 + frequency)) + 1
+        data = idf[indices]
+        norms = np.sqrt(np.add.reduceat(data ** 2, indptr[:-1]))
+        data = data / np.repeat(norms, lengths)
+
+        vocabulary_hashes = _term_hashes(terms)
+        keys = np.concatenate([
+            band_keys(signatures([vocabulary_hashes[item] for item in columns[start:start + batch_size]]))
+            for start in range(0, total, batch_size)
+        ])
+
+        # Для каждой полосы рецепты сортируются по ключу, корзина - отрезок
+        # этого порядка от starts до ends:
+        order, starts, ends, position = [], [], [], []
+        for band in range(BANDS):
+            band_order = np.argsort(keys[:, band], kind='stable')
+            sorted_keys = keys[band_order, band]
+            order.append(band_order)
+            starts.append(np.searchsorted(sorted_keys, keys[:, band], side='left'))
+            ends.append(np.searchsorted(sorted_keys, keys[:, band], side='right'))
+            band_position = np.empty(total, dtype=np.int64)
+            band_position[band_order] = np.arange(total)
+            position.append(band_position)
+
+        dense = np.zeros(len(terms))
+        for index in range(total):
+            candidates = _candidates(order, starts, ends, position, index)
+            if not len(candidates):
+                continue
+            own = slice(indptr[index], indptr[index + 1])
+            dense[indices[own]] = data[own]
+            counts = lengths[candidates]
+            offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            gathered = np.repeat(indptr[candidates] - offsets, counts) + np.arange(counts.sum())
+            scores = np.add.reduceat(dense[indices[gathered]] * data[gathered], offsets)
+            dense[indices[own]] = 0
+            best = np.argsort(-scores, kind='stable')[:neighbours]
+            links.extend(
+                SimilarRecipe(recipe_id=ids[index], similar_id=ids[candidates[item]], score=float(scores[item]))
+                for item in best
+                if scores[item] >= MIN_SCORE
+            )
+
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        RecipeBucket.objects.all().delete()
+        SimilarityTerm.objects.all().delete()
+        SimilarRecipe.objects.bulk_create(links, batch_size=batch_size)
+        _insert_buckets(ids, keys, batch_size)
+        SimilarityTerm.objects.bulk_create(
+            [SimilarityTerm(term=term, idf=float(weight)) for term, weight in zip(terms, idf)]
+            + [SimilarityTerm(term=UNKNOWN_TERM, idf=float(np.log(1 + total) + 1))],
+            batch_size=batch_size,
+        )
+    cache.touch(cache.SITE)
+    return total
+
+
+def _vector(terms, idf):
+    default = idf.get(UNKNOWN_TERM, 1.0)
+    vector = {term: idf.get(term, default) for term in terms}
+    norm = np.sqrt(sum(weight ** 2 for weight in vector.values()))
+    return {term: weight / norm for term, weight in vector.items()}
+
+
+def _cosine(first, second):
+    if len(first) > len(second):
+        first, second = second, first
+    return sum(weight * second.get(term, 0.0) for term, weight in first.items())
+
+
+def refresh(recipe_ids, neighbours=None):
+    """Пересчитывает похожие рецепты для новых и изменённых рецептов.
+
+    Изменённые рецепты заново раскладываются по корзинам, их соседи
+    ищутся среди рецептов из тех же корзин. Если рецепт ближе к соседу,
+    чем худший из его похожих, он занимает его место.
+    """
+    neighbours = neighbours or settings.SIMILAR_RECIPES_COUNT
+    recipe_ids = list(recipe_ids)
+    changed = documents(recipe_ids)
+    touched = set(recipe_ids)
+    with transaction.atomic():
+        RecipeBucket.objects.filter(recipe_id__in=recipe_ids).delete()
+        SimilarRecipe.objects.filter(Q(recipe_id__in=recipe_ids) | Q(similar_id__in=recipe_ids)).delete()
+        if not changed:
+            _touch(touched)
+            return 0
+        pks = list(changed)
+        keys = band_keys(signatures([_term_hashes(changed[pk]) for pk in pks]))
+        _insert_buckets(pks, keys)
+
+        found = {}
+        for pk, row in zip(pks, keys):
+            lookup = reduce(or_, (Q(band=band, key=int(key)) for band, key in enumerate(row)))
+            found[pk] = list(
+                RecipeBucket.objects.filter(lookup).exclude(recipe_id=pk).values_list(
+                    'recipe_id', flat=True
+                ).distinct()[:MAX_BUCKET * BANDS]
+            )
+        candidate_ids = {item for items in found.values() for item in items} - set(changed)
+        candidates = documents(candidate_ids)
+        candidates.update(changed)
+        needed = set().union(*candidates.values(), {UNKNOWN_TERM})
+        idf = dict(SimilarityTerm.objects.filter(term__in=needed).values_list('term', 'idf'))
+        vectors = {pk: _vector(terms, idf) for pk, terms in candidates.items() if terms}
+
+        links = []
+        reverse = {}
+        for pk in pks:
+            scores = sorted(
+                (
+                    (_cosine(vectors[pk], vectors[other]), other)
+                    for other in found[pk] if other in vectors
+                ),
+                reverse=True,
+            )
+            for score, other in scores[:neighbours]:
+                if score >= MIN_SCORE:
+                    links.append(SimilarRecipe(recipe_id=pk, similar_id=other, score=score))
+            for score, other in scores:
+                if score >= MIN_SCORE and other not in changed:
+                    reverse.setdefault(other, []).append((score, pk))
+
+        existing = {}
+        for link_id, recipe_id, score in SimilarRecipe.objects.filter(recipe_id__in=reverse).values_list(
+            'pk', 'recipe_id', 'score'
+        ):
+            existing.setdefault(recipe_id, []).append((score, link_id))
+        stale = []
+        for other, scores in reverse.items():
+            # Похожие рецепта: (сходство, id сохранённой связи или новая связь).
+            current = sorted(existing.get(other, []), key=lambda item: item[0], reverse=True)
+            added = False
+            for score, pk in sorted(scores, reverse=True):
+                if len(current) >= neighbours and score <= current[neighbours - 1][0]:
+                    break
+                current.append((score, SimilarRecipe(recipe_id=other, similar_id=pk, score=score)))
+                current.sort(key=lambda item: item[0], reverse=True)
+                added = True
+                # Вытесняются и сохранённые связи, и добавленные раньше в этом же цикле:
+                while len(current) > neighbours:
+                    link = current.pop()[1]
+                    if not isinstance(link, SimilarRecipe):
+                        stale.append(link)
+            if added:
+                links.extend(link for _, link in current if isinstance(link, SimilarRecipe))
+                touched.add(other)
+        SimilarRecipe.objects.filter(pk__in=stale).delete()
+        SimilarRecipe.objects.bulk_create(links, batch_size=BATCH_SIZE)
+    _touch(touched)
+    return len(changed)
+
+
+def get_executor():
+    """Один поток: пересчёты не пишут в таблицы соседей одновременно."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='similar')
+    return _executor
+
+
+def schedule_refresh(recipe_ids):
+    """Ставит пересчёт похожих рецептов в фоновый поток."""
+    recipe_ids = list(recipe_ids)
+
+    def task():
+        try:
+            refresh(recipe_ids)
+        except Exception:
+            logger.exception('Ошибка при пересчёте похожих рецептов %s', recipe_ids)
+        finally:
+            close_old_connections()
+
+    return get_executor().submit(task)
+
+
+def similar_recipes(recipe_id, limit=None):
+    """Похожие рецепты одним запросом по индексу (recipe, -score)."""
+    return SimilarRecipe.objects.filter(recipe_id=recipe_id).select_related('similar').only(
+        'similar__id', 'similar__title', 'score'
+    ).order_by('-score')[:limit or settings.SIMILAR_RECIPES_COUNT]
@@ -0,0 +1,79 @@
+"""Счётчики авторов: рецепты, подписчики, подписки и комментарии к рецептам.
+
+Счётчики меняются сигналами в той же транзакции, что и сами записи, поэтому
+страница профайла читает их одной строкой по первичному ключу вместо
+COUNT(*) по рецептам и подпискам. Строка создаётся вместе с пользователем
+(для существующих - миграцией), поэтому чтение ничего не записывает.
+"""
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AuthorStats, Comment, Follow, Recipe, User
+
+COUNTERS = ('recipes_count', 'followers_count', 'following_count', 'comments_received')
+
+
+def _count(queryset, field):
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+        count=Count('pk')
+    ).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def actual_counts():
+    """Выражения для точных значений счётчиков; pk внешнего запроса - id автора."""
+    return {
+        'recipes_count': _count(Recipe.objects.all(), 'author'),
+        'followers_count': _count(Follow.objects.all(), 'author'),
+        'following_count': _count(Follow.objects.all(), 'user'),
+        'comments_received': _count(Comment.objects.all(), 'recipe__author'),
+    }
+
+
+def rebuild(user_ids=None):
+    """Пересчитывает счётчики пользователей (всех, если user_ids не задан).
+
+    Возвращает количество исправленных строк.
+    """
+    users = User.objects.all() if user_ids is None else User.objects.filter(pk__in=user_ids)
+    with transaction.atomic():
+        create(users.filter(stats__isnull=True).values_list('pk', flat=True))
+        stats = AuthorStats.objects.all() if user_ids is None else AuthorStats.objects.filter(author_id__in=user_ids)
+        actual = actual_counts()
+        return stats.annotate(**{f'actual_{name}': value for name, value in actual.items()}).exclude(
+            **{name: F(f'actual_{name}') for name in COUNTERS}
+        ).update(**actual)
+
+
+def create(user_ids):
+    """Создаёт нулевые счётчики новых пользователей."""
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(author_id=pk) for pk in user_ids],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+def change(user_id, **deltas):
+    """Изменяет счётчики пользователя на указанные величины.
+
+    Строки, которой нет (пользователь создан без сигналов), не создаёт:
+    её добавляет rebuild.
+    """
+    AuthorStats.objects.filter(author_id=user_id).update(**{
+        name: Greatest(F(name) + delta, 0) for name, delta in deltas.items()
+    })
+
+
+def get_stats(user_id):
+    """Счётчики пользователя.
+
+    Если строки нет (пользователь создан без сигналов), счётчики вычисляются
+    по базе без сохранения: запись на чтении не делается.
+    """
+    stats = AuthorStats.objects.filter(author_id=user_id).first()
+    if stats is None:
+        counts = User.objects.filter(pk=user_id).annotate(**actual_counts()).values(*COUNTERS).first()
+        stats = AuthorStats(author_id=user_id, **(counts or {}))
+    return stats
@@ -0,0 +1,132 @@
+"""Нормализация текста и стемминг для русского языка (алгоритм Snowball)."""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+WORD_RE = re.compile(r'[0-9a-zа-я]+')
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом',
+    'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ('ся', 'сь')
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+    (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен',
+        'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ),
+)
+NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й',
+    'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+
+def _longest(word, suffixes):
+    """Возвращает самое длинное окончание из списка, на которое заканчивается слово."""
+    found = ''
+    for suffix in suffixes:
+        if len(suffix) > len(found) and word.endswith(suffix):
+            found = suffix
+    return found
+
+
+def _strip_group(word, groups):
+    """Отрезает окончание из пары групп Snowball.
+
+    Окончания первой группы удаляются, только если перед ними стоит «а» или «я».
+    """
+    first, second = groups
+    candidates = [s for s in first if word.endswith(s) and word[:-len(s)][-1:] in ('а', 'я')]
+    candidates += [s for s in second if word.endswith(s)]
+    if not candidates:
+        return word, False
+    return word[:-len(max(candidates, key=len))], True
+
+
+def _strip(word, suffixes):
+    suffix = _longest(word, suffixes)
+    if not suffix:
+        return word, False
+    return word[:-len(suffix)], True
+
+
+def _regions(word):
+    """Возвращает начало областей RV и R2 слова."""
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    r1 = len(word)
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    r2 = len(word)
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def stem(word):
+    """Возвращает основу русского слова."""
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+    prefix, rest = word[:rv], word[rv:]
+    r2 = max(r2 - rv, 0)
+
+    rest, found = _strip_group(rest, PERFECTIVE_GERUND)
+    if not found:
+        rest, _ = _strip(rest, REFLEXIVE)
+        adjective = _longest(rest, ADJECTIVE)
+        if adjective:
+            rest = rest[:-len(adjective)]
+            rest, _ = _strip_group(rest, PARTICIPLE)
+        else:
+            rest, found = _strip_group(rest, VERB)
+            if not found:
+                rest, _ = _strip(rest, NOUN)
+
+    if rest.endswith('и'):
+        rest = rest[:-1]
+
+    derivational = _longest(rest, DERIVATIONAL)
+    if derivational and len(rest) - len(derivational) >= r2:
+        rest = rest[:-len(derivational)]
+
+    if rest.endswith('нн'):
+        rest = rest[:-1]
+    else:
+        rest, found = _strip(rest, SUPERLATIVE)
+        if found and rest.endswith('нн'):
+            rest = rest[:-1]
+        elif not found and rest.endswith('ь'):
+            rest = rest[:-1]
+    return prefix + rest
+
+
+def tokenize(text):
+    """Разбивает текст на слова в нижнем регистре."""
+    return WORD_RE.findall((text or '').lower().replace('ё', 'е'))
+
+
+def stem_text(text):
+    """Возвращает текст, в котором каждое слово заменено своей основой."""
+    return ' '.join(stem(word) for word in tokenize(text))
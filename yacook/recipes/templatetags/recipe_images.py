@@ -0,0 +1,34 @@
+from django import template
+from django.templatetags.static import static
+
+from ..images import CARD_WIDTHS, WIDTHS, rendition_name, srcset
+
+register = template.Library()
+
+# Ширина изображения на странице для атрибута sizes:
+SIZES = {
+    'card': '350px',
+    'detail': '(min-width: 768px) 350px, 100vw',
+}
+
+
+@register.inclusion_tag('recipes/includes/recipe_image.html')
+def recipe_image(recipe, preset='card'):
+    """Выводит изображение рецепта с набором уменьшенных копий."""
+    context = {'sizes': SIZES[preset]}
+    if not recipe.image:
+        context['src'] = static('img/no_image.png')
+        return context
+    name = recipe.image.name
+    # Копии относятся к текущему изображению, только если созданы для него:
+    if recipe.renditions_image != name:
+        context['src'] = recipe.image.url
+        return context
+    widths = CARD_WIDTHS if preset == 'card' else WIDTHS
+    storage = recipe.image.storage
+    context.update({
+        'src': storage.url(rendition_name(name, widths[0], 'jpg')),
+        'webp_srcset': srcset(name, widths, 'webp', storage),
+        'jpeg_srcset': srcset(name, widths, 'jpg', storage),
+    })
+    return context
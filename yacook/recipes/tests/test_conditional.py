@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.test import TestCase
+from django.urls import reverse
+
+from recipes.models import Recipe, User
+
+
+class ConditionalGetTests(TestCase):
+    """Ответы 304 на страницы рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        cls.recipe = Recipe.objects.create(
+            title='Щи', description='Щи', ingredients='Капуста: 300 г', technology='Сварить', author=author
+        )
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        # Кука CSRF, выданная первым ответом, не должна менять ETag:
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'x' * 32
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertIn('Cookie', second['Vary'])
+        return second
+
+    def test_anonymous_revalidation(self):
+        for url in (reverse('recipes:index'), reverse('recipes:recipe_detail', args=(self.recipe.pk,))):
+            with self.subTest(url=url):
+                response = self.revalidate(url)
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertNotIn('private', response['Cache-Control'])
+
+    def test_user_revalidation_is_private(self):
+        self.client.force_login(self.reader)
+        response = self.revalidate(reverse('recipes:recipe_detail', args=(self.recipe.pk,)))
+        self.assertIn('private', response['Cache-Control'])
@@ -0,0 +1,51 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes import export
+from recipes.models import Group, Recipe, User
+
+
+class ExportImportTests(TestCase):
+    """Выгрузка export_db читается командой import_db."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        group = Group.objects.create(title='Выпечка', slug='vypechka', description='Выпечка')
+        for number in range(3):
+            Recipe.objects.create(
+                title=f'Пирог {number}',
+                description='Пышный пирог\nК чаю',
+                ingredients='Мука: 300 г\nЯйцо: 2 шт',
+                technology='Замесить\nИспечь',
+                author=cls.author,
+                group=group if number % 2 else None,
+            )
+
+    def import_export(self, output_format, queryset=None, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f'recipes.{output_format}')
+            with open(path, 'wb') as file:
+                for block in export.export(queryset or export.export_queryset(), output_format):
+                    file.write(block)
+            call_command('import_db', path=path, author=self.author.username, stdout=StringIO(), **options)
+
+    def test_round_trip_keeps_recipes(self):
+        """Повторный импорт выгрузки не создаёт копий рецептов сайта."""
+        recipes = list(Recipe.objects.order_by('pk').values_list('pk', 'title', 'updated'))
+        for output_format in (export.CSV, export.JSONL, export.CSV):
+            with self.subTest(output_format=output_format):
+                self.import_export(output_format)
+                self.assertEqual(list(Recipe.objects.order_by('pk').values_list('pk', 'title', 'updated')), recipes)
+
+    def test_prune_deletes_only_missing_imported_recipes(self):
+        """--prune удаляет импортированные рецепты, которых нет в выгрузке, и не трогает рецепты сайта."""
+        Recipe.objects.create(title='Старый', ingredients='Соль: 1 г', author=self.author, source_key='old')
+        recipes = list(Recipe.objects.exclude(source_key='old').order_by('pk').values_list('pk', 'title'))
+        self.import_export(export.CSV, export.export_queryset().exclude(source_key='old'), prune=True)
+        self.assertFalse(Recipe.objects.filter(source_key='old').exists())
+        self.assertEqual(list(Recipe.objects.order_by('pk').values_list('pk', 'title')), recipes)
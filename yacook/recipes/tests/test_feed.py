@@ -0,0 +1,46 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from recipes import feed
+from recipes.models import FeedEntry, Follow, Recipe, User
+
+
+class FeedTests(TestCase):
+    """Лента подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [User.objects.create_user(username=f'author{number}') for number in range(3)]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+            for number in range(4):
+                Recipe.objects.create(
+                    title=f'Суп {number}', description='Суп', ingredients='Вода: 1 л', technology='Сварить',
+                    author=author,
+                )
+
+    def setUp(self):
+        cache.delete(feed.LARGE_AUTHORS_CACHE_KEY)
+
+    def entries(self):
+        return list(FeedEntry.objects.filter(user=self.reader).order_by('-pub_date', '-recipe_id').values_list(
+            'recipe_id', 'author_id'
+        ))
+
+    def test_rebuild_matches_pushed_feed(self):
+        pushed = self.entries()
+        self.assertEqual(len(pushed), 12)
+        feed.rebuild_many([self.reader.pk])
+        self.assertEqual(self.entries(), pushed)
+
+    @override_settings(FEED_MAX_ENTRIES=5)
+    def test_rebuild_keeps_latest_entries(self):
+        feed.rebuild_many([self.reader.pk])
+        latest = list(Recipe.objects.order_by('-pub_date', '-id').values_list('pk', 'author_id')[:5])
+        self.assertEqual(self.entries(), latest)
+
+    def test_total_counts_large_author_once(self):
+        """Записи автора, который стал крупным после раскладки, не считаются дважды."""
+        large = {self.authors[0].pk}
+        self.assertEqual(feed.total(self.reader.pk, large), 12)
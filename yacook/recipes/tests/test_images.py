@@ -0,0 +1,54 @@
+import tempfile
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from recipes import images
+from recipes.models import Recipe, User
+
+
+class RenditionsTests(TestCase):
+    """Копии изображений рецептов."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create_user(username='author')
+
+    def save_image(self, name):
+        buffer = BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(buffer, 'JPEG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def renditions_exist(self, name):
+        return [
+            default_storage.exists(images.rendition_name(name, width, extension))
+            for width in images.WIDTHS for extension in images.FORMATS
+        ]
+
+    def test_replaced_image_renditions_are_deleted(self):
+        old, new = self.save_image('recipes/old.jpg'), self.save_image('recipes/new.jpg')
+        recipe = Recipe.objects.create(title='Пирог', ingredients='Мука: 1 кг', author=self.author)
+        Recipe.objects.filter(pk=recipe.pk).update(image=old)
+        images.generate_renditions(old)
+        images.mark_renditions(recipe.pk, old)
+        Recipe.objects.filter(pk=recipe.pk).update(image=new)
+        images.generate_renditions(new)
+        images.mark_renditions(recipe.pk, new)
+        images.renditions_changed(recipe.pk, self.author.pk, None, previous=old)
+        self.assertFalse(any(self.renditions_exist(old)))
+        self.assertTrue(all(self.renditions_exist(new)))
+
+    def test_renditions_of_used_image_are_kept(self):
+        name = self.save_image('recipes/shared.jpg')
+        recipe = Recipe.objects.create(title='Пирог', ingredients='Мука: 1 кг', author=self.author)
+        Recipe.objects.filter(pk=recipe.pk).update(image=name)
+        images.generate_renditions(name)
+        self.assertEqual(images.delete_renditions(name), 0)
+        self.assertTrue(all(self.renditions_exist(name)))
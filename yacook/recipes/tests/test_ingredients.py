@@ -0,0 +1,39 @@
+from django.test import TestCase
+
+from recipes.ingredients import ingredient_key, match_ingredients, recipes_by_ingredients
+from recipes.models import Ingredient, Recipe, User
+
+
+class RecipesByIngredientsTests(TestCase):
+    """Подбор рецептов по имеющимся продуктам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        cls.recipe = Recipe.objects.create(
+            title='Омлет',
+            description='Пышный омлет',
+            ingredients='Яйцо куриное: 3 шт\nЯйцо перепелиное: 4 шт\nМолоко: 100 мл\nСоль: щепотка\nСолод: 10 г',
+            technology='Взбить и пожарить',
+            author=author,
+        )
+
+    def test_match_by_key_prefix(self):
+        groups = match_ingredients('яйца, молоко, сахар')
+        keys = [set(Ingredient.objects.filter(pk__in=ids).values_list('key', flat=True)) for ids in groups]
+        self.assertEqual(keys, [
+            {ingredient_key('Яйцо куриное'), ingredient_key('Яйцо перепелиное')},
+            {ingredient_key('Молоко')},
+        ])
+
+    def test_short_stem_matches_whole_words_only(self):
+        """Основа «сол» из «соль» не совпадает с началом «солод»."""
+        groups = match_ingredients('соль')
+        keys = [set(Ingredient.objects.filter(pk__in=ids).values_list('key', flat=True)) for ids in groups]
+        self.assertEqual(keys, [{ingredient_key('Соль')}])
+
+    def test_missing_counts_matched_ingredients(self):
+        """Продукт, совпавший с двумя ингредиентами, закрывает оба."""
+        recipe = recipes_by_ingredients(Recipe.objects.all(), 'яйца').get()
+        self.assertEqual(recipe.matched, 1)
+        self.assertEqual(recipe.missing, 3)
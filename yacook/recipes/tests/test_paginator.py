@@ -0,0 +1,110 @@
+import datetime
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from recipes.models import Follow, Recipe, User
+from recipes.paginator import CursorPaginator, EstimatedCountPaginator, InvalidCursor
+from recipes.search import search_recipes
+
+SEARCH_ORDERING = ('rank', '-pub_date', '-id')
+
+
+def walk(paginator):
+    """Все страницы списка по курсору next: список списков pk."""
+    pages = []
+    page = paginator.get_page()
+    while True:
+        pages.append([recipe.pk for recipe in page])
+        if not page.has_next():
+            return pages
+        page = paginator.get_page(page.next_cursor)
+
+
+class CursorPaginatorTests(TestCase):
+    """Постраничный вывод по курсору."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        same_time = timezone.now() - datetime.timedelta(days=1)
+        for number in range(11):
+            Recipe.objects.create(
+                title=f'Блины {number}' if number % 2 else f'Блины блины {number}',
+                description='Тонкие блины на молоке',
+                ingredients='Мука: 200 г\nМолоко: 500 мл',
+                technology='Пожарить',
+                author=cls.author,
+            )
+        # Половина рецептов опубликована в одно и то же время:
+        Recipe.objects.filter(pk__in=Recipe.objects.order_by('pk').values('pk')[:6]).update(pub_date=same_time)
+
+    def expected(self, queryset, ordering):
+        return list(queryset.order_by(*ordering).values_list('pk', flat=True))
+
+    def test_ties_on_pub_date(self):
+        paginator = CursorPaginator(Recipe.objects.all(), per_page=3)
+        pages = walk(paginator)
+        self.assertEqual(sum(pages, []), self.expected(Recipe.objects.all(), ('-pub_date', '-id')))
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+
+    def test_previous_direction(self):
+        paginator = CursorPaginator(Recipe.objects.all(), per_page=3)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        third = paginator.get_page(second.next_cursor)
+        back = paginator.get_page(third.previous_cursor)
+        self.assertEqual(list(back), list(second))
+        self.assertTrue(back.has_previous())
+        self.assertTrue(back.has_next())
+        start = paginator.get_page(back.previous_cursor)
+        self.assertEqual(list(start), list(first))
+        self.assertFalse(start.has_previous())
+        self.assertIsNone(start.previous_cursor)
+
+    def test_search_rank_cursor(self):
+        recipes = search_recipes(Recipe.objects.all(), 'блины')
+        paginator = CursorPaginator(recipes, per_page=4, ordering=SEARCH_ORDERING)
+        pages = walk(paginator)
+        self.assertEqual(sum(pages, []), self.expected(recipes, SEARCH_ORDERING))
+        last = paginator.get_page(paginator.get_page(paginator.get_page().next_cursor).next_cursor)
+        back = paginator.get_page(last.previous_cursor)
+        self.assertEqual([recipe.pk for recipe in back], pages[1])
+
+    def test_invalid_cursor(self):
+        paginator = CursorPaginator(Recipe.objects.all(), per_page=3)
+        valid = paginator.get_page().next_cursor
+        for cursor in ('garbage', valid[:-3], 'WyJuIiwgWzFdXQ', 'WyJ4IiwgWyIiLCAxXV0'):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    paginator.get_page(cursor)
+
+    def test_invalid_search_rank_cursor(self):
+        recipes = search_recipes(Recipe.objects.all(), 'блины')
+        paginator = CursorPaginator(recipes, per_page=4, ordering=SEARCH_ORDERING)
+        # ["n", ["abc", "2024-01-01T00:00:00", 1]]: релевантность должна быть числом.
+        with self.assertRaises(InvalidCursor):
+            paginator.get_page('WyJuIixbImFiYyIsIjIwMjQtMDEtMDFUMDA6MDA6MDAiLDFdXQ')
+
+    def test_invalid_cursor_responses(self):
+        self.assertEqual(self.client.get(reverse('recipes:index'), {'cursor': 'garbage'}).status_code, 404)
+        self.assertEqual(
+            self.client.get(reverse('recipes:search'), {'s': 'блины', 'cursor': 'garbage'}).status_code, 404
+        )
+        response = self.client.get(reverse('recipes:api_recipes'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json()['error'])
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    """Количество записей в админке без COUNT(*)."""
+
+    @override_settings(ADMIN_ESTIMATE_THRESHOLD=5)
+    def test_overestimate_of_small_table_is_counted(self):
+        """После удалений оценка завышена, и небольшая таблица считается точно."""
+        author = User.objects.create_user(username='author')
+        for number in range(10):
+            Follow.objects.create(user=User.objects.create_user(username=f'user{number}'), author=author)
+        Follow.objects.filter(pk__in=Follow.objects.order_by('pk').values('pk')[:8]).delete()
+        self.assertEqual(EstimatedCountPaginator(Follow.objects.all(), 50).count, 2)
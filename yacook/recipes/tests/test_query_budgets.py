@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import QueryBudgetExceeded
+from recipes.models import AuthorStats, Comment, Follow, Group, Recipe, User
+
+RECIPES_COUNT = 30
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    """Представления укладываются в бюджеты SQL-запросов из VIEW_QUERY_BUDGETS."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Супы', slug='soups', description='Первые блюда')
+        for number in range(RECIPES_COUNT):
+            Recipe.objects.create(
+                title=f'Борщ {number}',
+                description='Наваристый борщ',
+                ingredients='Свекла: 1 шт\nКартофель: 2 шт\nКапуста: 300 г',
+                technology='Сварить',
+                author=cls.author,
+                group=cls.group,
+            )
+        cls.recipe = Recipe.objects.latest('pk')
+        for number in range(5):
+            cls.comment = Comment.objects.create(recipe=cls.recipe, author=cls.reader, text=f'Вкусно {number}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def urls(self):
+        """Адреса всех представлений с бюджетом.
+
+        Страницы открывает подписчик автора, API - анонимный клиент.
+        """
+        return {
+            'recipes:index': reverse('recipes:index'),
+            'recipes:group_list': reverse('recipes:group_list', args=(self.group.slug,)),
+            'recipes:profile': reverse('recipes:profile', args=(self.author.username,)),
+            'recipes:recipe_detail': reverse('recipes:recipe_detail', args=(self.recipe.pk,)),
+            'recipes:recipe_comments': reverse('recipes:recipe_comments', args=(self.recipe.pk,)),
+            'recipes:search': reverse('recipes:search') + '?s=борщ',
+            'recipes:pantry': reverse('recipes:pantry') + '?products=свекла, картофель',
+            'recipes:follow_index': reverse('recipes:follow_index'),
+            'recipes:edit_comment': reverse('recipes:edit_comment', args=(self.comment.pk,)),
+            'recipes:api_recipes': reverse('recipes:api_recipes'),
+            'recipes:api_recipe': reverse('recipes:api_recipe', args=(self.recipe.pk,)),
+            'recipes:api_comments': reverse('recipes:api_comments', args=(self.recipe.pk,)),
+            'recipes:api_groups': reverse('recipes:api_groups'),
+        }
+
+    def test_every_budget_is_checked(self):
+        self.assertEqual(set(self.urls()), set(settings.VIEW_QUERY_BUDGETS))
+        self.assertEqual(set(self.urls()), set(settings.VIEW_CACHE_QUERY_BUDGETS))
+
+    def test_views_fit_budgets(self):
+        for view, url in self.urls().items():
+            if view.startswith('recipes:api_'):
+                self.client.logout()
+            else:
+                self.client.force_login(self.reader)
+            for attempt in ('cold cache', 'warm cache'):
+                with self.subTest(view=view, attempt=attempt):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+            cache.clear()
+
+    def test_second_page_fits_budget(self):
+        first = self.client.get(reverse('recipes:index'))
+        self.assertEqual(first.status_code, 200)
+        cursor = first.context['page_obj'].next_cursor
+        self.assertTrue(cursor)
+        response = self.client.get(reverse('recipes:index'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_missing_author_stats_are_not_written(self):
+        """Автор без строки счётчиков (создан без сигналов): счётчики вычисляются, но не записываются."""
+        AuthorStats.objects.filter(author=self.author).delete()
+        for url in (
+            reverse('recipes:recipe_detail', args=(self.recipe.pk,)),
+            reverse('recipes:profile', args=(self.author.username,)),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, RECIPES_COUNT)
+        self.assertFalse(AuthorStats.objects.filter(author=self.author).exists())
+
+    def test_exceeded_budget_fails(self):
+        with override_settings(VIEW_QUERY_BUDGETS={'recipes:index': 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('recipes:index'))
+
+    def test_exceeded_cache_budget_fails(self):
+        """Запросы к таблице кэша сверяются со своим бюджетом."""
+        with override_settings(VIEW_CACHE_QUERY_BUDGETS={'recipes:index': 0}):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'cache queries'):
+                self.client.get(reverse('recipes:index'))
@@ -0,0 +1,51 @@
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from recipes import similar
+from recipes.models import Recipe, SimilarRecipe, User
+
+INGREDIENTS = ('Мука', 'Молоко', 'Яйцо', 'Сахар', 'Соль', 'Масло', 'Дрожжи', 'Вода')
+
+
+class RefreshSimilarTests(TestCase):
+    """Пересчёт похожих рецептов для новых рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        for number in range(8):
+            cls.create(f'Тесто {number}', INGREDIENTS[:3 + number % 3])
+        similar.rebuild(neighbours=4)
+
+    @classmethod
+    def create(cls, title, ingredients):
+        return Recipe.objects.create(
+            title=title,
+            description='Тесто',
+            ingredients='\n'.join(f'{name}: 1' for name in ingredients),
+            technology='Замесить',
+            author=cls.author,
+        )
+
+    def test_neighbours_limit_kept(self):
+        """У рецептов, получивших новых соседей, остаётся не больше neighbours похожих."""
+        new = [self.create(f'Тесто {number}', INGREDIENTS[:3 + number % 3]) for number in range(4)]
+        new_ids = [recipe.pk for recipe in new]
+        similar.refresh(new_ids, neighbours=2)
+        updated = SimilarRecipe.objects.filter(similar_id__in=new_ids).exclude(recipe_id__in=new_ids)
+        counts = SimilarRecipe.objects.filter(recipe_id__in=updated.values('recipe_id')).values('recipe').annotate(
+            total=Count('pk')
+        ).values_list('total', flat=True)
+        self.assertTrue(counts)
+        self.assertLessEqual(max(counts), 2)
+
+    def test_save_of_other_fields_skips_previous_values(self):
+        """Сохранение полей, не влияющих на группу и сходство, не читает прежние значения рецепта."""
+        recipe = Recipe.objects.first()
+        recipe.description = 'Другое тесто'
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks() as callbacks:
+            recipe.save(update_fields=['description'])
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT "recipes_recipe"')])
+        self.assertEqual(callbacks, [])
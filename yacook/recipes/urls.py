@@ -1,15 +1,20 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import api, async_views, views
+
+# Страницы просмотра под ASGI обслуживаются асинхронными представлениями:
+read_views = async_views if settings.ASYNC_VIEWS else views
 
 
 app_name = 'recipes'
 
 urlpatterns = [
-    path('', views.index, name='index'),
-    path('group/<slug:slug>/', views.group_list, name='group_list'),
-    path('profile/<str:username>/', views.profile, name='profile'),
-    path('recipes/<int:recipe_id>/', views.recipe_detail, name='recipe_detail'),
+    path('', read_views.index, name='index'),
+    path('group/<slug:slug>/', read_views.group_list, name='group_list'),
+    path('profile/<str:username>/', read_views.profile, name='profile'),
+    path('recipes/<int:recipe_id>/', read_views.recipe_detail, name='recipe_detail'),
+    path('recipes/<int:recipe_id>/comments/', views.recipe_comments, name='recipe_comments'),
     path('create/', views.recipe_create, name='recipe_create'),
     path('recipes/<int:recipe_id>/delete/', views.recipe_delete, name='recipe_delete'),
     path('recipes/<int:recipe_id>/edit/', views.recipe_edit, name='recipe_edit'),
@@ -19,5 +24,11 @@ urlpatterns = [
     path('follow/', views.follow_index, name='follow_index'),
     path('profile/<str:username>/follow/', views.profile_follow, name='profile_follow'),
     path('profile/<str:username>/unfollow/', views.profile_unfollow, name='profile_unfollow'),
-    path('search/', views.search, name='search')
+    path('search/', read_views.search, name='search'),
+    path('pantry/', views.pantry, name='pantry'),
+    path('export/', views.export_recipes, name='export'),
+    path('api/recipes/', api.recipe_list, name='api_recipes'),
+    path('api/recipes/<int:recipe_id>/', api.recipe_detail, name='api_recipe'),
+    path('api/recipes/<int:recipe_id>/comments/', api.comment_list, name='api_comments'),
+    path('api/groups/', api.group_list, name='api_groups'),
 ]
@@ -1,58 +1,90 @@
+from functools import partial
+
 from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.db.models import Q, Count
+from django.db import transaction
+from django.db.models import Q
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-
-from .forms import RecipeForm, CommentForm
-from .models import Group, Recipe, User, Follow, Comment
-
-
-def get_paginator(page_number, recipe):
-    """Функция паджинатора."""
-    paginator = Paginator(recipe, settings.RECIPE_ON_PAGE)
-    page_obj = paginator.get_page(page_number)
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from . import counters, export, feed
+
+from .cache import attach_card_versions
+from .conditional import (
+    conditional_page, group_modified, profile_modified, recipe_modified, recipes_modified
+)
+from .feed import followed_large_authors
+from .forms import RecipeForm, CommentForm, ExportForm
+from .ingredients import recipes_by_ingredients
+from .models import Group, Recipe, User, Follow, Comment, FeedEntry
+from .paginator import DEFAULT_ORDERING, CursorPaginator, InvalidCursor
+from .search import count_results, search_recipes
+from .similar import similar_recipes
+from .stats import get_stats
+
+
+def get_cursor_page(paginator, cursor):
+    """Страница по курсору; на повреждённый курсор отвечает 404."""
+    try:
+        return paginator.get_page(cursor)
+    except InvalidCursor:
+        raise Http404('Некорректный курсор страницы.')
+
+
+def get_paginator(request, recipes, ordering=DEFAULT_ORDERING, transform=None, count=None):
+    """Функция паджинатора.
+
+    Страницы выбираются по курсору из параметра cursor. Старые ссылки
+    вида ?page=N обслуживаются только для первых страниц списка.
+    count - количество записей из счётчиков вместо COUNT(*).
+    """
+    paginator = CursorPaginator(recipes, settings.RECIPE_ON_PAGE, ordering, transform, count)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        page_obj = get_cursor_page(paginator, cursor)
+    else:
+        try:
+            page_number = int(request.GET.get('page', 1))
+        except ValueError:
+            page_number = 1
+        if page_number > settings.RECIPE_MAX_PAGE_NUMBER:
+            raise Http404('Страница недоступна, используйте переход по курсору.')
+        page_obj = paginator.get_offset_page(max(page_number, 1))
+    attach_card_versions(page_obj.object_list)
     return page_obj
 
 
-def get_groups():
-    """Функция получения групп."""
-    groups = Group.objects.values('title', 'slug')
-    return groups
-
-
+@conditional_page(recipes_modified)
 def index(request):
     """Главная страница."""
     template = 'recipes/index.html'
-    recipes = Recipe.objects.annotate(
-        num_comments=Count('comments')
-    ).select_related('author', 'group').order_by('-pub_date')
-    groups = get_groups()
-    page_number = request.GET.get('page')
-    page_obj = get_paginator(page_number, recipes)
+    recipes = Recipe.objects.select_related('author', 'group')
+    page_obj = get_paginator(request, recipes, count=partial(counters.get_total, counters.SITE))
     context = {
-        'groups': groups,
         'page_obj': page_obj
     }
     return render(request, template, context)
 
 
+@conditional_page(group_modified)
 def group_list(request, slug):
     """Страница группы рецептов."""
     template = 'recipes/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    groups = get_groups()
-    recipes = group.recipes.select_related('author').annotate(num_comments=Count('comments')).order_by('-pub_date')
-    page_number = request.GET.get('page')
-    page_obj = get_paginator(page_number, recipes)
+    recipes = group.recipes.select_related('author')
+    page_obj = get_paginator(request, recipes, count=partial(counters.get_total, counters.group_scope(group.pk)))
     context = {
-        'groups': groups,
         'group': group,
         'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+@conditional_page(profile_modified)
 def profile(request, username):
     """Страница профайла пользователя."""
     template = 'recipes/profile.html'
@@ -61,51 +93,88 @@ def profile(request, username):
         request.user.is_authenticated
         and Follow.objects.filter(author=author, user=request.user).exists()
     )
-    follower = Follow.objects.filter(author=author).aggregate(Count('user'))
-    recipes = author.recipes.select_related('group').annotate(num_comments=Count('comments')).order_by('-pub_date')
-    groups = get_groups()
-    page_number = request.GET.get('page')
-    page_obj = get_paginator(page_number, recipes)
+    recipes = author.recipes.select_related('group')
+    page_obj = get_paginator(request, recipes)
     context = {
         'author': author,
         'following': following,
-        'follower': follower,
-        'groups': groups,
+        'stats': get_stats(author.pk),
         'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+def get_comments_page(recipe_id, cursor=None):
+    """Страница комментариев рецепта, от новых к старым."""
+    comments = Comment.objects.filter(recipe_id=recipe_id).select_related('author')
+    paginator = CursorPaginator(comments, settings.COMMENTS_ON_PAGE, ordering=('-created', '-id'))
+    return get_cursor_page(paginator, cursor)
+
+
+@conditional_page(recipe_modified)
 def recipe_detail(request, recipe_id):
     """Страница просмотра рецепта."""
     template = 'recipes/recipe_detail.html'
-    recipe = get_object_or_404(Recipe.objects.select_related('author'), pk=recipe_id)
+    recipe = get_object_or_404(Recipe.objects.select_related('author', 'group'), pk=recipe_id)
     form = CommentForm()
-    comments = recipe.comments.select_related('recipe', 'author')
+    comments = get_comments_page(recipe.pk, request.GET.get('comments'))
     context = {
         'recipe': recipe,
+        'recipe_id': recipe.pk,
+        'author_stats': get_stats(recipe.author_id),
+        'similar': similar_recipes(recipe.pk),
         'form': form,
         'comments': comments,
     }
     return render(request, template, context)
 
 
+@conditional_page(recipe_modified)
+def recipe_comments(request, recipe_id):
+    """Следующая страница комментариев рецепта для кнопки «Показать ещё»."""
+    template = 'recipes/includes/comment_list.html'
+    comments = get_comments_page(recipe_id, request.GET.get('cursor'))
+    if not comments.object_list and not Recipe.objects.filter(pk=recipe_id).exists():
+        raise Http404('Рецепт не найден.')
+    context = {
+        'recipe_id': recipe_id,
+        'comments': comments,
+    }
+    return render(request, template, context)
+
+
+@conditional_page(recipes_modified)
 def search(request):
     """Страница отображения результатов поискового запроса."""
     template = 'recipes/search.html'
-    groups = get_groups()
-    data_search = request.GET.get('s')
-    recipes = Recipe.objects.select_related('author', 'group').filter(
-        Q(title__iregex=data_search) |
-        Q(ingredients__iregex=data_search)
-    ).annotate(num_comments=Count('comments')).order_by('-pub_date')
-    page_number = request.GET.get('page')
-    page_obj = get_paginator(page_number, recipes)
+    data_search = request.GET.get('s', '').strip()
+    recipes = search_recipes(Recipe.objects.select_related('author', 'group'), data_search)
+    page_obj = get_paginator(
+        request,
+        recipes,
+        ordering=('rank', '-pub_date', '-id'),
+        count=partial(count_results, recipes, settings.SEARCH_COUNT_LIMIT)
+    )
     context = {
         'data_search': data_search,
-        'groups': groups,
         'page_obj': page_obj,
-        's': f's={data_search}&'
+        'count_limit': settings.SEARCH_COUNT_LIMIT,
+        's': f'{urlencode({"s": data_search})}&'
+    }
+    return render(request, template, context)
+
+
+@conditional_page(recipes_modified)
+def pantry(request):
+    """Страница подбора рецептов по имеющимся продуктам."""
+    template = 'recipes/pantry.html'
+    products = request.GET.get('products', '').strip()
+    recipes = recipes_by_ingredients(Recipe.objects.select_related('author', 'group'), products)
+    page_obj = get_paginator(request, recipes, ordering=('-matched', 'missing', '-id'))
+    context = {
+        'products': products,
+        'page_obj': page_obj,
+        's': f'{urlencode({"products": products})}&'
     }
     return render(request, template, context)
 
@@ -121,7 +190,8 @@ def recipe_create(request):
     if form.is_valid():
         recipe = form.save(commit=False)
         recipe.author = request.user
-        recipe.save()
+        with transaction.atomic():
+            recipe.save()
         return redirect('recipes:profile', recipe.author)
     context = {
         'form': form,
@@ -171,7 +241,8 @@ def add_comment(request, recipe_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.recipe = recipe
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('recipes:recipe_detail', recipe_id=recipe_id)
 
 
@@ -181,7 +252,7 @@ def edit_comment(request, comment_id):
     template = 'recipes/edit_comment.html'
     comment = get_object_or_404(Comment.objects.select_related('author'), pk=comment_id)
     if request.user != comment.author:
-        return redirect('recipes:recipe_detail', comment.recipe.pk)
+        return redirect('recipes:recipe_detail', comment.recipe_id)
     form = CommentForm(
         instance=comment,
         data=request.POST or None
@@ -191,7 +262,7 @@ def edit_comment(request, comment_id):
     }
     if form.is_valid():
         form.save()
-        return redirect('recipes:recipe_detail', comment.recipe.pk)
+        return redirect('recipes:recipe_detail', comment.recipe_id)
     return render(request, template, context)
 
 
@@ -208,13 +279,27 @@ def delete_comment(request, recipe_id, comment_id):
 def follow_index(request):
     """Страница с подписками пользователя."""
     template = 'recipes/follow.html'
-    recipes = Recipe.objects.select_related('author', 'group').filter(author__following__user=request.user)
+    large_authors = followed_large_authors(request.user)
+    count = partial(feed.total, request.user.pk, large_authors)
+    if large_authors:
+        recipes = Recipe.objects.select_related('author', 'group').filter(
+            Q(pk__in=FeedEntry.objects.filter(user=request.user).values('recipe'))
+            | Q(author__in=large_authors)
+        )
+        page_obj = get_paginator(request, recipes, count=count)
+    else:
+        entries = FeedEntry.objects.filter(user=request.user).select_related(
+            'recipe__author', 'recipe__group'
+        )
+        page_obj = get_paginator(
+            request,
+            entries,
+            ordering=('-pub_date', '-recipe_id'),
+            transform=lambda items: [entry.recipe for entry in items],
+            count=count
+        )
     following = User.objects.all().filter(following__user=request.user)
-    groups = get_groups()
-    page_number = request.GET.get('page')
-    page_obj = get_paginator(page_number, recipes)
     context = {
-        'groups': groups,
         'following': following,
         'page_obj': page_obj
     }
@@ -234,5 +319,30 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     """Функция для отписки от автора."""
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(author=author).delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('recipes:profile', username)
+
+
+@staff_member_required
+def export_recipes(request):
+    """Потоковая выгрузка рецептов в CSV или JSON Lines для партнёров и аналитики."""
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    queryset = form.get_queryset()
+    # Выгрузка читается уже после выхода из middleware, поэтому база
+    # для чтения фиксируется сейчас:
+    queryset = queryset.using(queryset.db)
+    output_format = form.get_format()
+    compress = form.cleaned_data['gzip']
+    stream = export.export(queryset, output_format, compress)
+    content_type = 'application/gzip' if compress else export.CONTENT_TYPES[output_format]
+    name = export.filename(output_format, compress, timezone.now())
+    if isinstance(request, ASGIRequest):
+        # Django 4.1 перебирает потоковый ответ в цикле событий, где запросы
+        # к базе запрещены, поэтому под ASGI выгрузка сначала пишется
+        # во временный файл:
+        return FileResponse(export.spool(stream), as_attachment=True, filename=name, content_type=content_type)
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{name}"'
+    return response
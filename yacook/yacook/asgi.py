@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
+from core.static import StaticFilesASGIHandler
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yacook.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
+if settings.SERVE_STATIC:
+    application = StaticFilesASGIHandler(application)
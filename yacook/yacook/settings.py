@@ -1,4 +1,5 @@
 import os
+from importlib.util import find_spec
 from dotenv import load_dotenv
 
 
@@ -7,7 +8,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 
-DEBUG = True
+DEBUG = os.getenv('DEBUG', 'True') == 'True'
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -28,10 +29,11 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -39,25 +41,39 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# Панель отладки подключается только в режиме разработки:
+DEBUG_TOOLBAR = DEBUG and find_spec('debug_toolbar') is not None
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'yacook.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
+# Загрузчики шаблонов; вне режима разработки скомпилированные шаблоны хранятся в памяти процесса:
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    TEMPLATE_LOADERS = [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.groups.groups',
             ],
         },
     },
@@ -66,13 +82,40 @@ TEMPLATES = [
 WSGI_APPLICATION = 'yacook.wsgi.application'
 
 
+# Время жизни соединения с базой в секундах (0 - новое соединение на каждый запрос):
+CONN_MAX_AGE = int(os.getenv('CONN_MAX_AGE', 0))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': CONN_MAX_AGE > 0,
     }
 }
 
+# Реплики для чтения в виде "путь[:вес],путь[:вес]", например
+# REPLICA_DATABASES=db_replica1.sqlite3:2,db_replica2.sqlite3:1
+DATABASE_REPLICAS = {}
+for number, replica in enumerate(filter(None, os.getenv('REPLICA_DATABASES', '').split(',')), 1):
+    name, _, weight = replica.strip().rpartition(':')
+    if not weight.isdigit():
+        name, weight = replica.strip(), '1'
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, name),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS[alias] = int(weight)
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+# Представления, GET-запросы к которым можно обслуживать из реплик:
+REPLICA_VIEW_MODULES = ('recipes.views', 'recipes.async_views', 'recipes.api', 'about.views')
+# После записи клиент читает из основной базы столько секунд:
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+REPLICA_PIN_COOKIE = 'use_primary'
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -101,9 +144,22 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+# Имена статических файлов с хэшем содержимого и сжатые копии .gz/.br (нужен collectstatic):
+STATIC_MANIFEST = os.getenv('STATIC_MANIFEST', str(not DEBUG)) == 'True'
+if STATIC_MANIFEST:
+    STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+# Писать копии .br, если установлен пакет brotli:
+STATIC_BROTLI = os.getenv('STATIC_BROTLI', 'True') == 'True'
+# Отдавать статику из STATIC_ROOT обёрткой WSGI/ASGI-приложения (core.static):
+SERVE_STATIC = os.getenv('SERVE_STATIC', str(not DEBUG)) == 'True'
+# Время кэширования статических файлов без хэша в имени, в секундах:
+STATIC_MAX_AGE = 60
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Потоки для фонового создания уменьшенных копий изображений:
+IMAGE_RENDITION_WORKERS = 2
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
@@ -117,13 +173,131 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Количество рецептов на странице:
 RECIPE_ON_PAGE = 10
+# Количество комментариев, загружаемых за раз на странице рецепта:
+COMMENTS_ON_PAGE = 20
+# Количество записей на странице JSON API по умолчанию и наибольшее:
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+# Результаты поиска считаются только до этого количества:
+SEARCH_COUNT_LIMIT = 1000
+# Количество похожих рецептов на странице рецепта:
+SIMILAR_RECIPES_COUNT = 6
+# Количество записей на странице админки:
+ADMIN_LIST_PER_PAGE = 50
+# Начиная с этого количества записей админка показывает оценку СУБД вместо COUNT(*):
+ADMIN_ESTIMATE_THRESHOLD = 10000
+# Записи списков админки с фильтрами и поиском считаются только до этого количества:
+ADMIN_COUNT_LIMIT = 10000
+# Старые ссылки ?page=N обслуживаются только до этой страницы,
+# дальше список листается по курсору:
+RECIPE_MAX_PAGE_NUMBER = 10
+# Асинхронные версии страниц просмотра рецептов, включаются при запуске под ASGI:
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
+# Максимальное количество записей в ленте подписок пользователя:
+FEED_MAX_ENTRIES = 1000
+# Рецепты авторов с большим числом подписчиков не раскладываются по лентам,
+# а подмешиваются при чтении:
+FEED_FANOUT_FOLLOWERS_LIMIT = 5000
+
+# Общий для всех воркеров кэш: Redis, если задан REDIS_URL, иначе таблица в
+# базе данных (создаётся миграцией core). Файловый кэш не подходит: каждая
+# запись в нём просматривает весь каталог кэша.
+if os.getenv('REDIS_URL'):
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'core.cache.DatabaseCache',
+        'LOCATION': 'yacook_cache',
+        # При переполнении сначала удаляются устаревшие записи (фрагменты
+        # карточек живут час), поэтому бессрочные версии и отметки изменения
+        # страниц вытесняются, только если кэш заполнен ими самими:
+        'OPTIONS': {'MAX_ENTRIES': 200000},
+    }
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 60,
+            'SYNC_INTERVAL': 1,
+            # Локально храним только редко меняющийся список групп: запись
+            # любого локального ключа сбрасывает локальный уровень всех воркеров.
+            'LOCAL_KEY_PREFIXES': ('groups:',),
+        },
+    },
+    'shared': SHARED_CACHE,
 }
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# Имя маршрута показателей производительности и токен, по которому их читает
+# Prometheus (Authorization: Bearer); без токена они доступны только сотрудникам:
+METRICS_VIEW_NAME = 'metrics'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Допустимое количество SQL-запросов для представлений. При превышении
+# пишется предупреждение, а с QUERY_BUDGET_STRICT=True (в CI) - ошибка.
+VIEW_QUERY_BUDGETS = {
+    'recipes:index': 6,
+    'recipes:group_list': 7,
+    'recipes:profile': 9,
+    'recipes:recipe_detail': 7,
+    'recipes:recipe_comments': 5,
+    'recipes:search': 6,
+    'recipes:pantry': 10,
+    'recipes:follow_index': 9,
+    'recipes:edit_comment': 5,
+    'recipes:api_recipes': 2,
+    'recipes:api_recipe': 2,
+    'recipes:api_comments': 3,
+    'recipes:api_groups': 1,
+}
+# Допустимое количество запросов к таблицам кэша (DatabaseCache) при холодном
+# кэше, с Redis таких запросов нет. Запись фрагмента в DatabaseCache стоит трёх
+# запросов, поэтому бюджет считается отдельно от запросов к данным. Списки
+# кэшируют карточку каждого рецепта на странице; ещё один запрос - сверка
+# поколения локального уровня, не чаще раза в SYNC_INTERVAL:
+VIEW_CACHE_QUERY_BUDGETS = {
+    'recipes:index': 56,
+    'recipes:group_list': 56,
+    'recipes:profile': 56,
+    'recipes:recipe_detail': 5,
+    'recipes:recipe_comments': 5,
+    'recipes:search': 56,
+    'recipes:pantry': 56,
+    'recipes:follow_index': 56,
+    'recipes:edit_comment': 1,
+    'recipes:api_recipes': 5,
+    'recipes:api_recipe': 5,
+    'recipes:api_comments': 5,
+    'recipes:api_groups': 5,
+}
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True'
+
+# Писать в журнал yacook.performance время самых медленных шаблонов каждого запроса:
+TEMPLATE_PROFILING = os.getenv('TEMPLATE_PROFILING', 'False') == 'True'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'yacook.performance': {
+            'handlers': ['console'],
+            'level': os.getenv('PERFORMANCE_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
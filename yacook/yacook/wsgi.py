@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
+from core.static import StaticFilesWSGIHandler
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yacook.settings')
 
 application = get_wsgi_application()
+if settings.SERVE_STATIC:
+    application = StaticFilesWSGIHandler(application)